@@ -1,20 +1,70 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import hashlib
+import ipaddress
 import json
+import math
+import mimetypes
+import os
+import sys
+import threading
+import time
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, BinaryIO, Callable, Iterator
+
+# общие с уроком 2 компоненты (кэш, сжатие, ETag, лимиты, метрики, JSON,
+# чтение тела и т. д.) не копируются, а импортируются из его модулей
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2_fastapi_intro")
+)
+from admission import Admission, retry_after_header  # noqa: E402
+from compression import Compressor, choose_encoding, is_compressible  # noqa: E402
+from conditional import Validators, body_etag, is_not_modified, make_etag  # noqa: E402
+from json_codec import active_codec  # noqa: E402
+from metrics import AccessLog, Metrics  # noqa: E402
+from profiling import PHASES, Profiler, Sample  # noqa: E402
+from result_cache import ResultCache, number_key  # noqa: E402
+from single_flight import SingleFlight, coalesced_metric  # noqa: E402
+from wsgi_app import BodyError as StreamBodyError  # noqa: E402
+from wsgi_app import BodyStream, LineTooLong, load_numpy, take_lines  # noqa: E402
+
+
+def route(
+    method: str,
+    path: str,
+    validator: Callable | None = None,
+    max_body: int | None = None,
+    coalesce: bool = False,
+):
+    """
+    validator(self, query, params) -> Validators | None — дешёвая "версия"
+    ответа: при совпадении с If-None-Match/If-Modified-Since handler
+    не вызывается, клиент получает 304.
+    max_body — лимит тела запроса в байтах вместо SimpleHandler.max_body_size.
+    coalesce — одновременные одинаковые запросы (метод, путь, query, тело)
+    делят один вызов handler'а (см. SingleFlight).
+    """
 
-
-def route(method: str, path: str):
     def decorator(func):
         func.__route__ = (method, path)
+        func.__validator__ = validator
+        func.__max_body__ = max_body
+        func.__coalesce__ = coalesce
         return func
 
     return decorator
 
 
+class EncodedJson(bytes):
+    """Уже закодированный JSON: send_json отдаёт его без повторного dumps."""
+
+
 class Operator(Enum):
     add = "sum"
     mul = "mul"
@@ -29,42 +79,519 @@ class Result:
     status_code: int = None
     error: str | None = None
     allowed_methods: str | None = None
+    # для 429/503: через сколько секунд повторить
+    retry_after: float | None = None
+
+
+MAX_BATCH_SIZE = 100_000
+# меньше этого NumPy не окупает создание массивов
+VECTOR_MIN_BATCH = 32
+
+
+# pow не векторизуется: np.power расходится с ** в последнем знаке
+VECTOR_OPS = {
+    Operator.add.value: "add",
+    Operator.mul.value: "multiply",
+    Operator.div.value: "divide",
+}
+INT_VECTOR_OPS = {Operator.add.value, Operator.mul.value}
+# |a|, |b| < 2**31: сумма и произведение точно помещаются в int64
+INT64_SAFE = 2**31
+# int до 2**53 переводится во float64 без потерь
+FLOAT_EXACT_INT = 2**53
+
+
+def _int_pow(a: int, b: int) -> int:
+    # на уровне модуля — чтобы ProcessPoolExecutor мог передать её в процесс
+    return a**b
+
+
+class PowGuard:
+    """
+    Защита от дорогих int ** int.
+    Размер результата оценивается заранее как b * log2(|a|) бит:
+    - больше max_bits — 422 сразу, без вычисления;
+    - больше offload_bits — считается в отдельном процессе с жёстким
+      таймаутом (503), чтобы не занимать поток сервера;
+    - остальное считается на месте.
+    max_bits по умолчанию — сколько бит влезает в int -> str при
+    sys.get_int_max_str_digits(), offload_bits — половина max_bits.
+    """
+
+    def __init__(
+        self,
+        max_bits: int | None = None,
+        offload_bits: int | None = None,
+        timeout: float = 5.0,
+        workers: int = 2,
+        max_pending: int = 8,
+    ) -> None:
+        if max_bits is None:
+            # длиннее этого int всё равно не превратить в строку для JSON
+            digits = sys.get_int_max_str_digits() or 1_000_000
+            max_bits = int(digits * math.log2(10))
+        if offload_bits is None:
+            offload_bits = max_bits // 2
+        if offload_bits >= max_bits:
+            raise ValueError("offload_bits должен быть меньше max_bits")
+        self.max_bits = max_bits
+        self.offload_bits = offload_bits
+        self.timeout = timeout
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    @staticmethod
+    def result_bits(a: int, b: int) -> float:
+        if b <= 0 or abs(a) <= 1:
+            return 0.0
+        return b * math.log2(abs(a))
+
+    def power(self, a: int, b: int) -> Result:
+        bits = self.result_bits(a, b)
+        if bits > self.max_bits:
+            return Result(
+                ok=False,
+                status_code=422,
+                error=f"Результат слишком велик: ~{int(bits)} бит, "
+                f"допустимо {self.max_bits}",
+            )
+        if bits <= self.offload_bits:
+            return Result(ok=True, value=a**b)
+        return self._power_offloaded(a, b)
+
+    def _power_offloaded(self, a: int, b: int) -> Result:
+        if not self._slots.acquire(blocking=False):
+            return Result(
+                ok=False, status_code=503, error="Сервер занят тяжёлыми вычислениями"
+            )
+        try:
+            pool = self._get_pool()
+            future = pool.submit(_int_pow, a, b)
+            try:
+                return Result(ok=True, value=future.result(timeout=self.timeout))
+            except FutureTimeoutError:
+                self._kill_pool(pool)
+                return Result(
+                    ok=False,
+                    status_code=503,
+                    error=f"Вычисление не уложилось в {self.timeout} с",
+                )
+            except BrokenProcessPool:
+                # пул убит из-за таймаута другого запроса
+                return Result(
+                    ok=False, status_code=503, error="Вычисление прервано, повторите"
+                )
+        finally:
+            self._slots.release()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _kill_pool(self, pool: ProcessPoolExecutor) -> None:
+        # отменить уже идущую задачу executor не умеет — останавливаем процессы
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PlainText(str):
+    """Значение Result, которое отдаётся как text/plain, а не JSON."""
+
+
+@dataclass(frozen=True)
+class StaticFile:
+    """Значение Result: открытый файл, respond отдаёт его через send_file."""
+
+    file: BinaryIO
+
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# индексы фаз в SimpleHandler.phase_times; middleware здесь нет, она остаётся 0
+PARSE, ROUTE, HANDLER, SERIALIZE, WRITE = (
+    PHASES.index(name) for name in ("parse", "route", "handler", "serialize", "write")
+)
+
+
+NDJSON = "application/x-ndjson"
+STREAM_READ_SIZE = 64 * 1024
+MAX_NDJSON_LINE = 1024 * 1024
+# лимит тела запроса по умолчанию; маршрут может задать свой (route(max_body=))
+MAX_BODY_SIZE = 1024 * 1024
+BATCH_MAX_BODY = 16 * 1024 * 1024
+# за сколько секунд должно прийти всё тело, а не один его кусок
+BODY_TIMEOUT = 10.0
+# буфер тела больше этого не переживает свой запрос
+BODY_BUFFER_KEEP = 1024 * 1024
+
+# буфер тела на поток: переиспользуется запросами, которые он обслуживает
+_body_buffers = threading.local()
+
+
+def body_buffer(size: int) -> bytearray:
+    """Буфер потока не меньше size байт; большой после запроса не держим."""
+    buffer = getattr(_body_buffers, "buffer", None)
+    if buffer is None or not size <= len(buffer) <= max(size, BODY_BUFFER_KEEP):
+        # новый, а не resize: на старый может ещё смотреть memoryview
+        buffer = _body_buffers.buffer = bytearray(max(size, STREAM_READ_SIZE))
+    return buffer
+
+
+class BodyError(Exception):
+    """Тело запроса не принято; status — код ответа."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class RouteNode:
+    """Узел дерева маршрутов: один сегмент пути."""
+
+    __slots__ = ("static", "param_name", "param_child", "handlers", "allowed")
+
+    def __init__(self) -> None:
+        self.static: dict[str, RouteNode] = {}
+        self.param_name: str | None = None
+        self.param_child: RouteNode | None = None
+        # method -> имя хендлера; заполнено только в конечных узлах
+        self.handlers: dict[str, str] = {}
+        # готовая строка для заголовка Allow (для ответа 405)
+        self.allowed: str | None = None
+
+
+def split_path(path: str) -> list[str]:
+    return path.strip("/").split("/")
+
+
+def is_param_segment(segment: str) -> bool:
+    return len(segment) > 2 and segment.startswith("<") and segment.endswith(">")
 
 
 class RouterMixin:
     ROUTES: dict[tuple[str, str], str] = {}
+    ROUTE_TREE: RouteNode = RouteNode()
+    # имя хендлера -> шаблон пути; метка маршрута в метриках
+    ROUTE_TEMPLATES: dict[str, str] = {}
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls.ROUTES = cls.build_routes()
+        cls.ROUTE_TREE = cls.compile_routes(cls.ROUTES)
+        cls.ROUTE_TEMPLATES = {name: path for (_, path), name in cls.ROUTES.items()}
 
     @classmethod
     def build_routes(cls):
+        # маршруты собираются по всему MRO, чтобы наследник не терял их
+        names: dict[str, None] = {}
+        for klass in reversed(cls.__mro__):
+            names.update(dict.fromkeys(klass.__dict__))
+
         routes = {}
-        for name, obj in cls.__dict__.items():
+        for name in names:
+            obj = getattr(cls, name, None)
             if callable(obj) and hasattr(obj, "__route__"):
                 routes[obj.__route__] = name
         return routes
 
+    @staticmethod
+    def compile_routes(routes: dict[tuple[str, str], str]) -> RouteNode:
+        """
+        Собирает таблицу маршрутов в дерево сегментов (radix tree).
+        Разбор шаблонов делается один раз, при создании класса,
+        поэтому поиск зависит от глубины пути, а не от числа маршрутов.
+        """
+        root = RouteNode()
+        for (method, route_path), handler_name in routes.items():
+            node = root
+            for segment in split_path(route_path):
+                if is_param_segment(segment):
+                    param_name = segment[1:-1]
+                    if node.param_child is None:
+                        node.param_child = RouteNode()
+                        node.param_name = param_name
+                    elif node.param_name != param_name:
+                        raise ValueError(
+                            f"Конфликт параметров в {route_path}: "
+                            f"<{node.param_name}> и <{param_name}>"
+                        )
+                    node = node.param_child
+                else:
+                    node = node.static.setdefault(segment, RouteNode())
+            node.handlers.setdefault(method, handler_name)
+
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.handlers:
+                node.allowed = ",".join(sorted(node.handlers))
+            stack.extend(node.static.values())
+            if node.param_child is not None:
+                stack.append(node.param_child)
+        return root
+
+    @classmethod
+    def match_route(cls, path: str) -> list[tuple[RouteNode, dict[str, str]]]:
+        """
+        Возвращает конечные узлы, совпавшие с path, в порядке приоритета:
+        статический сегмент важнее параметра.
+        """
+        parts = split_path(path)
+        depth = len(parts)
+        matches: list[tuple[RouteNode, dict[str, str]]] = []
+        # (узел, номер сегмента, значения параметров)
+        stack: list[tuple[RouteNode, int, dict[str, str]]] = [(cls.ROUTE_TREE, 0, {})]
+        while stack:
+            node, i, params = stack.pop()
+            if i == depth:
+                if node.handlers:
+                    matches.append((node, params))
+                continue
+            part = parts[i]
+            # параметр кладём первым, чтобы статический сегмент достался раньше
+            if node.param_child is not None:
+                stack.append(
+                    (node.param_child, i + 1, {**params, node.param_name: part})
+                )
+            static_child = node.static.get(part)
+            if static_child is not None:
+                stack.append((static_child, i + 1, params))
+        return matches
+
 
 class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
-    def send_json(self, status: int, data: dict) -> None:
-        body = json.dumps(data, ensure_ascii=False)
-        self.send_response(status)
-        self.send_header(
-            keyword="Content-type", value="application/json; charset=utf-8"
+    compressor = Compressor()
+    # общие для всех потоков сервера
+    result_cache = ResultCache()
+    pow_guard = PowGuard()
+    metrics = Metrics()
+    # None — запросы не логируются; AccessLog() — буферизованный лог
+    access_log: AccessLog | None = None
+    # None — принимаем всё; Admission(...) — лимиты и сброс нагрузки
+    admission: Admission | None = None
+    # для маршрутов с route(..., coalesce=True)
+    single_flight = SingleFlight()
+    # фазы запросов и, по configure(), выборка cProfile/стеков
+    profiler = Profiler()
+    # закодированный ответ handle_root, собирается при первом запросе
+    ROOT_PAYLOAD: EncodedJson | None = None
+    ROOT_ETAG: str | None = None
+    max_body_size = MAX_BODY_SIZE
+    body_timeout = BODY_TIMEOUT
+    # каталог для GET /static/<name>; None — маршрут отвечает 404
+    static_dir: str | None = None
+    # пока читается тело: time.monotonic(), к которому оно должно прийти
+    body_deadline: float | None = None
+
+    def handle_one_request(self) -> None:
+        # метрики снимаются вокруг всего запроса: разбор, хендлер, запись ответа
+        self.route_label = UNMATCHED_ROUTE
+        # ставит parse_request: ожидание запроса на keep-alive — не его время
+        self.request_start: float | None = None
+        self.status_code: int | None = None
+        # валидаторы маршрута, если он их объявил (см. route)
+        self.validators: Validators | None = None
+        # хэш тела для ключа single-flight; само тело — в буфере потока
+        self.body_digest = b""
+        # занят ли слот admission (см. admit/release)
+        self.admitted = False
+        self.profile_sample: Sample | None = None
+        self.phase_times = [0.0] * len(PHASES)
+        self.phase_clock = time.perf_counter()
+        try:
+            super().handle_one_request()
+        except BaseException:
+            if self.profile_sample is not None:
+                self.profiler.discard(self.profile_sample)
+            raise
+        if self.status_code is not None:
+            self.record_request(time.perf_counter() - self.request_start)
+        elif self.profile_sample is not None:
+            self.profiler.discard(self.profile_sample)
+
+    def parse_request(self) -> bool:
+        # строка запроса уже прочитана: время считается отсюда, без простоя keep-alive
+        self.request_start = self.phase_clock = time.perf_counter()
+        if not super().parse_request():
+            # пустая строка запроса: ответа нет, значит, не будет и record()
+            return False
+        if self.profiler.sampling:
+            self.profile_sample = self.profiler.begin()
+        return True
+
+    def mark_phase(self, phase: int) -> None:
+        """Время с прошлой отметки — в phase."""
+        now = time.perf_counter()
+        self.phase_times[phase] += now - self.phase_clock
+        self.phase_clock = now
+
+    def record_request(self, seconds: float) -> None:
+        status = str(self.status_code)
+        self.metrics.observe(self.route_label, self.command, status, seconds)
+        # остаток после последней отметки — запись ответа (304, NDJSON, flush)
+        self.mark_phase(WRITE)
+        self.profiler.record(
+            self.profile_sample,
+            self.route_label,
+            self.command,
+            status,
+            tuple(self.phase_times),
+        )
+        if self.access_log is not None:
+            self.access_log.log(self.command, self.path, status, seconds)
+
+    def send_response(self, code: int, message: str | None = None) -> None:
+        self.status_code = code
+        if self.request_start is None:
+            # 414 уходит до parse_request
+            self.request_start = self.phase_clock = time.perf_counter()
+        super().send_response(code, message)
+
+    def log_request(self, code="-", size="-") -> None:
+        # вместо синхронной записи в stderr — метрики и, по желанию, AccessLog
+        pass
+
+    def send_json(
+        self,
+        status: int,
+        data: dict | EncodedJson,
+        headers: tuple[tuple[str, str], ...] = (),
+    ) -> None:
+        static = isinstance(data, EncodedJson)
+        self.send_body(
+            status,
+            "application/json; charset=utf-8",
+            data if static else active_codec().dumps(data),
+            headers=headers,
+            static=static,
         )
-        self.end_headers()
-        self.wfile.write(body.encode("utf-8"))
 
     def send_text(self, status: int, text: str) -> None:
+        self.send_body(status, "text/plain; charset=utf-8", text.encode("utf-8"))
+
+    def send_body(
+        self,
+        status: int,
+        content_type: str,
+        body: bytes | memoryview,
+        headers: tuple[tuple[str, str], ...] = (),
+        static: bool = False,
+    ) -> None:
+        if status == 200 and self.command == "GET":
+            # без объявленных валидаторов — слабый ETag по хэшу тела
+            validators = self.validators
+            if validators is None:
+                validators = Validators(etag=body_etag(body))
+                if self.not_modified(validators):
+                    return self.send_not_modified(validators)
+            headers = (*headers, *validators.headers())
+
+        body, encoding = self.compress_body(content_type, body, static)
         self.send_response(status)
-        self.send_header(keyword="Content-type", value="text/plain; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(text.encode("utf-8"))
+        self.send_header("Content-type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        if encoding is not None:
+            # ответ зависит от Accept-Encoding, даже если в этот раз не сжат
+            self.send_header("Vary", "Accept-Encoding")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(memoryview(body).nbytes))
+        self.mark_phase(SERIALIZE)
+        self.write_vectored(self.take_headers(), body)
+
+    def not_modified(self, validators: Validators) -> bool:
+        return is_not_modified(
+            self.headers.get("If-None-Match"),
+            self.headers.get("If-Modified-Since"),
+            validators,
+        )
+
+    def send_not_modified(self, validators: Validators) -> None:
+        self.send_response(304)
+        for name, value in validators.headers():
+            self.send_header(name, value)
+        self.write_vectored(self.take_headers())
+
+    def compress_body(
+        self, content_type: str, body: bytes | memoryview, static: bool
+    ) -> tuple[bytes | memoryview, str | None]:
+        """
+        Возвращает (тело, кодирование): None — ответ не сжимаемый,
+        "" — сжимаемый, но клиент не принимает сжатие (или оно не помогло).
+        """
+        compressor = self.compressor
+        if len(body) < compressor.min_size or not is_compressible(content_type):
+            return body, None
+        coding = choose_encoding(self.headers.get("Accept-Encoding", ""))
+        if coding is None:
+            return body, ""
+        compressed = compressor.compress(body, coding, static)
+        if len(compressed) >= len(body):
+            return body, ""
+        return compressed, coding
+
+    def send_file(
+        self, status: int, file: BinaryIO, content_type: str | None = None
+    ) -> None:
+        """Отдаёт открытый файл через socket.sendfile (os.sendfile, где есть)."""
+        try:
+            size = os.fstat(file.fileno()).st_size - file.tell()
+            if content_type is None:
+                name = getattr(file, "name", "")
+                content_type = (
+                    mimetypes.guess_type(str(name))[0] or "application/octet-stream"
+                )
+            self.send_response(status)
+            self.send_header("Content-type", content_type)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            self.mark_phase(SERIALIZE)
+            self.connection.sendfile(file, count=size)
+        finally:
+            file.close()
+
+    def take_headers(self) -> bytes:
+        # как end_headers(), но заголовки не пишутся, а возвращаются
+        buffer = getattr(self, "_headers_buffer", [])
+        if self.request_version != "HTTP/0.9":
+            buffer.append(b"\r\n")
+        self._headers_buffer = []
+        return b"".join(buffer)
+
+    def write_vectored(self, *buffers: bytes | memoryview) -> None:
+        """
+        Пишет буферы одним sendmsg (writev) без склейки в новый bytes:
+        заголовки и тело уходят одним системным вызовом.
+        """
+        views = [memoryview(b).cast("B") for b in buffers if len(b)]
+        sendmsg = getattr(self.connection, "sendmsg", None)
+        if sendmsg is None:  # Windows
+            for view in views:
+                self.wfile.write(view)
+            return
+
+        while views:
+            sent = sendmsg(views)
+            # частичная запись: отбрасываем отправленное
+            while sent:
+                if sent >= len(views[0]):
+                    sent -= len(views.pop(0))
+                else:
+                    views[0] = views[0][sent:]
+                    sent = 0
 
     def read_json_body(
-        self,
+        self, max_body: int | None = None
     ) -> tuple[dict[str, object] | None, dict[str, str] | None, int | None]:
         """
         Возвращает tuple (data, error_dict, status_code).
@@ -73,24 +600,23 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
         """
         content_type = self.headers.get("Content-Type", "")
         if not content_type.startswith("application/json"):
+            # тело не прочитано: его байты приняли бы за следующий запрос
+            self.close_connection = True
             return None, {"error": "Content-Type должен быть application/json"}, 415
 
-        content_length = int(self.headers.get("Content-Length", 0))
-        if content_length <= 0:
+        limit = max_body if max_body is not None else self.max_body_size
+        try:
+            body = self.read_body(limit)
+        except BodyError as e:
+            # остаток тела в сокете: следующий запрос на этом соединении не разобрать
+            self.close_connection = True
+            return None, {"error": str(e)}, e.status
+        if not body:
             return None, {"error": "Пустое тело запроса"}, 400
-
-        body = self.rfile.read(content_length)
-        if len(body) != content_length:
-            return (
-                None,
-                {
-                    "error": "Тело запроса пришло не полностью (Content-Length не совпал)"
-                },
-                400,
-            )
+        self.body_digest = hashlib.blake2b(body, digest_size=16).digest()
 
         try:
-            data = json.loads(body.decode("utf-8"))
+            data = active_codec().loads(body)
         except UnicodeDecodeError:
             return None, {"error": "Тело запроса должно быть UTF-8"}, 400
         except json.JSONDecodeError:
@@ -101,21 +627,53 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
 
         return data, None, None
 
-    @route("POST", "/operation")
+    @route("POST", "/operation", coalesce=True)
     def calculate(self, data: dict, query=None, params=None) -> Result:
         number_result = self.extract_numbers(data)
         if not number_result.ok:
             return number_result
 
         operator, a, b = number_result.value
+        return self.evaluate(operator, a, b)
+
+    def evaluate(self, operator: str, a: int | float, b: int | float) -> Result:
+        key = (operator, number_key(a), number_key(b))
+        hit, value = self.result_cache.get(key)
+        if hit:
+            return Result(ok=True, value=value)
 
+        result = self.compute(operator, a, b)
+        if result.ok:
+            self.result_cache.put(key, result.value)
+        return result
+
+    def compute(self, operator: str, a: int | float, b: int | float) -> Result:
         match operator:
             case Operator.add.value:
                 calc_result = a + b
             case Operator.mul.value:
                 calc_result = a * b
             case Operator.pow.value:
-                calc_result = a**b
+                if isinstance(a, int) and isinstance(b, int) and b > 0:
+                    return self.pow_guard.power(a, b)
+                try:
+                    calc_result = a**b
+                except OverflowError:
+                    return Result(
+                        ok=False, status_code=422, error="Результат слишком велик"
+                    )
+                except ZeroDivisionError:
+                    return Result(
+                        ok=False,
+                        status_code=422,
+                        error="0 нельзя возводить в отрицательную степень",
+                    )
+                if isinstance(calc_result, complex):
+                    return Result(
+                        ok=False,
+                        status_code=422,
+                        error="Результат не является действительным числом",
+                    )
             case Operator.div.value:
                 try:
                     calc_result = a / b
@@ -130,6 +688,136 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
 
         return Result(ok=True, value=calc_result)
 
+    @route("POST", "/operation/batch", max_body=BATCH_MAX_BODY)
+    def calculate_batch(self, data: dict, query=None, params=None) -> Result:
+        """
+        Пакет операций в одном запросе. Тело:
+        {"operations": [{"a": .., "b": .., "operation": ..}, ...]}
+        или по столбцам: {"a": [..], "b": [..], "operation": [..]}.
+        Результаты идут в том же порядке; ошибка одного элемента
+        не ломает весь пакет.
+        """
+        items_result = self.extract_batch(data)
+        if not items_result.ok:
+            return items_result
+
+        results: list[Result | None] = []
+        groups: dict[str, list[tuple[int, int | float, int | float]]] = {}
+        for i, item in enumerate(items_result.value):
+            number_result = (
+                self.extract_numbers(item)
+                if isinstance(item, dict)
+                else Result(
+                    ok=False, status_code=422, error="Операция должна быть объектом"
+                )
+            )
+            if not number_result.ok:
+                results.append(number_result)
+                continue
+            operator, a, b = number_result.value
+            groups.setdefault(operator, []).append((i, a, b))
+            results.append(None)
+
+        for operator, group in groups.items():
+            if len(group) >= VECTOR_MIN_BATCH and load_numpy() is not None:
+                evaluated = self.evaluate_vector(operator, group)
+            else:
+                evaluated = {i: self.evaluate(operator, a, b) for i, a, b in group}
+            for i, result in evaluated.items():
+                results[i] = result
+
+        return Result(
+            ok=True,
+            value=[
+                (
+                    {"result": r.value}
+                    if r.ok
+                    else {"error": r.error, "status": r.status_code}
+                )
+                for r in results
+            ],
+        )
+
+    def extract_batch(self, data: dict[str, object]) -> Result:
+        operations = data.get("operations")
+        if operations is None and isinstance(data.get("a"), list):
+            columns = (data.get("a"), data.get("b"), data.get("operation"))
+            if not all(isinstance(column, list) for column in columns):
+                return Result(
+                    ok=False,
+                    status_code=422,
+                    error="'a', 'b' и 'operation' должны быть массивами",
+                )
+            if not len(columns[0]) == len(columns[1]) == len(columns[2]):
+                return Result(
+                    ok=False,
+                    status_code=422,
+                    error="Массивы 'a', 'b' и 'operation' должны быть одной длины",
+                )
+            operations = [
+                {"a": a, "b": b, "operation": op} for a, b, op in zip(*columns)
+            ]
+
+        if not isinstance(operations, list):
+            return Result(
+                ok=False,
+                status_code=422,
+                error="Ожидается 'operations' или массивы 'a', 'b', 'operation'",
+            )
+        if len(operations) > MAX_BATCH_SIZE:
+            return Result(
+                ok=False,
+                status_code=413,
+                error=f"Не больше {MAX_BATCH_SIZE} операций в пакете",
+            )
+        return Result(ok=True, value=operations)
+
+    def evaluate_vector(
+        self, operator: str, group: list[tuple[int, int | float, int | float]]
+    ) -> dict[int, Result]:
+        """
+        Считает группу одной операции через NumPy.
+        Векторно идёт только то, где float64/int64 дают тот же ответ,
+        что и Python; остальное (большие int, inf/nan) — поштучно.
+        """
+        np = load_numpy()
+        vector_op = VECTOR_OPS.get(operator)
+        if vector_op is None:
+            return {i: self.evaluate(operator, a, b) for i, a, b in group}
+
+        as_float, as_int, scalar = [], [], []
+        for item in group:
+            _, a, b = item
+            both_int = isinstance(a, int) and isinstance(b, int)
+            if both_int and operator in INT_VECTOR_OPS:
+                fits = abs(a) < INT64_SAFE and abs(b) < INT64_SAFE
+                (as_int if fits else scalar).append(item)
+            elif all(isinstance(x, float) or abs(x) < FLOAT_EXACT_INT for x in (a, b)):
+                as_float.append(item)
+            else:
+                scalar.append(item)
+
+        results: dict[int, Result] = {}
+        for items, dtype in ((as_float, np.float64), (as_int, np.int64)):
+            if not items:
+                continue
+            a_arr = np.array([a for _, a, _ in items], dtype=dtype)
+            b_arr = np.array([b for _, _, b in items], dtype=dtype)
+            with np.errstate(all="ignore"):
+                values = getattr(np, vector_op)(a_arr, b_arr)
+            finite = np.isfinite(values).tolist()
+            for (i, a, b), value, ok in zip(items, values.tolist(), finite):
+                # inf/nan: деление на ноль, переполнение — пусть разберёт evaluate
+                results[i] = (
+                    Result(ok=True, value=value)
+                    if ok
+                    else self.evaluate(operator, a, b)
+                )
+
+        for i, a, b in scalar:
+            results[i] = self.evaluate(operator, a, b)
+        return results
+
     def extract_numbers(self, data: dict[str, object]) -> Result:
         a = data.get("a")
         b = data.get("b")
@@ -151,10 +839,87 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
 
         return Result(ok=True, value=(operation, a, b))
 
+    @route("GET", "/cache/stats")
+    def handle_cache_stats(self, data=None, query=None, params=None) -> Result:
+        return Result(ok=True, value=self.result_cache.stats())
+
+    @route("GET", "/metrics")
+    def handle_metrics(self, data=None, query=None, params=None) -> Result:
+        coalesced = coalesced_metric(self.single_flight.shared)
+        return Result(
+            ok=True, value=PlainText(self.metrics.render_prometheus() + coalesced)
+        )
+
+    @route("GET", "/metrics/summary")
+    def handle_metrics_summary(self, data=None, query=None, params=None) -> Result:
+        return Result(ok=True, value=self.metrics.summary())
+
+    @route("GET", "/debug/profile")
+    def handle_profile(self, data=None, query=None, params=None) -> Result:
+        return Result(ok=True, value=self.profiler.report())
+
+    @route("POST", "/debug/profile")
+    def handle_profile_config(
+        self, data: dict[str, object], query=None, params=None
+    ) -> Result:
+        """{"sample_every": N, "slow_threshold_ms": ms}; 0 и null выключают."""
+        # выборка замедляет все запросы: включать её можно только с этой машины
+        if not self.is_local_client():
+            return Result(
+                ok=False,
+                status_code=403,
+                error="Профилирование настраивается только с localhost",
+            )
+        sample_every = data.get("sample_every", 0)
+        slow_ms = data.get("slow_threshold_ms")
+        if type(sample_every) is not int or not (
+            slow_ms is None or isinstance(slow_ms, (int, float))
+        ):
+            return Result(
+                ok=False,
+                status_code=400,
+                error="sample_every — целое число, slow_threshold_ms — число",
+            )
+        try:
+            self.profiler.configure(
+                sample_every, None if slow_ms is None else slow_ms / 1000
+            )
+        except ValueError:
+            return Result(
+                ok=False,
+                status_code=400,
+                error="sample_every и slow_threshold_ms должны быть >= 0",
+            )
+        return Result(ok=True, value=self.profiler.report())
+
+    def is_local_client(self) -> bool:
+        try:
+            return ipaddress.ip_address(self.client_address[0]).is_loopback
+        except ValueError:
+            return False
+
     @route("POST", "/echo")
     def handle_echo(self, data: dict[str, object], query=None, params=None) -> Result:
         return Result(ok=True, value={"received": data})
 
+    @route("GET", "/static/<name>")
+    def handle_static(self, data=None, query=None, params=None) -> Result:
+        name = params.get("name", "")
+        # только обычные файлы прямо в static_dir: без "..", скрытых файлов,
+        # подкаталогов и дисков Windows ("C:x")
+        path = None
+        if self.static_dir is not None and not (
+            name.startswith(".") or "\\" in name or ":" in name
+        ):
+            path = os.path.join(self.static_dir, name)
+        try:
+            if path is None or not os.path.isfile(path):
+                raise FileNotFoundError(name)
+            file = open(path, "rb")
+        except OSError:
+            return Result(ok=False, status_code=404, error="Файл не найден")
+        return Result(ok=True, value=StaticFile(file))
+
     @route("GET", "/time")
     def handle_time(self, data=None, query=None, params=None) -> Result:
         return Result(ok=True, value={"time": datetime.now().isoformat()})
@@ -173,7 +938,10 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
             return Result(ok=True, value={"message": f"Привет {name}!"})
         return Result(ok=False, status_code=400, error="Параметр 'name' обязателен")
 
-    @route("GET", "/users/<user_id>")
+    def user_validator(self, query=None, params=None) -> Validators:
+        return Validators(etag=make_etag(f"user-{params.get('user_id')}"))
+
+    @route("GET", "/users/<user_id>", validator=user_validator, coalesce=True)
     def handle_user_by_id(
         self,
         data: dict[str, object] | None = None,
@@ -195,31 +963,51 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
             )
         return Result(ok=True, value={"user_id": user_id})
 
-    @route("GET", "/")
+    def root_validator(self, query=None, params=None) -> Validators:
+        return Validators(etag=self.root_etag())
+
+    @route("GET", "/", validator=root_validator)
     def handle_root(self, data=None, query=None, params=None) -> Result:
-        return Result(
-            ok=True,
-            value={
-                "message": "OK",
-                "endpoints": [
-                    "GET /time",
-                    "GET /hello?name=Ivan",
-                    "GET /users/<user_id>",
-                    "POST /operation",
-                ],
-            },
-        )
+        return Result(ok=True, value=self.root_payload())
+
+    @classmethod
+    def root_payload(cls) -> EncodedJson:
+        # список берётся из ROUTES, а не пишется руками: не расходится с маршрутами
+        if cls.ROOT_PAYLOAD is None:
+            endpoints = [f"{method} {path}" for method, path in sorted(cls.ROUTES)]
+            cls.ROOT_PAYLOAD = EncodedJson(
+                active_codec().dumps({"message": "OK", "endpoints": endpoints})
+            )
+        return cls.ROOT_PAYLOAD
+
+    @classmethod
+    def root_etag(cls) -> str:
+        if cls.ROOT_ETAG is None:
+            cls.ROOT_ETAG = make_etag(
+                hashlib.blake2b(cls.root_payload(), digest_size=8).hexdigest()
+            )
+        return cls.ROOT_ETAG
+
+    @classmethod
+    def freeze(cls) -> None:
+        """
+        Всё, что не зависит от запроса, — до serve_forever, а не на первом
+        запросе: закодированный ответ "/" с его ETag и таблицы mimetypes.
+        Маршруты и их метаданные готовы ещё при создании класса (RouterMixin).
+        """
+        cls.root_etag()
+        if not mimetypes.inited:
+            mimetypes.init()
 
     def send_method_not_allowed(
         self, allowed_methods: str, message: str = "Method is Not Allowed"
     ) -> None:
         # allowed_methods.
-        self.send_response(405)
-        self.send_header("Allow", allowed_methods)
-        self.send_header("Content-type", "application/json; charset=utf-8")
-        self.end_headers()
-        self.wfile.write(
-            json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        self.send_body(
+            405,
+            "application/json; charset=utf-8",
+            active_codec().dumps({"error": message}),
+            headers=(("Allow", allowed_methods),),
         )
 
     def do_GET(self) -> None:
@@ -228,6 +1016,7 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
 
         if path == "/favicon.ico":
             self.send_response(404)
+            self.send_header("Content-Length", "0")
             self.end_headers()
             return None
 
@@ -240,16 +1029,210 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
     def do_POST(self) -> None:
         path = urlparse(self.path).path
 
-        data, err, status = self.read_json_body()
-        if data is None:
-            if status is not None and err is not None:
-                return self.send_json(status=status, data=err)
-            return self.send_json(status=500, data={"error": "Ошибка в программе"})
+        if self.headers.get("Content-Type", "").startswith(NDJSON):
+            return self.stream_ndjson(path)
 
-        result = self.dispatch("POST", path, data=data, query=None)
+        # лимиты — до чтения тела: отказ не должен стоить приёма мегабайта
+        handler_name, _, _ = self.parse_path("POST", path)
+        if handler_name is not None:
+            self.route_label = self.ROUTE_TEMPLATES[handler_name]
+            rejected = self.admit()
+            if rejected is not None:
+                self.close_connection = True  # тело не дочитано
+                return self.respond(rejected)
+        try:
+            data, err, status = self.read_json_body(self.body_limit(path))
+            if data is None:
+                if status is not None and err is not None:
+                    return self.send_json(status=status, data=err)
+                return self.send_json(status=500, data={"error": "Ошибка в программе"})
+
+            result = self.dispatch("POST", path, data=data, query=None)
+        finally:
+            self.release()
 
         return self.respond(result, ok_wrapper="result")
 
+    def stream_ndjson(self, path: str) -> None:
+        """
+        NDJSON: каждая строка тела — отдельный JSON-объект для хендлера.
+        Строки читаются по мере поступления, результат каждой уходит сразу,
+        так что память не зависит от размера тела.
+        """
+        handler_name, path_params, _ = self.parse_path("POST", path)
+        handler = getattr(self, handler_name, None) if handler_name else None
+        if handler is None:
+            self.close_connection = True  # тело не дочитано
+            return self.respond(self.dispatch("POST", path))
+
+        self.route_label = self.ROUTE_TEMPLATES[handler_name]
+        rejected = self.admit()
+        if rejected is not None:
+            self.close_connection = True  # тело не дочитано
+            return self.respond(rejected)
+
+        codec = active_codec()
+        self.start_stream(200, f"{NDJSON}; charset=utf-8")
+        try:
+            for line in self.iter_body_lines():
+                if not line.strip():
+                    continue
+                try:
+                    data = codec.loads(line)
+                except ValueError:
+                    result = Result(ok=False, status_code=400, error="Неверный JSON")
+                else:
+                    if isinstance(data, dict):
+                        result = handler(data, None, path_params)
+                    else:
+                        result = Result(
+                            ok=False,
+                            status_code=400,
+                            error="JSON должен быть объектом (словарём)",
+                        )
+
+                item = (
+                    {"result": result.value}
+                    if result.ok
+                    else {"error": result.error, "status": result.status_code}
+                )
+                self.write_stream(codec.dumps(item) + b"\n")
+        except ValueError as e:
+            # строка длиннее лимита или битый chunked — дальше не читаем
+            self.close_connection = True
+            self.write_stream(codec.dumps({"error": str(e)}) + b"\n")
+        finally:
+            self.release()
+        self.end_stream()
+
+    def body_limit(self, path: str) -> int:
+        handler_name, _, _ = self.parse_path("POST", path)
+        handler = getattr(self, handler_name, None) if handler_name else None
+        max_body = getattr(handler, "__max_body__", None)
+        return max_body if max_body is not None else self.max_body_size
+
+    def read_body(self, limit: int) -> memoryview:
+        """
+        Тело целиком, но не больше limit байт и не дольше body_timeout секунд.
+        Лишний Content-Length отвергается до чтения. Тело читается кусками
+        в буфер потока (body_buffer) и действительно до следующего read_body
+        в этом потоке, так что на запрос приходится не больше limit байт.
+        """
+        chunked = self.headers.get("Transfer-Encoding", "").lower() == "chunked"
+        if not chunked:
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                raise BodyError(400, "Неверный Content-Length") from None
+            if length > limit:
+                raise BodyError(413, f"Тело запроса больше {limit} байт")
+            if length <= 0:
+                return memoryview(b"")
+
+        self.body_deadline = time.monotonic() + self.body_timeout
+        try:
+            if chunked:
+                return self.read_chunked_body(limit)
+            return self.read_sized_body(length)
+        except TimeoutError:
+            raise BodyError(408, "Тело запроса не пришло вовремя") from None
+        finally:
+            self.body_deadline = None
+            self.connection.settimeout(self.timeout)
+
+    def read_sized_body(self, length: int) -> memoryview:
+        view = memoryview(body_buffer(length))
+        received = 0
+        while received < length:
+            self.check_body_deadline()
+            # readinto1 — сразу в буфер, без промежуточных bytes
+            chunk = view[received : min(length, received + STREAM_READ_SIZE)]
+            size = self.rfile.readinto1(chunk)
+            if not size:
+                raise BodyError(
+                    400, "Тело запроса пришло не полностью (Content-Length не совпал)"
+                )
+            received += size
+        return view[:length]
+
+    def read_chunked_body(self, limit: int) -> memoryview:
+        buffer = body_buffer(0)
+        size = 0
+        for data in self.iter_body_chunks():
+            end = size + len(data)
+            if end > limit:
+                raise BodyError(413, f"Тело запроса больше {limit} байт")
+            if end > len(buffer):
+                grown = bytearray(min(limit, max(end, 2 * len(buffer))))
+                grown[:size] = memoryview(buffer)[:size]
+                buffer = _body_buffers.buffer = grown
+            buffer[size:end] = data
+            size = end
+        return memoryview(buffer)[:size]
+
+    def check_body_deadline(self) -> None:
+        # таймаут сокета — остаток общего срока, а не срок одного recv
+        if self.body_deadline is None:
+            return
+        remaining = self.body_deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError
+        self.connection.settimeout(remaining)
+
+    def iter_body_chunks(self) -> Iterator[bytes]:
+        """Тело запроса кусками: по Content-Length или chunked."""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            stream = BodyStream(self.rfile, None, chunked=True)
+        else:
+            stream = BodyStream(
+                self.rfile, int(self.headers.get("Content-Length", 0) or 0)
+            )
+        while True:
+            self.check_body_deadline()
+            try:
+                data = stream.read(STREAM_READ_SIZE)
+            except StreamBodyError:
+                raise ValueError("Неверное chunked-кодирование") from None
+            if not data:
+                return
+            yield data
+
+    def iter_body_lines(self) -> Iterator[bytes]:
+        buffer = bytearray()
+        for data in self.iter_body_chunks():
+            buffer += data
+            try:
+                yield from take_lines(buffer, MAX_NDJSON_LINE)
+            except LineTooLong:
+                raise ValueError(f"Строка длиннее {MAX_NDJSON_LINE} байт") from None
+        if buffer:
+            yield bytes(buffer)
+
+    def start_stream(self, status: int, content_type: str) -> None:
+        # chunked возможен только в HTTP/1.1; иначе конец тела — закрытие соединения
+        self.chunked_response = (
+            self.protocol_version == "HTTP/1.1" and self.request_version == "HTTP/1.1"
+        )
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        if self.chunked_response:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def write_stream(self, data: bytes) -> None:
+        if not data:
+            return
+        if self.chunked_response:
+            self.write_vectored(b"%x\r\n" % len(data), data, b"\r\n")
+        else:
+            self.wfile.write(data)
+
+    def end_stream(self) -> None:
+        if self.chunked_response:
+            self.wfile.write(b"0\r\n\r\n")
+
     def dispatch(
         self,
         method: str,
@@ -257,8 +1240,11 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
         data: dict[str, object] | None = None,
         query: dict[str, list[str]] | None = None,
     ) -> Result:
-
+        # до сюда: заголовки, URL, тело и его JSON
+        self.mark_phase(PARSE)
         handler_name, path_params, allowed_methods = self.parse_path(method, path)
+        if handler_name is not None:
+            self.route_label = self.ROUTE_TEMPLATES[handler_name]
         if allowed_methods is not None and handler_name is None:
             return Result(
                 ok=False,
@@ -274,7 +1260,63 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
         if handler is None:
             return Result(ok=False, status_code=500, error="Handler не найден")
 
-        return handler(data, query, path_params)
+        validator = getattr(handler, "__validator__", None)
+        if validator is not None and method == "GET":
+            self.validators = validator(self, query, path_params)
+            if self.validators is not None and self.not_modified(self.validators):
+                return Result(ok=True, status_code=304)
+
+        if not self.admitted:
+            rejected = self.admit()
+            if rejected is not None:
+                return rejected
+        self.mark_phase(ROUTE)
+        try:
+            if getattr(handler, "__coalesce__", False):
+                key = (
+                    method,
+                    path,
+                    tuple(sorted((k, tuple(v)) for k, v in (query or {}).items())),
+                    self.body_digest,
+                )
+                result, _ = self.single_flight.do(
+                    key, lambda: handler(data, query, path_params)
+                )
+                return result
+            return handler(data, query, path_params)
+        finally:
+            self.mark_phase(HANDLER)
+            self.release()
+
+    def admit(self) -> Result | None:
+        """Проверка лимитов до хендлера; Result — отказ, None — можно работать."""
+        admission = self.admission
+        if admission is None:
+            return None
+        retry_after = admission.check_rate(self.client_address[0], self.route_label)
+        if retry_after:
+            return Result(
+                ok=False,
+                status_code=429,
+                error="Слишком много запросов",
+                retry_after=retry_after,
+            )
+        if admission.limiter is not None and not admission.limiter.acquire():
+            return Result(
+                ok=False,
+                status_code=503,
+                error="Сервер перегружен",
+                retry_after=admission.shed_retry_after,
+            )
+        self.admitted = True
+        return None
+
+    def release(self) -> None:
+        """Вернуть слот admission; повторный вызов ничего не делает."""
+        if self.admitted:
+            self.admitted = False
+            if self.admission.limiter is not None:
+                self.admission.limiter.release()
 
     def parse_path(
         self, method: str, path: str
@@ -284,49 +1326,34 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
         if handler_name is not None:
             return handler_name, None, None
 
-        allowed: set[str] = set()
-        for (route_method, route_path), route_handler in self.ROUTES.items():
-            # проверка совпадения path с route_path (точно или по шаблону)
-            route_parts = route_path.strip("/").split("/")
-            path_parts = path.strip("/").split("/")
-
-            if len(route_parts) != len(path_parts):
-                continue
-
-            params: dict[str, str] = {}
-            matched = True
-
-            for rp, pp in zip(route_parts, path_parts):
-                if rp.startswith("<") and rp.endswith(">"):
-                    param_name = rp[1:-1]
-                    if not param_name:
-                        matched = False
-                        break
-                    params[param_name] = pp
-                else:
-                    if rp != pp:
-                        matched = False
-                        break
-
-            if not matched:
-                continue
-
-            # path совпал. значит этот route_path существует, просто метод может быть другой
-            allowed.add(route_method)
-
-            # если метод совпал — это наш хендлер
-            if route_method == method:
+        matches = self.match_route(path)
+        for node, params in matches:
+            route_handler = node.handlers.get(method)
+            if route_handler is not None:
                 return route_handler, params, None
 
         # если path существует, но method не тот — 405
-        if allowed:
+        if len(matches) == 1:
+            return None, None, matches[0][0].allowed
+        if matches:
+            allowed: set[str] = set()
+            for node, _ in matches:
+                allowed.update(node.handlers)
             return None, None, ",".join(sorted(allowed))
 
         # иначе вообще не найден
         return None, None, None
 
     def respond(self, result: Result, ok_wrapper: str | None = None) -> None:
+        # маршрутизация, если хендлер не вызывался (404, 405, 304, 429)
+        self.mark_phase(ROUTE)
+        if result.status_code == 304:
+            return self.send_not_modified(self.validators)
         if result.ok:
+            if isinstance(result.value, PlainText):
+                return self.send_text(200, result.value)
+            if isinstance(result.value, StaticFile):
+                return self.send_file(200, result.value.file)
             if ok_wrapper is None:
                 return self.send_json(200, result.value)
             return self.send_json(200, {ok_wrapper: result.value})
@@ -338,15 +1365,162 @@ class SimpleHandler(RouterMixin, BaseHTTPRequestHandler):
             )
 
         status = result.status_code or 500
-        return self.send_json(status, {"error": result.error or "Ошибка"})
+        headers = ()
+        if result.retry_after is not None:
+            headers = (retry_after_header(result.retry_after),)
+        return self.send_json(status, {"error": result.error or "Ошибка"}, headers)
+
+
+class KeepAliveHandler(SimpleHandler):
+    """
+    HTTP/1.1 с постоянными соединениями.
+    Соединение закрывается после простоя timeout секунд
+    или после max_requests запросов.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+    max_requests = 100
+
+    def setup(self) -> None:
+        super().setup()
+        self.requests_served = 0
+
+    def handle_one_request(self) -> None:
+        self.requests_served += 1
+        super().handle_one_request()
+
+    def send_response(self, code: int, message: str | None = None) -> None:
+        super().send_response(code, message)
+        if self.requests_served >= self.max_requests or self.close_connection:
+            # send_header сам выставит close_connection; True — тело не дочитано
+            self.send_header("Connection", "close")
+        else:
+            self.send_header(
+                "Keep-Alive", f"timeout={self.timeout}, max={self.max_requests}"
+            )
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer, обслуживающий соединения ограниченным пулом потоков."""
+
+    def __init__(self, server_address, handler_class, max_workers: int = 16):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="http"
+        )
+
+    def process_request(self, request, client_address) -> None:
+        self.pool.submit(self.process_request_in_pool, request, client_address)
+
+    def process_request_in_pool(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Учебный HTTP-сервер")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="размер пула потоков; 0 — один поток, HTTP/1.0",
+    )
+    parser.add_argument(
+        "--keepalive-timeout", type=int, default=KeepAliveHandler.timeout
+    )
+    parser.add_argument(
+        "--access-log", action="store_true", help="буферизованный access-лог"
+    )
+    parser.add_argument(
+        "--keepalive-requests", type=int, default=KeepAliveHandler.max_requests
+    )
+    parser.add_argument(
+        "--client-rate", type=float, help="запросов в секунду на клиента"
+    )
+    parser.add_argument("--client-burst", type=float, help="запас токенов клиента")
+    parser.add_argument(
+        "--max-in-flight", type=int, help="одновременных запросов в работе"
+    )
+    parser.add_argument(
+        "--max-queue", type=int, default=0, help="сколько ждут слот сверх лимита"
+    )
+    parser.add_argument(
+        "--max-wait", type=float, default=1.0, help="сколько секунд ждать слот"
+    )
+    parser.add_argument(
+        "--max-body",
+        type=int,
+        default=MAX_BODY_SIZE,
+        help="лимит тела запроса в байтах (если маршрут не задал свой)",
+    )
+    parser.add_argument(
+        "--body-timeout",
+        type=float,
+        default=BODY_TIMEOUT,
+        help="за сколько секунд должно прийти тело запроса",
+    )
+    parser.add_argument("--static-dir", help="каталог с файлами для GET /static/<имя>")
+    parser.add_argument(
+        "--profile-every",
+        type=int,
+        default=0,
+        help="каждый N-й запрос под cProfile; снимки — GET /debug/profile",
+    )
+    parser.add_argument(
+        "--profile-slow-ms",
+        type=float,
+        help="снимать стеки запросов дольше стольких миллисекунд",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    server_address = ("localhost", 8000)
-    httpd = HTTPServer(server_address, SimpleHandler)
-    print("Server started at http://localhost:8000")
+    args = parse_args()
+    server_address = (args.host, args.port)
+    SimpleHandler.max_body_size = args.max_body
+    SimpleHandler.body_timeout = args.body_timeout
+    SimpleHandler.static_dir = args.static_dir
+    SimpleHandler.profiler.configure(
+        args.profile_every,
+        None if args.profile_slow_ms is None else args.profile_slow_ms / 1000,
+    )
+    if args.access_log:
+        SimpleHandler.access_log = AccessLog(sys.stderr)
+    if args.client_rate is not None or args.max_in_flight is not None:
+        SimpleHandler.admission = Admission(
+            client_rate=args.client_rate,
+            client_burst=args.client_burst,
+            max_in_flight=args.max_in_flight,
+            max_queue=args.max_queue,
+            max_wait=args.max_wait,
+        )
+
+    if args.threads > 0:
+        KeepAliveHandler.timeout = args.keepalive_timeout
+        KeepAliveHandler.max_requests = args.keepalive_requests
+        httpd = PooledHTTPServer(
+            server_address, KeepAliveHandler, max_workers=args.threads
+        )
+    else:
+        httpd = HTTPServer(server_address, SimpleHandler)
+    httpd.RequestHandlerClass.freeze()
+
+    print(f"Server started at http://{args.host}:{args.port}")
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         pass
+    finally:
+        httpd.server_close()
     print("Server остановлен")
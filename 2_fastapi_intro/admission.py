@@ -0,0 +1,226 @@
+"""
+Admission control: что делать с запросом, пока он не начал работу.
+
+- token bucket на клиента и на маршрут: превышение -> 429 + Retry-After;
+- лимит одновременно выполняемых запросов с ограниченной очередью:
+  нет места в очереди или не дождались слота -> 503 + Retry-After.
+
+Отказ быстрый и дешёвый, поэтому под перегрузкой задержка принятых
+запросов определяется лимитом, а не длиной очереди в сокете.
+Состояние — в памяти процесса: при pre-fork у каждого воркера своё.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Hashable
+
+if TYPE_CHECKING:
+    import asyncio
+
+TOO_MANY_REQUESTS = "429 Too Many Requests"
+SERVICE_UNAVAILABLE = "503 Service Unavailable"
+
+
+class RateLimiter:
+    """
+    Token bucket на ключ: rate токенов в секунду, не больше burst.
+    Вёдра лежат в OrderedDict по времени последнего обращения, поэтому
+    простаивающие удаляются с начала за O(1) амортизированно.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        idle_ttl: float = 60.0,
+        max_keys: int = 100_000,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        # удалённое ведро пересоздаётся полным — значит, к этому моменту
+        # оно и так успело бы наполниться
+        self.idle_ttl = max(idle_ttl, self.burst / rate)
+        self.max_keys = max_keys
+        # key -> [tokens, updated]
+        self._buckets: OrderedDict[Hashable, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable, cost: float = 1.0) -> float:
+        """0.0 — токен выдан; иначе через сколько секунд он появится."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                self._expire(now)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / self.rate
+
+    def _expire(self, now: float) -> None:
+        buckets = self._buckets
+        while buckets:
+            _, updated = next(iter(buckets.values()))
+            if now - updated < self.idle_ttl and len(buckets) <= self.max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """
+    Не больше max_in_flight запросов одновременно; ещё max_queue ждут
+    слот не дольше max_wait секунд. Очередь FIFO: новые не обгоняют ждущих.
+    """
+
+    def __init__(
+        self, max_in_flight: int, max_queue: int = 0, max_wait: float = 1.0
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """timeout — сократить ожидание в очереди (остаток дедлайна запроса)."""
+        with self._cond:
+            if self.in_flight < self.max_in_flight and not self.waiting:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+                deadline = time.monotonic() + wait
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+
+class AsyncConcurrencyLimiter:
+    """То же для event loop: ждущие — futures, слот передаётся из рук в руки."""
+
+    def __init__(
+        self, max_in_flight: int, max_queue: int = 0, max_wait: float = 1.0
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self, timeout: float | None = None) -> bool:
+        # asyncio нужен только ASGI: WSGI-воркер не платит за его импорт
+        import asyncio
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+            await asyncio.wait_for(waiter, max(wait, 0.0))
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # in_flight не меняется: слот перешёл
+                return
+        self.in_flight -= 1
+
+
+class Admission:
+    """
+    Настройки и состояние admission control для App/AsyncApp.
+    Любой из лимитов можно не задавать.
+    """
+
+    def __init__(
+        self,
+        client_rate: float | None = None,
+        client_burst: float | None = None,
+        route_rates: dict[str, float] | None = None,
+        max_in_flight: int | None = None,
+        max_queue: int = 0,
+        max_wait: float = 1.0,
+    ) -> None:
+        self.clients = (
+            RateLimiter(client_rate, client_burst) if client_rate is not None else None
+        )
+        # шаблон пути -> общий для всех клиентов лимит маршрута
+        self.routes = {
+            route: RateLimiter(rate) for route, rate in (route_rates or {}).items()
+        }
+        self.limiter = self.async_limiter = None
+        if max_in_flight is not None:
+            self.limiter = ConcurrencyLimiter(max_in_flight, max_queue, max_wait)
+            self.async_limiter = AsyncConcurrencyLimiter(
+                max_in_flight, max_queue, max_wait
+            )
+        # клиенту с 503 предлагаем прийти, когда очередь успеет рассосаться
+        self.shed_retry_after = max(1, math.ceil(max_wait))
+
+    def check_rate(self, client: str | None, route: str | None) -> float:
+        """0.0 — можно; иначе Retry-After в секундах."""
+        if self.clients is not None:
+            wait = self.clients.acquire(client)
+            if wait:
+                return wait
+        limiter = self.routes.get(route)
+        if limiter is not None:
+            return limiter.acquire(route)
+        return 0.0
+
+
+def retry_after_header(seconds: float) -> tuple[str, str]:
+    return "Retry-After", str(max(1, math.ceil(seconds)))
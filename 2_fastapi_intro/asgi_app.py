@@ -0,0 +1,563 @@
+"""
+ASGI-версия приложения из wsgi_app.py.
+
+Роутер, Request/Response и идея middleware те же, но:
+- handler может быть async def; обычные (sync) handler'ы выполняются
+  в ограниченном пуле потоков и не блокируют event loop;
+- middleware в AsyncApp — только async def (req, call_next) -> Response.
+
+Запуск любым ASGI-сервером, например:
+    uvicorn asgi_app:app
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+)
+from urllib.parse import parse_qs
+
+from admission import Admission
+from compression import Compressor
+from headers import EnvironHeaders
+from metrics import AccessLog
+from result_cache import ResultCache
+from profiling import Profiler
+from single_flight import AsyncSingleFlight
+from wsgi_app import (
+    AnyResponse,
+    App,
+    BodyError,
+    DeadlineExceeded,
+    NDJSON,
+    BodyStream,
+    FileResponse,
+    Handler,
+    LineTooLong,
+    Request,
+    Response,
+    StreamResponse,
+    _body_bytes,
+    _request_var,
+    _too_large,
+    active_codec,
+    check_deadline,
+    json_response,
+    ndjson_response,
+    take_lines,
+)
+
+AsyncHandler = Callable[[Request], Awaitable[AnyResponse]]
+AsyncMiddleware = Callable[[Request, AsyncHandler], Awaitable[AnyResponse]]
+
+DEFAULT_SYNC_WORKERS = 16
+# расширение ASGI: отдача файла сервером без чтения в приложение
+ZEROCOPY_SEND = "http.response.zerocopysend"
+
+
+class ASGIRequest(Request):
+    """Request поверх ASGI scope: заголовки и query тоже разбираются лениво."""
+
+    __slots__ = ("scope",)
+
+    def __init__(self, scope: dict) -> None:
+        super().__init__(
+            method=scope.get("method", "GET").upper(), path=scope.get("path") or "/"
+        )
+        self.scope = scope
+
+    @property
+    def client(self) -> str | None:
+        client = self.scope.get("client")
+        return client[0] if client else None
+
+    def _load_query(self) -> dict[str, list[str]]:
+        query_string = (self.scope.get("query_string") or b"").decode("latin-1")
+        return parse_qs(query_string, keep_blank_values=True)
+
+    def _load_headers(self) -> EnvironHeaders:
+        return EnvironHeaders.from_pairs(
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in self.scope.get("headers") or []
+        )
+
+    async def load_body(self, receive) -> None:
+        # тело читается до вызова handler'а: sync-код в потоке не может его ждать;
+        # NDJSON — исключение, его строки читает сам handler через aiter_lines()
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith(NDJSON):
+            self._body = b""
+            self._stream = ASGIBodyStream(receive, self.body_timeout)
+            return
+        self._body = await _read_asgi_body(receive, self.max_body, self.body_timeout)
+        self._stream = None
+
+    def iter_lines(self) -> Iterator[bytes]:
+        if isinstance(self._stream, ASGIBodyStream):
+            raise TypeError("streamed ASGI body must be read with aiter_lines()")
+        return super().iter_lines()
+
+    async def aiter_lines(self) -> AsyncIterator[bytes]:
+        if isinstance(self._stream, ASGIBodyStream):
+            async for line in self._stream.iter_lines():
+                yield line
+            return
+        for line in self.body.splitlines():
+            yield line
+
+
+class ASGIBodyStream:
+    """
+    Тело из сообщений http.request по мере их прихода: в памяти не больше
+    одной строки и одного сообщения. Каждое сообщение должно прийти
+    за timeout секунд, иначе BodyError 408.
+    """
+
+    MAX_LINE = BodyStream.MAX_LINE
+
+    def __init__(self, receive, timeout: float) -> None:
+        self.receive = receive
+        self.timeout = timeout
+        self._done = False
+
+    async def read(self) -> bytes:
+        while not self._done:
+            try:
+                message = await asyncio.wait_for(self.receive(), self.timeout)
+            except asyncio.TimeoutError:
+                raise BodyError(
+                    "408 Request Timeout", "Request body was not received in time"
+                ) from None
+            if message["type"] == "http.disconnect":
+                self._done = True
+                break
+            self._done = not message.get("more_body", False)
+            data = message.get("body", b"")
+            if data:
+                return data
+        return b""
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        buffer = bytearray()
+        while data := await self.read():
+            buffer += data
+            for line in take_lines(buffer, self.MAX_LINE):
+                yield line
+        if buffer:
+            yield bytes(buffer)
+
+
+def build_asgi_request(scope: dict) -> ASGIRequest:
+    return ASGIRequest(scope)
+
+
+async def _read_asgi_body(receive, limit: int, timeout: float) -> bytes:
+    """Тело не больше limit байт, целиком за timeout секунд."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    chunks: list[bytes] = []
+    size = 0
+    while True:
+        try:
+            message = await asyncio.wait_for(receive(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            raise BodyError(
+                "408 Request Timeout", "Request body was not received in time"
+            ) from None
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise _too_large(limit)
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+async def _aiter(
+    chunks: Iterable[bytes] | AsyncIterable[bytes],
+) -> AsyncIterator[bytes]:
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+class AsyncApp(App):
+    def __init__(
+        self,
+        sync_workers: int = DEFAULT_SYNC_WORKERS,
+        json_codec: str | None = None,
+        result_cache: ResultCache | None = None,
+        access_log: AccessLog | None = None,
+        compressor: Compressor | None = None,
+        admission: Admission | None = None,
+        profiler: Profiler | None = None,
+        static_dir: str | None = None,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=sync_workers, thread_name_prefix="asgi-sync"
+        )
+        # для async def handler'ов; sync-handler'ы в пуле — через SingleFlight
+        self.async_single_flight = AsyncSingleFlight()
+        super().__init__(
+            json_codec=json_codec,
+            result_cache=result_cache,
+            access_log=access_log,
+            compressor=compressor,
+            admission=admission,
+            profiler=profiler,
+            static_dir=static_dir,
+        )
+
+    def _register_routes(self) -> None:
+        super()._register_routes()
+        self.router.add("GET", "/sleep", self.handle_sleep)
+
+    # ---- handlers ----
+
+    def handle_operation(self, req: Request) -> AnyResponse:
+        if isinstance(req, ASGIRequest) and isinstance(req.stream, ASGIBodyStream):
+            return ndjson_response(self._astream_operations(req))
+        return super().handle_operation(req)
+
+    async def _astream_operations(self, req: ASGIRequest) -> AsyncIterator[dict]:
+        # как _stream_operations, но строки приходят из receive() по мере чтения
+        codec = active_codec()
+        try:
+            async for line in req.aiter_lines():
+                if line.strip():
+                    check_deadline(req)
+                    yield self._stream_item(codec, line)
+        except (LineTooLong, BodyError, DeadlineExceeded) as e:
+            yield {"error": str(e)}
+
+    async def handle_sleep(self, req: Request) -> Response:
+        try:
+            seconds = float((req.query.get("seconds") or ["1"])[0])
+        except ValueError:
+            return json_response(
+                {"error": "seconds must be a number"}, status="400 Bad Request"
+            )
+        seconds = min(max(seconds, 0.0), 10.0)
+        await asyncio.sleep(seconds)
+        return json_response({"slept": seconds})
+
+    # ---- single-flight ----
+
+    def coalesced(self, handler: Handler | AsyncHandler) -> Handler | AsyncHandler:
+        if not inspect.iscoroutinefunction(handler):
+            return super().coalesced(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(req: Request) -> AnyResponse:
+            key = self._flight_key(req)
+            if key is None:
+                return await handler(req)
+            resp, shared = await self.async_single_flight.do(key, lambda: handler(req))
+            if shared and type(resp) is not Response:
+                return await handler(req)
+            return resp
+
+        return wrapper
+
+    def _flight_stats(self) -> dict[str, int]:
+        threaded = super()._flight_stats()
+        coroutines = self.async_single_flight.stats()
+        return {name: threaded[name] + coroutines[name] for name in threaded}
+
+    # ---- middlewares ----
+
+    def add_middleware(self, middleware: AsyncMiddleware) -> None:
+        if not inspect.iscoroutinefunction(middleware):
+            raise TypeError("AsyncApp middleware must be an async function")
+        super().add_middleware(middleware)
+
+    def _to_async(self, handler: Handler | AsyncHandler) -> AsyncHandler:
+        if inspect.iscoroutinefunction(handler):
+            return handler
+
+        async def run_in_pool(req: Request) -> Response:
+            # копия контекста — чтобы get_request() работал и в потоке
+            ctx = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, ctx.run, handler, req)
+
+        return run_in_pool
+
+    def _build_chain(self, handler: Handler | AsyncHandler) -> AsyncHandler:
+        return super()._build_chain(self._to_async(handler))
+
+    def _timed(self, handler: AsyncHandler) -> AsyncHandler:
+        # для sync-handler'а сюда входит и ожидание свободного потока в пуле
+        async def timed(req: Request) -> AnyResponse:
+            start = time.perf_counter()
+            try:
+                return await handler(req)
+            finally:
+                req.handler_time += time.perf_counter() - start
+
+        return timed
+
+    async def admission_middleware(
+        self, req: Request, handler: AsyncHandler
+    ) -> AnyResponse:
+        rejected = self._check_rate(req)
+        if rejected is not None:
+            return rejected
+        limiter = self.admission.async_limiter
+        if limiter is None:
+            return await handler(req)
+        if not await limiter.acquire(req.time_left()):
+            return self._shed_response(req)
+        try:
+            return await handler(req)
+        finally:
+            limiter.release()
+
+    async def compression_middleware(
+        self, req: Request, handler: AsyncHandler
+    ) -> AnyResponse:
+        resp = await handler(req)
+        if type(resp) is not Response or len(resp.body) < self.compressor.min_size:
+            return resp
+        # сжатие большого тела — в пуле, чтобы не блокировать event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._compress, req, resp)
+
+    async def conditional_middleware(
+        self, req: Request, handler: AsyncHandler
+    ) -> AnyResponse:
+        return self._conditional(req, await handler(req))
+
+    async def deadline_middleware(
+        self, req: Request, handler: AsyncHandler
+    ) -> AnyResponse:
+        # в отличие от потока корутину можно отменить: по дедлайну ответ 504
+        # уходит сразу; sync-handler в пуле дорабатывает до своей check_deadline()
+        left = req.time_left()
+        try:
+            if left is None:
+                return await handler(req)
+            check_deadline()
+            return await asyncio.wait_for(handler(req), left)
+        except (DeadlineExceeded, asyncio.TimeoutError):
+            return self._deadline_response()
+
+    async def error_middleware(self, req: Request, handler: AsyncHandler) -> Response:
+        try:
+            return await handler(req)
+        except Exception as e:
+            return json_response(
+                {"error": "Internal Server Error", "detail": str(e)},
+                status="500 Internal Server Error",
+            )
+
+    # ---- ASGI entrypoint ----
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        start = time.perf_counter()
+        req = build_asgi_request(scope)
+        token = _request_var.set(req)
+        sample = None
+
+        try:
+            if self.profiler.sampling:
+                sample = self.profiler.begin()
+            parsed = time.perf_counter()
+            node, params = self.router.match(req.path, req.method)
+            handler = node.handlers[req.method] if node is not None else None
+
+            if handler is None:
+                resp = self._no_route_response(req)
+            else:
+                req.path_params.update(params)
+                req.route = node.template
+                resp = self._precondition(req, node)
+                if resp is None:
+                    resp = self._limit_body(req, node)
+                if resp is None:
+                    resp = self._set_deadline(req, node)
+            routed = time.perf_counter()
+            if resp is None:
+                resp = await self._load_body(req, receive)
+            handled = time.perf_counter()
+            body_time = handled - routed
+            if resp is None:
+                resp = await self._get_chain(handler)(req)
+                handled = time.perf_counter()
+            self._record(req, node, resp.status, start)
+        except BaseException:
+            if sample is not None:
+                self.profiler.discard(sample)
+            raise
+        finally:
+            _request_var.reset(token)
+
+        serialized = time.perf_counter()
+        try:
+            await self._send(scope, send, resp)
+        except BaseException:
+            if sample is not None:
+                self.profiler.discard(sample)
+            raise
+        self._profile(
+            sample,
+            req,
+            node,
+            resp.status,
+            (start, parsed, routed, handled, serialized),
+            body_time=body_time,
+            write_time=time.perf_counter() - serialized,
+        )
+
+    async def _send(self, scope: dict, send, resp: AnyResponse) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(resp.status.split(" ", 1)[0]),
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in resp.headers
+                ],
+            }
+        )
+        if isinstance(resp, StreamResponse):
+            async for chunk in _aiter(resp.chunks):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+        elif isinstance(resp, FileResponse):
+            await self._send_file(scope, send, resp)
+        else:
+            await send({"type": "http.response.body", "body": _body_bytes(resp.body)})
+
+    async def _load_body(self, req: ASGIRequest, receive) -> Response | None:
+        try:
+            # тело читаем только для найденного маршрута
+            await req.load_body(receive)
+        except BodyError as e:
+            return json_response({"error": str(e)}, status=e.status)
+        return None
+
+    async def _send_file(self, scope: dict, send, resp: FileResponse) -> None:
+        try:
+            if ZEROCOPY_SEND in (scope.get("extensions") or {}):
+                # сервер сам отдаст файл через sendfile
+                await send({"type": ZEROCOPY_SEND, "file": resp.file})
+                return
+            # чтение с диска — в пуле, чтобы не блокировать event loop
+            loop = asyncio.get_running_loop()
+            while block := await loop.run_in_executor(
+                self.executor, resp.file.read, resp.block_size
+            ):
+                await send(
+                    {"type": "http.response.body", "body": block, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            resp.file.close()
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.freeze()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+# ====== In-process клиент ======
+
+
+async def asgi_request(
+    asgi_app,
+    method: str,
+    path: str,
+    *,
+    query_string: str = "",
+    headers: dict[str, str] | None = None,
+    body: bytes = b"",
+    json_body: Any = None,
+) -> tuple[int, list[tuple[str, str]], bytes]:
+    """
+    Выполняет один запрос к ASGI-приложению без сети.
+    Возвращает (status, headers, body).
+    """
+    if json_body is not None:
+        body = json.dumps(json_body).encode("utf-8")
+        headers = {"Content-Type": "application/json", **(headers or {})}
+
+    raw_headers = [
+        (k.lower().encode("latin-1"), v.encode("latin-1"))
+        for k, v in (headers or {}).items()
+    ]
+    raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method.upper(),
+        "path": path,
+        "query_string": query_string.encode("latin-1"),
+        "headers": raw_headers,
+    }
+
+    request_sent = False
+
+    async def receive() -> dict:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # тело уже передано; дальше клиент просто держит соединение
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    status = 0
+    response_headers: list[tuple[str, str]] = []
+    chunks: list[bytes] = []
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.extend(
+                (k.decode("latin-1"), v.decode("latin-1"))
+                for k, v in message.get("headers", [])
+            )
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await asgi_app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
+
+
+app = AsyncApp()
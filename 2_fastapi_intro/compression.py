@@ -0,0 +1,177 @@
+"""
+Сжатие ответов по Accept-Encoding: br (если установлен brotli), gzip, deflate.
+
+Сжимаются только "текстовые" типы и только тела не меньше min_size:
+маленькие ответы от сжатия почти не выигрывают. Для неизменяемых ответов
+(static=True) сжатые варианты кэшируются и строятся с максимальной
+степенью сжатия: платим за неё один раз.
+
+Если ответ мог бы быть сжат, в нём всегда есть Vary: Accept-Encoding —
+даже когда клиент сжатие не просил, иначе прокси отдаст не тот вариант.
+"""
+
+from __future__ import annotations
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен
+    brotli = None
+
+MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    return zlib.compress(body, level, wbits=31)
+
+
+def _deflate(body: bytes, level: int) -> bytes:
+    # "deflate" в HTTP — это zlib-обёртка, а не "сырой" deflate
+    return zlib.compress(body, level)
+
+
+def _brotli(body: bytes, level: int) -> bytes:
+    # уровни zlib 1..9 -> качество brotli 1..11
+    return brotli.compress(body, quality=min(11, round(level * 11 / 9)))
+
+
+CODERS: dict[str, Callable[[bytes, int], bytes]] = {"gzip": _gzip, "deflate": _deflate}
+if brotli is not None:
+    CODERS["br"] = _brotli
+# при равных q выбирается то, что раньше
+PREFERENCE = tuple(c for c in ("br", "gzip", "deflate") if c in CODERS)
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    codings: dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(header: str) -> str | None:
+    """Лучшее из поддерживаемых кодирований или None (identity)."""
+    if not header:
+        return None
+    codings = parse_accept_encoding(header)
+    default = codings.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in PREFERENCE:
+        q = codings.get(coding, default)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+Headers = list[tuple[str, str]]
+
+
+class Compressor:
+    def __init__(
+        self,
+        min_size: int = MIN_SIZE,
+        level: int = 6,
+        static_level: int = 9,
+        cache_size: int = 128,
+    ) -> None:
+        self.min_size = min_size
+        self.level = level
+        self.static_level = static_level
+        self.cache_size = cache_size
+        # (id(body), coding) -> (body, сжатое); body держим, чтобы id не переиспользовался
+        self._cache: OrderedDict[tuple[int, str], tuple[bytes, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, body: bytes, coding: str, static: bool = False) -> bytes:
+        if not static:
+            return CODERS[coding](body, self.level)
+
+        key = (id(body), coding)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] is body:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        compressed = CODERS[coding](body, self.static_level)
+        with self._lock:
+            self._cache[key] = (body, compressed)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def compress_response(
+        self,
+        accept_encoding: str,
+        headers: Headers,
+        body: bytes,
+        static: bool = False,
+    ) -> tuple[Headers, bytes]:
+        """
+        Возвращает (headers, body) — новые, если ответ сжат или получил Vary,
+        иначе те же объекты.
+        """
+        if len(body) < self.min_size:
+            return headers, body
+
+        content_type = ""
+        vary = None
+        for name, value in headers:
+            lname = name.lower()
+            if lname == "content-encoding":
+                return headers, body  # уже сжато
+            if lname == "content-type":
+                content_type = value
+            elif lname == "vary":
+                vary = value
+        if not is_compressible(content_type):
+            return headers, body
+
+        new_headers = [
+            (name, value)
+            for name, value in headers
+            if name.lower() not in ("vary", "content-length")
+        ]
+        if vary is None:
+            new_headers.append(("Vary", "Accept-Encoding"))
+        elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+            new_headers.append(("Vary", f"{vary}, Accept-Encoding"))
+        else:
+            new_headers.append(("Vary", vary))
+
+        coding = choose_encoding(accept_encoding)
+        if coding is not None:
+            compressed = self.compress(body, coding, static)
+            # если сжатие не помогло, отдаём как есть
+            if len(compressed) < len(body):
+                body = compressed
+                new_headers.append(("Content-Encoding", coding))
+        new_headers.append(("Content-Length", str(len(body))))
+        return new_headers, body
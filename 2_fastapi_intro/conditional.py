@@ -0,0 +1,70 @@
+"""
+Условные GET-запросы: ETag / Last-Modified и ответ 304 Not Modified.
+
+Маршрут может объявить validator — дешёвую функцию (req) -> Validators,
+которая вызывается до handler'а. Если клиент прислал совпадающий
+If-None-Match (или If-Modified-Since не старше Last-Modified),
+handler не вызывается вовсе. Без validator'а ETag слабый, по хэшу тела:
+ответ всё равно строится, но по сети уходит только 304.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+
+
+@dataclass(frozen=True)
+class Validators:
+    # уже в кавычках: '"v1"' или 'W/"..."'
+    etag: str | None = None
+    # unix time
+    last_modified: float | None = None
+
+    def headers(self) -> list[tuple[str, str]]:
+        h = []
+        if self.etag is not None:
+            h.append(("ETag", self.etag))
+        if self.last_modified is not None:
+            h.append(("Last-Modified", formatdate(self.last_modified, usegmt=True)))
+        return h
+
+
+def make_etag(value: object, weak: bool = False) -> str:
+    return f'W/"{value}"' if weak else f'"{value}"'
+
+
+def body_etag(body: bytes | memoryview) -> str:
+    return make_etag(hashlib.blake2b(body, digest_size=8).hexdigest(), weak=True)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # для If-None-Match сравнение слабое: W/ не учитывается
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def is_not_modified(
+    if_none_match: str | None,
+    if_modified_since: str | None,
+    validators: Validators,
+) -> bool:
+    if if_none_match:
+        # при If-None-Match дата не проверяется (RFC 9110, 13.1.3)
+        return validators.etag is not None and etag_matches(
+            if_none_match, validators.etag
+        )
+    if if_modified_since and validators.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # в HTTP-дате нет долей секунды
+        return int(validators.last_modified) <= since
+    return False
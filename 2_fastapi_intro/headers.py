@@ -0,0 +1,94 @@
+"""
+Заголовки запроса поверх WSGI environ, без копирования.
+
+EnvironHeaders — регистронезависимый Mapping: headers["content-type"]
+и headers["Content-Type"] читают один ключ environ (CONTENT_TYPE).
+Перевод имён в ключи environ и обратно кэшируется на уровне модуля,
+так что строковая работа делается один раз на имя, а не на запрос.
+Весь environ перебирается только при итерации по заголовкам.
+
+Повторяющиеся заголовки WSGI-сервер склеивает через запятую;
+getlist() разбирает их обратно.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Mapping
+
+# без префикса HTTP_ (PEP 3333)
+_SPECIAL = {"CONTENT_TYPE": "Content-Type", "CONTENT_LENGTH": "Content-Length"}
+# кэши растут от имён, присланных клиентом, — ограничиваем
+_MAX_CACHE = 4096
+# имя заголовка (как передали) -> ключ environ
+_ENVIRON_KEYS: dict[str, str] = {}
+# ключ environ -> каноническое имя ("X-Forwarded-For") или "" для не-заголовков
+_NAMES: dict[str, str] = {}
+
+
+def environ_key(name: str) -> str:
+    key = _ENVIRON_KEYS.get(name)
+    if key is None:
+        key = name.upper().replace("-", "_")
+        if key not in _SPECIAL:
+            key = "HTTP_" + key
+        if len(_ENVIRON_KEYS) >= _MAX_CACHE:
+            _ENVIRON_KEYS.clear()
+        _ENVIRON_KEYS[name] = key
+    return key
+
+
+def header_name(key: str) -> str:
+    """Каноническое имя заголовка для ключа environ; "" — не заголовок."""
+    name = _NAMES.get(key)
+    if name is None:
+        if key.startswith("HTTP_"):
+            name = key[5:].replace("_", "-").title()
+        else:
+            name = _SPECIAL.get(key, "")
+        if len(_NAMES) >= _MAX_CACHE:
+            _NAMES.clear()
+        _NAMES[key] = name
+    return name
+
+
+class EnvironHeaders(Mapping[str, str]):
+    __slots__ = ("environ",)
+
+    def __init__(self, environ: Mapping[str, str]) -> None:
+        self.environ = environ
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[tuple[str, str]]) -> EnvironHeaders:
+        """Из списка (имя, значение), например из ASGI scope["headers"]."""
+        environ: dict[str, str] = {}
+        for name, value in pairs:
+            key = environ_key(name)
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return cls(environ)
+
+    def __getitem__(self, name: str) -> str:
+        return self.environ[environ_key(name)]
+
+    def get(self, name: str, default=None):
+        return self.environ.get(environ_key(name), default)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and environ_key(name) in self.environ
+
+    def getlist(self, name: str) -> list[str]:
+        value = self.get(name)
+        if value is None:
+            return []
+        return [part.strip() for part in value.split(",")]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.environ:
+            name = header_name(key)
+            if name:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"EnvironHeaders({dict(self.items())!r})"
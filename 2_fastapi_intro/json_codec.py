@@ -0,0 +1,136 @@
+"""
+Сменный JSON-кодек: orjson / ujson, если установлены, иначе stdlib json.
+
+Все кодеки работают с bytes в обе стороны: dumps() сразу возвращает
+UTF-8 bytes, loads() принимает bytes (или memoryview) без промежуточного
+.decode(). Ошибки разбора — ValueError: тело не в UTF-8 у любого кодека
+даёт UnicodeDecodeError, остальное — json.JSONDecodeError.
+
+int больше 64 бит orjson читает как float, а ujson не читает вовсе:
+тела с такими числами (19 цифр подряд) разбирает stdlib json.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Callable
+
+
+class JsonCodec:
+    def __init__(
+        self,
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ) -> None:
+        self.name = name
+        self._dumps = dumps
+        self.loads = loads
+
+    def dumps(self, data: Any) -> bytes:
+        try:
+            return self._dumps(data)
+        except (TypeError, OverflowError):
+            # orjson/ujson не умеют int больше 64 бит (а pow их даёт)
+            if self is STDLIB:
+                raise
+            return STDLIB.dumps(data)
+
+    def __repr__(self) -> str:
+        return f"JsonCodec({self.name!r})"
+
+
+def _stdlib_dumps(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _stdlib_loads(data: bytes) -> Any:
+    # json.loads не читает memoryview; bytes(bytes) — тот же объект, без копии
+    return json.loads(bytes(data))
+
+
+STDLIB = JsonCodec("json", _stdlib_dumps, _stdlib_loads)
+
+LONG_DIGITS = re.compile(rb"\d{19}")
+
+
+def _like_stdlib(loads: Callable[[bytes], Any]) -> Callable[[bytes], Any]:
+    """Большие int и ошибки кодировки — как у stdlib json."""
+
+    def stdlib_loads(data: bytes) -> Any:
+        if LONG_DIGITS.search(data):
+            return json.loads(bytes(data))
+        try:
+            return loads(data)
+        except ValueError:
+            # orjson/ujson сообщают о не-UTF-8 как о неверном JSON
+            bytes(data).decode("utf-8")
+            raise
+
+    return stdlib_loads
+
+
+def _load_orjson() -> JsonCodec | None:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return JsonCodec("orjson", orjson.dumps, _like_stdlib(orjson.loads))
+
+
+def _load_ujson() -> JsonCodec | None:
+    try:
+        import ujson
+    except ImportError:
+        return None
+
+    def dumps(data: Any) -> bytes:
+        return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    def loads(data: bytes) -> Any:
+        try:
+            return ujson.loads(bytes(data))
+        except ValueError as e:
+            if isinstance(e, json.JSONDecodeError):
+                raise
+            raise json.JSONDecodeError(str(e), "", 0) from None
+
+    return JsonCodec("ujson", dumps, _like_stdlib(loads))
+
+
+_LOADERS: dict[str, Callable[[], JsonCodec | None]] = {
+    "orjson": _load_orjson,
+    "ujson": _load_ujson,
+    "json": lambda: STDLIB,
+}
+# порядок выбора для "auto"
+PREFERENCE = ("orjson", "ujson", "json")
+
+
+def get_codec(name: str = "auto") -> JsonCodec:
+    if name == "auto":
+        for candidate in PREFERENCE:
+            codec = _LOADERS[candidate]()
+            if codec is not None:
+                return codec
+    if name not in _LOADERS:
+        raise ValueError(f"Unknown JSON codec: {name}")
+
+    codec = _LOADERS[name]()
+    if codec is None:
+        raise ImportError(f"JSON codec {name!r} is not installed")
+    return codec
+
+
+_active = get_codec("auto")
+
+
+def active_codec() -> JsonCodec:
+    return _active
+
+
+def set_codec(name: str) -> JsonCodec:
+    global _active
+    _active = get_codec(name)
+    return _active
@@ -0,0 +1,235 @@
+"""
+Метрики запросов внутри процесса.
+
+- счётчики по (route, method, status);
+- гистограммы задержек с фиксированными корзинами (как в Prometheus);
+- вывод в текстовом формате Prometheus для GET /metrics;
+- необязательный access-лог: буферизованный, пишется фоновым потоком,
+  поэтому print() больше не стоит на пути запроса.
+
+Блокировка — своя у каждой серии (route, method), так что потоки,
+обслуживающие разные маршруты, друг другу не мешают.
+
+При pre-fork у каждого воркера свои метрики. Если передать counters
+(shared_state.SharedCounters), http_requests_total считается в общей
+памяти и /metrics любого воркера отдаёт сумму по всем; гистограммы
+задержек остаются в процессе.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import queue
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, TextIO
+
+if TYPE_CHECKING:
+    from shared_state import SharedCounters
+
+# верхние границы корзин в секундах; последняя корзина — +Inf
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Series:
+    """Счётчики статусов и гистограмма задержек одного маршрута."""
+
+    __slots__ = ("buckets", "counts", "total", "sum", "statuses", "lock")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.statuses: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, status: str, seconds: float) -> None:
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.total += 1
+            self.sum += seconds
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def snapshot(self) -> tuple[list[int], int, float, dict[str, int]]:
+        with self.lock:
+            return list(self.counts), self.total, self.sum, dict(self.statuses)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины."""
+        counts, total, _, _ = self.snapshot()
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(
+        self,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        counters: SharedCounters | None = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.series: dict[tuple[str, str], Series] = {}
+        self._lock = threading.Lock()
+        self.counters = counters
+
+    def observe(self, route: str, method: str, status: str, seconds: float) -> None:
+        key = (route, method)
+        series = self.series.get(key)
+        if series is None:
+            with self._lock:
+                series = self.series.setdefault(key, Series(self.buckets))
+        series.observe(status, seconds)
+        if self.counters is not None:
+            self.counters.add(f"{route}\t{method}\t{status}")
+
+    def request_totals(self) -> list[tuple[str, str, str, int]]:
+        """(route, method, status, count): из общей памяти, если она есть."""
+        if self.counters is not None:
+            return sorted(
+                (*name.split("\t"), count)
+                for name, count in self.counters.snapshot().items()
+            )
+        return [
+            (route, method, status, count)
+            for (route, method), series in sorted(self.series.items())
+            for status, count in sorted(series.snapshot()[3].items())
+        ]
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """p50/p90/p99 и число запросов по маршрутам — для сравнения серверов."""
+        result = {}
+        for (route, method), series in list(self.series.items()):
+            result[f"{method} {route}"] = {
+                "count": series.total,
+                "p50_ms": round(series.quantile(0.50) * 1000, 3),
+                "p90_ms": round(series.quantile(0.90) * 1000, 3),
+                "p99_ms": round(series.quantile(0.99) * 1000, 3),
+            }
+        return result
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP http_requests_total Number of HTTP requests.",
+            "# TYPE http_requests_total counter",
+        ]
+        snapshots = [
+            (route, method, *series.snapshot())
+            for (route, method), series in sorted(self.series.items())
+        ]
+
+        for route, method, status, count in self.request_totals():
+            labels = _labels(route=route, method=method, status=status)
+            lines.append(f"http_requests_total{{{labels}}} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds HTTP request latency.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for route, method, counts, total, seconds, _ in snapshots:
+            labels = _labels(route=route, method=method)
+            cumulative = 0
+            for upper, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{upper}"}}'
+                    f" {cumulative}"
+                )
+            lines.append(
+                f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {total}'
+            )
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {seconds}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {total}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class AccessLog:
+    """
+    Access-лог без блокирующей записи в потоке запроса:
+    строки копятся в очереди, фоновый поток пишет их пачками.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        flush_interval: float = 0.5,
+        max_queue: int = 10_000,
+    ) -> None:
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.max_queue = max_queue
+        # поток запускается при первой записи в каждом процессе:
+        # после fork() потоки родителя в дочернем процессе не существуют
+        self._pid: int | None = None
+        self._start_lock = threading.Lock()
+        self._queue: queue.Queue[str] = queue.Queue(maxsize=max_queue)
+
+    def _start(self) -> None:
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        threading.Thread(target=self._run, name="access-log", daemon=True).start()
+
+    def log(self, method: str, path: str, status: str, seconds: float) -> None:
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        line = f"{method} {path} -> {status} {seconds * 1000:.2f} ms"
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            # под перегрузкой лог теряем, а не тормозим запросы
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while time.monotonic() < deadline:
+                try:
+                    lines.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
@@ -0,0 +1,218 @@
+"""
+Pre-fork запуск WSGI-приложения только на стандартной библиотеке.
+
+Мастер-процесс открывает слушающий сокет и делает fork() N воркеров.
+Каждый воркер обслуживает запросы своим WSGIServer (по желанию — с пулом
+потоков). Мастер перезапускает упавших воркеров, а по SIGTERM/SIGINT
+останавливает всех: воркеры дорабатывают начатые запросы и выходят.
+
+Работает только там, где есть os.fork (Linux, macOS).
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer
+
+from wsgi_sendfile import SendfileRequestHandler
+
+# сколько ждать воркеров при остановке, прежде чем добить SIGKILL
+GRACEFUL_TIMEOUT = 10.0
+# воркер, умерший быстрее этого, считается "падающим при старте"
+MIN_WORKER_LIFETIME = 1.0
+REAP_INTERVAL = 0.2
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGIServer, который обрабатывает соединения в ограниченном пуле потоков."""
+
+    def __init__(self, *args, threads: int = 0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool = (
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+            if threads > 0
+            else None
+        )
+
+    def process_request(self, request, client_address) -> None:
+        if self.pool is None:
+            return super().process_request(request, client_address)
+        self.pool.submit(self._process_request_in_pool, request, client_address)
+
+    def _process_request_in_pool(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        if self.pool is not None:
+            # дождаться запросов, которые уже в работе
+            self.pool.shutdown(wait=True)
+        super().server_close()
+
+
+def make_listen_socket(
+    host: str, port: int, reuse_port: bool = False, backlog: int = 1024
+) -> socket.socket:
+    return socket.create_server((host, port), backlog=backlog, reuse_port=reuse_port)
+
+
+def make_worker_server(app, sock: socket.socket, threads: int = 0) -> PooledWSGIServer:
+    server = PooledWSGIServer(
+        sock.getsockname()[:2],
+        SendfileRequestHandler,
+        bind_and_activate=False,
+        threads=threads,
+    )
+    # сокет уже открыт мастером (или самим воркером при SO_REUSEPORT)
+    server.socket.close()
+    server.socket = sock
+    host, port = sock.getsockname()[:2]
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+    server.setup_environ()
+    server.set_app(app)
+    return server
+
+
+def _run_worker(
+    app, sock: socket.socket | None, address: tuple[str, int], threads: int
+) -> None:
+    # Ctrl+C в терминале получает вся группа процессов — остановкой управляет мастер
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if sock is None:
+        sock = make_listen_socket(*address, reuse_port=True)
+    server = make_worker_server(app, sock, threads=threads)
+
+    def stop(signum, frame) -> None:
+        # shutdown() блокируется до выхода из serve_forever — вызываем из потока
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class PreforkServer:
+    def __init__(
+        self,
+        app,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 2,
+        threads: int = 0,
+        reuse_port: bool = False,
+    ) -> None:
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Pre-fork mode requires os.fork (Linux/macOS)")
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        self.app = app
+        self.address = (host, port)
+        self.workers = workers
+        self.threads = threads
+        self.reuse_port = reuse_port
+
+        # при SO_REUSEPORT каждый воркер открывает свой сокет,
+        # иначе все наследуют один сокет мастера
+        self.sock = None if reuse_port else make_listen_socket(host, port)
+        self.children: dict[int, float] = {}  # pid -> время запуска
+        self._stopping = False
+
+    def spawn_worker(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self.app, self.sock, self.address, self.threads)
+            except BaseException:
+                exit_code = 1
+                import traceback
+
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _reap(self) -> list[tuple[int, int, float]]:
+        """Собирает завершившихся детей: [(pid, status, lifetime)]."""
+        dead = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.children.pop(pid, None)
+            if started is not None:
+                dead.append((pid, status, time.monotonic() - started))
+        return dead
+
+    def serve_forever(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        for _ in range(self.workers):
+            self.spawn_worker()
+        print(
+            f"Мастер {os.getpid()}: {self.workers} воркеров на "
+            f"http://{self.address[0]}:{self.address[1]}"
+        )
+
+        try:
+            while not self._stopping:
+                time.sleep(REAP_INTERVAL)
+                for pid, status, lifetime in self._reap():
+                    if self._stopping:
+                        break
+                    print(f"Воркер {pid} завершился (status={status}), перезапуск")
+                    if lifetime < MIN_WORKER_LIFETIME:
+                        # не устраиваем fork-бомбу, если воркер падает сразу
+                        time.sleep(MIN_WORKER_LIFETIME)
+                    self.spawn_worker()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = GRACEFUL_TIMEOUT) -> None:
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(REAP_INTERVAL / 2)
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self._reap()
+            time.sleep(REAP_INTERVAL / 2)
+
+        if self.sock is not None:
+            self.sock.close()
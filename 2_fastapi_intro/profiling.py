@@ -0,0 +1,287 @@
+"""
+Профилирование горячего пути: фазы запроса и выборочные снимки.
+
+Фазы (PHASES) меряются у каждого запроса разностью perf_counter(). Запрос
+только кладёт их в окно последних phase_window запросов (deque.append —
+без замка), средние по маршрутам считаются при чтении отчёта.
+write доступна только ASGI — в WSGI ответ пишет сервер, уже после App.
+
+Выборка включается отдельно (configure()):
+- sample_every=N — каждый N-й запрос целиком под cProfile;
+- slow_threshold=s — фоновый поток раз в interval снимает стек
+  (sys._current_frames) у запросов, идущих дольше s секунд.
+Снимки — фазы, топ функций cProfile, свёрнутые стеки — попадают
+в кольцевой буфер на capacity записей. Пока выборка выключена, запрос
+платит только за фазы и одну проверку.
+
+cProfile в процессе может работать только один (в Python 3.12+ он
+занимает общий для процесса sys.monitoring): пока один запрос под
+профилировщиком, выборка следующих его пропускает. В AsyncApp все корутины
+живут в одном потоке, поэтому снимок cProfile и стеки медленного запроса
+включают и соседей по event loop.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import cProfile
+
+PHASES = ("parse", "route", "middleware", "handler", "serialize", "write")
+DEFAULT_CAPACITY = 64
+PHASE_WINDOW = 4096
+SAMPLE_INTERVAL = 0.01
+# строк cProfile и разных стеков в одном снимке
+TOP_ENTRIES = 20
+MAX_STACK_DEPTH = 64
+
+
+class Sample:
+    """Запрос под наблюдением: его поток, старт, cProfile и снятые стеки."""
+
+    __slots__ = ("thread", "start", "profile", "stacks")
+
+    def __init__(self, start: float, profile: cProfile.Profile | None) -> None:
+        self.thread = threading.get_ident()
+        self.start = start
+        self.profile = profile
+        self.stacks: Counter[str] = Counter()
+
+
+def fold_stack(frame: Any) -> str:
+    """Стек в одну строку, от внешнего вызова к текущему: "a (f.py:1);b (g.py:2)"."""
+    parts = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        parts.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def profile_rows(profile: cProfile.Profile, top: int = TOP_ENTRIES) -> list[dict]:
+    import pstats
+
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {
+            "function": f"{os.path.basename(file)}:{line}({name})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (file, line, name), (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+class Profiler:
+    def __init__(
+        self,
+        sample_every: int = 0,
+        slow_threshold: float | None = None,
+        capacity: int = DEFAULT_CAPACITY,
+        interval: float = SAMPLE_INTERVAL,
+        phase_window: int = PHASE_WINDOW,
+    ) -> None:
+        self.interval = interval
+        self.captures: deque[dict[str, Any]] = deque(maxlen=capacity)
+        # (route, фазы) последних запросов
+        self.recent: deque[tuple[str, tuple[float, ...]]] = deque(maxlen=phase_window)
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        # id(Sample) -> Sample: запросы, которые видит поток выборки
+        self._in_flight: dict[int, Sample] = {}
+        # работает ли сейчас cProfile: второй в процессе не запустить
+        self._profiling = False
+        self._sampler: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.sample_every = 0
+        self.slow_threshold: float | None = None
+        self.sampling = False
+        self.configure(sample_every, slow_threshold)
+
+    def configure(
+        self, sample_every: int = 0, slow_threshold: float | None = None
+    ) -> None:
+        if sample_every < 0 or (slow_threshold is not None and slow_threshold < 0):
+            raise ValueError("sample_every and slow_threshold must be >= 0")
+        self.sample_every = sample_every
+        self.slow_threshold = slow_threshold
+        self.sampling = bool(sample_every) or slow_threshold is not None
+        if slow_threshold is None and self._sampler is not None:
+            self._stop.set()
+            self._sampler = None
+
+    # ---- на каждый запрос ----
+
+    def begin(self) -> Sample | None:
+        """В начале запроса, если sampling; None — запрос не наблюдается."""
+        profile = None
+        if self.sample_every and next(self._counter) % self.sample_every == 0:
+            profile = self._start_profile()
+        if profile is None and self.slow_threshold is None:
+            return None
+
+        sample = Sample(time.perf_counter(), profile)
+        if self.slow_threshold is not None:
+            self._ensure_sampler()
+            with self._lock:
+                self._in_flight[id(sample)] = sample
+        return sample
+
+    def record(
+        self,
+        sample: Sample | None,
+        route: str,
+        method: str,
+        status: str,
+        phases: tuple[float, ...],
+    ) -> None:
+        """В конце запроса; phases — секунды в порядке PHASES."""
+        self.recent.append((route, phases))
+        if sample is not None:
+            with self._lock:
+                self._in_flight.pop(id(sample), None)
+            self._finish(sample, route, method, status, phases)
+
+    def discard(self, sample: Sample) -> None:
+        """Запрос упал мимо record(): снять его с наблюдения."""
+        with self._lock:
+            self._in_flight.pop(id(sample), None)
+        if sample.profile is not None:
+            sample.profile.disable()
+            self._profiling = False
+
+    def _start_profile(self) -> cProfile.Profile | None:
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # профилировщик включил кто-то помимо нас
+            self._profiling = False
+            return None
+        return profile
+
+    def _finish(
+        self,
+        sample: Sample,
+        route: str,
+        method: str,
+        status: str,
+        phases: tuple[float, ...],
+    ) -> None:
+        total = time.perf_counter() - sample.start
+        capture: dict[str, Any] = {
+            "time": time.time(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "total_ms": round(total * 1000, 3),
+            "phases_ms": {
+                name: round(seconds * 1000, 3) for name, seconds in zip(PHASES, phases)
+            },
+        }
+        if sample.profile is not None:
+            sample.profile.disable()
+            self._profiling = False
+            capture["reason"] = "sampled"
+            capture["profile"] = profile_rows(sample.profile)
+        elif self.slow_threshold is not None and total >= self.slow_threshold:
+            capture["reason"] = "slow"
+        else:
+            return
+        if sample.stacks:
+            capture["stacks"] = [
+                {"stack": stack, "samples": count}
+                for stack, count in sample.stacks.most_common(TOP_ENTRIES)
+            ]
+        self.captures.append(capture)
+
+    # ---- поток выборки стеков ----
+
+    def _ensure_sampler(self) -> None:
+        # после fork потока мастера в воркере нет: запускаем свой
+        sampler = self._sampler
+        if sampler is not None and sampler.is_alive():
+            return
+        with self._lock:
+            if self._sampler is not None and self._sampler.is_alive():
+                return
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(
+                target=self._sample_loop,
+                args=(self._stop,),
+                name="profiler-sampler",
+                daemon=True,
+            )
+            self._sampler.start()
+
+    def _sample_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            threshold = self.slow_threshold
+            if threshold is None:
+                return
+            now = time.perf_counter()
+            with self._lock:
+                slow = [
+                    s for s in self._in_flight.values() if now - s.start >= threshold
+                ]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            stacks = [(s, frames.get(s.thread)) for s in slow]
+            with self._lock:
+                # запрос мог закончиться, а _finish() — уже читать его stacks
+                for sample, frame in stacks:
+                    if frame is not None and id(sample) in self._in_flight:
+                        sample.stacks[fold_stack(frame)] += 1
+
+    # ---- отчёт ----
+
+    def phase_summary(self) -> dict[str, dict[str, Any]]:
+        """Средние фазы по маршрутам за окно последних запросов."""
+        phases: dict[str, list[float]] = {}
+        for route, values in list(self.recent):
+            totals = phases.get(route)
+            if totals is None:
+                totals = phases[route] = [0.0] * (len(PHASES) + 1)
+            totals[0] += 1
+            for i, seconds in enumerate(values, 1):
+                totals[i] += seconds
+        return {
+            route: {
+                "count": int(totals[0]),
+                "mean_ms": {
+                    name: round(seconds / totals[0] * 1000, 4)
+                    for name, seconds in zip(PHASES, totals[1:])
+                },
+            }
+            for route, totals in sorted(phases.items())
+        }
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "sample_every": self.sample_every,
+            "slow_threshold_ms": (
+                None if self.slow_threshold is None else self.slow_threshold * 1000
+            ),
+            "capacity": self.captures.maxlen,
+            "phase_window": self.recent.maxlen,
+            "phases": self.phase_summary(),
+            "captures": list(self.captures),
+        }
@@ -0,0 +1,123 @@
+"""
+Кэш результатов детерминированных операций.
+
+LRU-вытеснение, необязательный TTL и ограничение по объёму в байтах
+(а не по числу записей): один огромный результат pow может весить
+больше тысячи мелких. Потокобезопасен — один lock на кэш.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# запись в OrderedDict, кортеж (value, expires_at, size) и сам ключ
+ENTRY_OVERHEAD = 200
+
+
+def number_key(x: Any) -> Hashable:
+    """
+    Ключ числа с учётом типа: 1, 1.0 и True равны как ключи dict,
+    но дают разные результаты (3 и 3.0), а 0.0 и -0.0 — разные знаки.
+    """
+    if isinstance(x, float):
+        return float, x.hex()
+    return type(x), x
+
+
+def estimate_size(value: Any) -> int:
+    if isinstance(value, type):
+        return 0  # классы общие для всех ключей
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float | None = None,
+        max_item_bytes: int | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # слишком большие значения не кэшируем, чтобы не вымывать всё остальное
+        self.max_item_bytes = max_item_bytes or max_bytes // 4
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        size = estimate_size(key) + estimate_size(value) + ENTRY_OVERHEAD
+        if size > self.max_item_bytes:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+            }
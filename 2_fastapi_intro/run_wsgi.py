@@ -1,11 +1,131 @@
+import argparse
 from wsgiref.simple_server import make_server
-from wsgi_app import app
+from admission import Admission
+from metrics import AccessLog
+from wsgi_app import BODY_TIMEOUT, MAX_BODY_SIZE, App, app
+from wsgi_sendfile import SendfileRequestHandler
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Запуск WSGI-приложения")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="число процессов (pre-fork)"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=0, help="размер пула потоков в процессе"
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="SO_REUSEPORT: свой сокет у каждого воркера",
+    )
+    parser.add_argument(
+        "--access-log", action="store_true", help="буферизованный access-лог"
+    )
+    parser.add_argument(
+        "--client-rate", type=float, help="запросов в секунду на клиента"
+    )
+    parser.add_argument("--client-burst", type=float, help="запас токенов клиента")
+    parser.add_argument(
+        "--max-in-flight", type=int, help="одновременных запросов на процесс"
+    )
+    parser.add_argument(
+        "--max-queue", type=int, default=0, help="сколько ждут слот сверх лимита"
+    )
+    parser.add_argument(
+        "--max-wait", type=float, default=1.0, help="сколько секунд ждать слот"
+    )
+    parser.add_argument(
+        "--max-body",
+        type=int,
+        default=MAX_BODY_SIZE,
+        help="лимит тела запроса в байтах (если маршрут не задал свой)",
+    )
+    parser.add_argument(
+        "--body-timeout",
+        type=float,
+        default=BODY_TIMEOUT,
+        help="за сколько секунд должно прийти тело запроса",
+    )
+    parser.add_argument(
+        "--profile-every",
+        type=int,
+        default=0,
+        help="каждый N-й запрос под cProfile; снимки — GET /debug/profile",
+    )
+    parser.add_argument(
+        "--profile-slow-ms",
+        type=float,
+        help="снимать стеки запросов дольше стольких миллисекунд",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        help="таймаут обработки запроса в секундах, после него 504"
+        " (клиент может сократить заголовком X-Request-Timeout)",
+    )
+    parser.add_argument("--static-dir", help="каталог с файлами для GET /static/<путь>")
+    parser.add_argument(
+        "--shared-state",
+        action="store_true",
+        help="общие для воркеров кэш результатов и счётчики запросов",
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    with make_server("127.0.0.1", 8000, app) as httpd:
-        print("Сервер запущен по адресу: http://127.0.0.1:8000")
+    args = parse_args()
+    if args.client_rate is not None or args.max_in_flight is not None:
+        app = App(
+            admission=Admission(
+                client_rate=args.client_rate,
+                client_burst=args.client_burst,
+                max_in_flight=args.max_in_flight,
+                max_queue=args.max_queue,
+                max_wait=args.max_wait,
+            )
+        )
+    app.max_body_size = args.max_body
+    app.body_timeout = args.body_timeout
+    app.request_timeout = args.request_timeout
+    app.static_dir = args.static_dir
+    app.profiler.configure(
+        args.profile_every,
+        None if args.profile_slow_ms is None else args.profile_slow_ms / 1000,
+    )
+    if args.access_log:
+        app.access_log = AccessLog()
+    if args.shared_state:
+        # до fork: воркеры наследуют одну и ту же общую память
+        from metrics import Metrics
+        from shared_state import SharedCounters, SharedResultCache
+
+        app.result_cache = SharedResultCache()
+        app.metrics = Metrics(counters=SharedCounters())
+    # до fork: воркеры наследуют готовые цепочки и ответы
+    app.freeze()
+
+    if args.workers > 1 or args.threads > 0 or args.reuse_port:
+        from prefork import PreforkServer
+
+        PreforkServer(
+            app,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads=args.threads,
+            reuse_port=args.reuse_port,
+        ).serve_forever()
+        print("Сервер остановлен")
+    else:
+        with make_server(
+            args.host, args.port, app, handler_class=SendfileRequestHandler
+        ) as httpd:
+            print(f"Сервер запущен по адресу: http://{args.host}:{args.port}")
 
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("Сервер остановлен")
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                print("Сервер остановлен")
@@ -0,0 +1,289 @@
+"""
+Общее состояние воркеров pre-fork на одной машине, без внешнего Redis.
+
+Память — анонимный mmap (MAP_SHARED), замки — multiprocessing.Lock.
+И то и другое наследуется через fork, поэтому объекты создаются в мастере
+до PreforkServer.serve_forever(), а воркеры получают одно и то же.
+
+- SharedHashTable — хэш-таблица на ячейках фиксированного размера:
+  ключ и значение — bytes ограниченной длины. Таблица разбита на полосы
+  (lock striping): хэш ключа выбирает полосу, поиск идёт только в ней
+  и только под её замком, так что воркеры с разными ключами не мешают
+  друг другу. Открытая адресация с коротким окном проб: если окно занято,
+  запись вытесняет ячейку — для кэша это нормально.
+- SharedCounters — массив int64-счётчиков; имя -> номер слота хранится
+  в SharedHashTable, у каждого процесса ещё и свой кэш этого соответствия.
+- SharedResultCache — замена ResultCache для App, значения — pickle.
+"""
+
+from __future__ import annotations
+
+import mmap
+import multiprocessing
+import pickle
+import struct
+import zlib
+from typing import Any, Hashable, Iterator
+
+# состояние ячейки
+EMPTY, USED, DELETED = 0, 1, 2
+# state, длина ключа, длина значения, хэш ключа
+CELL_HEADER = struct.Struct("<BxHII")
+# сколько ячеек подряд просматривается от "домашней"
+MAX_PROBE = 8
+# статистика полосы, int64 в начале её памяти: items, hits, misses, evictions
+SEGMENT_STATS = ("items", "hits", "misses", "evictions")
+
+
+def key_hash(key: bytes) -> int:
+    # hash() у bytes свой в каждом процессе (PYTHONHASHSEED) — нужен общий;
+    # crc32 в разы дешевле blake2b, а ключи всё равно сравниваются целиком
+    return zlib.crc32(key)
+
+
+class SharedHashTable:
+    def __init__(
+        self,
+        capacity: int = 65536,
+        key_size: int = 128,
+        value_size: int = 64,
+        stripes: int = 16,
+    ) -> None:
+        if capacity < stripes or stripes < 1:
+            raise ValueError("capacity must be >= stripes >= 1")
+        self.key_size = key_size
+        self.value_size = value_size
+        self.stripes = stripes
+        self.cells_per_stripe = capacity // stripes
+        self.capacity = self.cells_per_stripe * stripes
+        self.cell_size = CELL_HEADER.size + key_size + value_size
+        self.stats_size = 8 * len(SEGMENT_STATS)
+        self.stripe_size = self.stats_size + self.cells_per_stripe * self.cell_size
+
+        self._mem = mmap.mmap(-1, self.stripe_size * stripes)
+        self._view = memoryview(self._mem)
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        self._stripe_stats = [
+            self._view[i * self.stripe_size :][: self.stats_size].cast("q")
+            for i in range(stripes)
+        ]
+        self.rejected = 0  # не влезли в key_size/value_size; в этом процессе
+
+    def _cell(self, stripe: int, index: int) -> int:
+        return (
+            stripe * self.stripe_size
+            + self.stats_size
+            + (index % self.cells_per_stripe) * self.cell_size
+        )
+
+    def _locate(self, key: bytes, hashed: int) -> tuple[int | None, int | None]:
+        """Под замком полосы: (ячейка с ключом, свободная ячейка)."""
+        cells = self.cells_per_stripe
+        base = (hashed % self.stripes) * self.stripe_size + self.stats_size
+        home = hashed // self.stripes
+        free = None
+        for i in range(MAX_PROBE):
+            offset = base + (home + i) % cells * self.cell_size
+            state, key_len, _, cell_hash = CELL_HEADER.unpack_from(self._mem, offset)
+            if state == EMPTY:
+                return None, free if free is not None else offset
+            if state == DELETED:
+                if free is None:
+                    free = offset
+                continue
+            start = offset + CELL_HEADER.size
+            if cell_hash == hashed and self._view[start : start + key_len] == key:
+                return offset, free
+        return None, free
+
+    def _read_value(self, offset: int) -> bytes:
+        _, _, value_len, _ = CELL_HEADER.unpack_from(self._mem, offset)
+        start = offset + CELL_HEADER.size + self.key_size
+        return bytes(self._view[start : start + value_len])
+
+    def get(self, key: bytes) -> bytes | None:
+        hashed = key_hash(key)
+        stripe = hashed % self.stripes
+        with self._locks[stripe]:
+            offset, _ = self._locate(key, hashed)
+            stats = self._stripe_stats[stripe]
+            if offset is None:
+                stats[2] += 1
+                return None
+            stats[1] += 1
+            return self._read_value(offset)
+
+    def put(self, key: bytes, value: bytes, evict: bool = True) -> bool:
+        """False — не влезло по размеру или (evict=False) окно проб занято."""
+        if len(key) > self.key_size or len(value) > self.value_size:
+            self.rejected += 1
+            return False
+        hashed = key_hash(key)
+        stripe = hashed % self.stripes
+        with self._locks[stripe]:
+            offset, free = self._locate(key, hashed)
+            stats = self._stripe_stats[stripe]
+            if offset is None:
+                if free is not None:
+                    offset = free
+                    stats[0] += 1
+                elif evict:
+                    # окно занято: вытесняем "домашнюю" ячейку ключа
+                    offset = self._cell(stripe, hashed // self.stripes)
+                    stats[3] += 1
+                else:
+                    return False
+            self._write(offset, key, value, hashed)
+            return True
+
+    def _write(self, offset: int, key: bytes, value: bytes, hashed: int) -> None:
+        start = offset + CELL_HEADER.size
+        self._view[start : start + len(key)] = key
+        start += self.key_size
+        self._view[start : start + len(value)] = value
+        CELL_HEADER.pack_into(self._mem, offset, USED, len(key), len(value), hashed)
+
+    def delete(self, key: bytes) -> bool:
+        hashed = key_hash(key)
+        stripe = hashed % self.stripes
+        with self._locks[stripe]:
+            offset, _ = self._locate(key, hashed)
+            if offset is None:
+                return False
+            CELL_HEADER.pack_into(self._mem, offset, DELETED, 0, 0, 0)
+            self._stripe_stats[stripe][0] -= 1
+            return True
+
+    def items(self) -> Iterator[tuple[bytes, bytes]]:
+        """Снимок по полосам: каждая читается под своим замком."""
+        for stripe in range(self.stripes):
+            with self._locks[stripe]:
+                entries = []
+                for index in range(self.cells_per_stripe):
+                    offset = self._cell(stripe, index)
+                    state, key_len, _, _ = CELL_HEADER.unpack_from(self._mem, offset)
+                    if state == USED:
+                        start = offset + CELL_HEADER.size
+                        key = bytes(self._view[start : start + key_len])
+                        entries.append((key, self._read_value(offset)))
+            yield from entries
+
+    def clear(self) -> None:
+        for stripe in range(self.stripes):
+            with self._locks[stripe]:
+                start = stripe * self.stripe_size
+                self._view[start : start + self.stripe_size] = bytes(self.stripe_size)
+
+    def stats(self) -> dict[str, int]:
+        totals = dict.fromkeys(SEGMENT_STATS, 0)
+        for stripe in range(self.stripes):
+            with self._locks[stripe]:
+                values = self._stripe_stats[stripe].tolist()
+            for name, value in zip(SEGMENT_STATS, values):
+                totals[name] += value
+        return totals
+
+
+class SharedCounters:
+    """
+    Именованные int64-счётчики в общей памяти. Инкремент — под замком
+    полосы слота (slot % stripes), а не под одним общим замком.
+    """
+
+    def __init__(self, slots: int = 4096, stripes: int = 16) -> None:
+        self.slots = slots
+        self.stripes = stripes
+        # слот 0 — счётчик выданных слотов
+        self._mem = mmap.mmap(-1, 8 * (slots + 1))
+        self._values = memoryview(self._mem).cast("q")
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        self._alloc_lock = multiprocessing.Lock()
+        self._index = SharedHashTable(
+            capacity=max(2 * slots, stripes), key_size=128, value_size=4
+        )
+        # имя -> слот в этом процессе: после первого раза без обращения к таблице
+        self._local: dict[str, int] = {}
+
+    def slot(self, name: str) -> int:
+        slot = self._local.get(name)
+        if slot is not None:
+            return slot
+        key = name.encode("utf-8")
+        with self._alloc_lock:
+            raw = self._index.get(key)
+            if raw is None:
+                slot = self._values[0] + 1
+                if slot > self.slots:
+                    raise OverflowError(f"All {self.slots} counter slots are in use")
+                if not self._index.put(key, struct.pack("<I", slot), evict=False):
+                    raise OverflowError(f"Counter name index is full: {name!r}")
+                self._values[0] = slot
+            else:
+                (slot,) = struct.unpack("<I", raw)
+        self._local[name] = slot
+        return slot
+
+    def add(self, name: str, amount: int = 1) -> None:
+        slot = self.slot(name)
+        with self._locks[slot % self.stripes]:
+            self._values[slot] += amount
+
+    def get(self, name: str) -> int:
+        slot = self.slot(name)
+        with self._locks[slot % self.stripes]:
+            return self._values[slot]
+
+    def snapshot(self) -> dict[str, int]:
+        result = {}
+        for key, raw in self._index.items():
+            (slot,) = struct.unpack("<I", raw)
+            with self._locks[slot % self.stripes]:
+                result[key.decode("utf-8")] = self._values[slot]
+        return result
+
+
+class SharedResultCache:
+    """
+    Тот же интерфейс, что у ResultCache (get/put/clear/stats), но общий
+    для всех воркеров. Ключ — repr() ключа ResultCache (number_key даёт
+    однозначный repr), значение — pickle; не влезшее в ячейку не кэшируется.
+    Вытеснение — по окну проб, а не LRU; TTL нет.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 65536,
+        key_size: int = 128,
+        value_size: int = 64,
+        stripes: int = 16,
+    ) -> None:
+        self.table = SharedHashTable(capacity, key_size, value_size, stripes)
+
+    @staticmethod
+    def _key(key: Hashable) -> bytes:
+        return repr(key).encode("utf-8")
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        raw = self.table.get(self._key(key))
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return self.table.put(self._key(key), raw)
+
+    def clear(self) -> None:
+        self.table.clear()
+
+    def stats(self) -> dict[str, Any]:
+        stats = self.table.stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "capacity": self.table.capacity,
+            "stripes": self.table.stripes,
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "rejected": self.table.rejected,
+            "shared": True,
+        }
@@ -0,0 +1,133 @@
+"""
+Single-flight: одинаковые запросы, пришедшие одновременно, считаются один раз.
+
+Первый по ключу (ведущий) вызывает функцию, остальные ждут его и получают
+тот же результат или то же исключение. Ключ удаляется, как только ведущий
+закончил, — это не кэш: запрос, пришедший после, посчитается заново.
+
+SingleFlight — для потоков (WSGI, sync-handler'ы в пуле AsyncApp),
+AsyncSingleFlight — для корутин в одном event loop.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Hashable
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+def coalesced_metric(shared: int) -> str:
+    """Счётчик запросов, получивших чужой результат, — строки для /metrics."""
+    return (
+        "# HELP http_requests_coalesced_total Requests answered by an"
+        " identical request already in flight.\n"
+        "# TYPE http_requests_coalesced_total counter\n"
+        f"http_requests_coalesced_total {shared}\n"
+    )
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> tuple[Any, bool]:
+        """(результат, получен ли он от чужого вызова)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "shared": self.shared,
+            }
+
+
+class AsyncSingleFlight:
+    """То же для event loop: ждущие — на asyncio.Future ведущего."""
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        # asyncio нужен только ASGI: WSGI-воркер не платит за его импорт
+        import asyncio
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            try:
+                # shield: отмена ждущего не должна отменять вызов ведущего
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # отменили самого ждущего
+            # отменили ведущего (клиент ушёл) — считаем сами
+            return await func(), False
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # исключение получат ждущие; если их нет — не шуметь в логе
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+        }
@@ -2,12 +2,53 @@ from __future__ import annotations
 
 import contextvars
 import datetime as dt
-import json
+import functools
+import hashlib
+import ipaddress
+import math
+import mimetypes
+import operator
+import os
 import time
-from dataclasses import dataclass
-from typing import Any, Callable, Iterable
+from dataclasses import dataclass, replace
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+)
 from urllib.parse import parse_qs
 
+from admission import (
+    SERVICE_UNAVAILABLE,
+    TOO_MANY_REQUESTS,
+    Admission,
+    retry_after_header,
+)
+from compression import Compressor
+from conditional import Validators, body_etag, is_not_modified, make_etag
+from headers import EnvironHeaders
+from json_codec import active_codec, set_codec
+from metrics import AccessLog, Metrics
+from profiling import Profiler, Sample
+from result_cache import ResultCache, number_key
+from single_flight import SingleFlight, coalesced_metric
+
+
+@functools.cache
+def load_numpy():
+    """NumPy или None. Импорт (~0.1 с) — при первом большом batch, не при старте."""
+    try:
+        import numpy
+    except ImportError:  # NumPy необязателен: без него batch считается циклом
+        return None
+    return numpy
+
+
 # ====== HTTP primitives ======
 
 _request_var = contextvars.ContextVar("request")
@@ -17,11 +58,91 @@ def get_request() -> "Request":
     return _request_var.get()
 
 
+class DeadlineExceeded(Exception):
+    """Бюджет времени запроса исчерпан; App отвечает 504."""
+
+
+def time_left() -> float | None:
+    """Секунд до дедлайна текущего запроса; None — дедлайна нет (или запроса)."""
+    req = _request_var.get(None)
+    return req.time_left() if req is not None else None
+
+
+def check_deadline(req: Request | None = None) -> None:
+    """
+    Точка отмены для долгой работы: поток не прервать снаружи, поэтому
+    handler сам периодически проверяет, ждёт ли ещё клиент результата.
+    req — для тела StreamResponse: его читают уже вне контекста запроса.
+    """
+    left = time_left() if req is None else req.time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
 @dataclass(frozen=True)
 class Response:
     status: str
     headers: list[tuple[str, str]]
-    body: bytes
+    # memoryview — срез большого буфера без копирования до границы сервера
+    body: bytes | memoryview
+    # тело одно и то же от запроса к запросу: производные (сжатие) можно кэшировать
+    static: bool = False
+
+
+@dataclass(frozen=True)
+class StreamResponse:
+    """
+    Ответ, тело которого отдаётся по частям, по мере готовности.
+    Асинхронный итератор частей понимает только AsyncApp.
+    """
+
+    status: str
+    headers: list[tuple[str, str]]
+    chunks: Iterable[bytes] | AsyncIterable[bytes]
+
+
+FILE_BLOCK_SIZE = 256 * 1024
+
+
+@dataclass(frozen=True)
+class FileResponse:
+    """
+    Ответ из открытого файла. Отдаётся через wsgi.file_wrapper, если сервер
+    его предоставляет (и тогда может уйти через sendfile), иначе блоками.
+    Файл закрывается после отправки.
+    """
+
+    status: str
+    headers: list[tuple[str, str]]
+    file: BinaryIO
+    block_size: int = FILE_BLOCK_SIZE
+
+
+AnyResponse = Response | StreamResponse | FileResponse
+
+
+NDJSON = "application/x-ndjson"
+
+
+def ndjson_response(
+    items: Iterable[Any] | AsyncIterable[Any],
+    status: str = "200 OK",
+    headers: list[tuple[str, str]] | None = None,
+) -> StreamResponse:
+    codec = active_codec()
+    h = [("Content-Type", f"{NDJSON}; charset=utf-8")]
+    if headers:
+        h.extend(headers)
+    if hasattr(items, "__aiter__"):
+        chunks = _encode_lines_async(codec, items)
+    else:
+        chunks = (codec.dumps(item) + b"\n" for item in items)
+    return StreamResponse(status=status, headers=h, chunks=chunks)
+
+
+async def _encode_lines_async(codec, items: AsyncIterable[Any]) -> AsyncIterator[bytes]:
+    async for item in items:
+        yield codec.dumps(item) + b"\n"
 
 
 def json_response(
@@ -29,7 +150,7 @@ def json_response(
     status: str = "200 OK",
     headers: list[tuple[str, str]] | None = None,
 ) -> Response:
-    payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    payload = active_codec().dumps(data)
     h = [
         ("Content-Type", "application/json; charset=utf-8"),
         ("Content-Length", str(len(payload))),
@@ -54,120 +175,810 @@ def text_response(
     return Response(status=status, headers=h, body=payload)
 
 
+def file_response(
+    path: str,
+    content_type: str | None = None,
+    status: str = "200 OK",
+    headers: list[tuple[str, str]] | None = None,
+) -> FileResponse:
+    file = open(path, "rb")
+    size = os.fstat(file.fileno()).st_size
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    h = [("Content-Type", content_type), ("Content-Length", str(size))]
+    if headers:
+        h.extend(headers)
+    return FileResponse(status=status, headers=h, file=file)
+
+
+def iter_file(file: BinaryIO, block_size: int = FILE_BLOCK_SIZE) -> Iterator[bytes]:
+    try:
+        while block := file.read(block_size):
+            yield block
+    finally:
+        file.close()
+
+
+def _body_bytes(body: bytes | memoryview) -> bytes:
+    # PEP 3333 и wsgiref принимают только bytes
+    return body if type(body) is bytes else bytes(body)
+
+
+def not_modified_response(validators: Validators) -> Response:
+    return Response(status="304 Not Modified", headers=validators.headers(), body=b"")
+
+
 # ====== Request helpers ======
 
 
-@dataclass(frozen=True)
+# признак "ещё не вычислено" там, где None — допустимое значение
+_UNSET: Any = object()
+
+# лимит тела по умолчанию; маршрут может задать свой (Router.add(max_body=))
+MAX_BODY_SIZE = 1024 * 1024
+# за сколько секунд должно прийти всё тело, а не один его кусок
+BODY_TIMEOUT = 30.0
+BODY_READ_SIZE = 64 * 1024
+PAYLOAD_TOO_LARGE = "413 Payload Too Large"
+# бюджет запроса в секундах, который клиент готов ждать; может только сократить
+# таймаут маршрута, но не продлить его сверх App.max_request_timeout
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+MAX_REQUEST_TIMEOUT = 60.0
+GATEWAY_TIMEOUT = "504 Gateway Timeout"
+
+
 class Request:
-    method: str
-    path: str
-    query: dict[str, list[str]]
-    headers: dict[str, str]
-    body: bytes
+    """
+    Запрос поверх WSGI environ. query, headers, body и json() разбираются
+    при первом обращении и кэшируются, поэтому 404/405 и простые GET
+    почти ничего не парсят. Готовые значения можно передать сразу.
+    """
+
+    __slots__ = (
+        "method",
+        "path",
+        "environ",
+        "path_params",
+        "route",
+        "validators",
+        "max_body",
+        "body_timeout",
+        "deadline",
+        "handler_time",
+        "_query",
+        "_headers",
+        "_body",
+        "_stream",
+        "_json",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        environ: dict | None = None,
+        *,
+        query: dict[str, list[str]] | None = None,
+        headers: Mapping[str, str] | None = None,
+        body: bytes | None = None,
+    ) -> None:
+        self.method = method
+        self.path = path
+        self.environ = environ if environ is not None else {}
+        # заполняется роутером после сопоставления пути с шаблоном
+        self.path_params: dict[str, Any] = {}
+        # шаблон совпавшего маршрута ("/users/<user_id:int>")
+        self.route: str | None = None
+        # Validators маршрута, если он объявил validator (только GET)
+        self.validators: Validators | None = None
+        # лимиты чтения тела; App ставит лимит маршрута
+        self.max_body = MAX_BODY_SIZE
+        self.body_timeout = BODY_TIMEOUT
+        # time.monotonic(), после которого ответ уже никому не нужен
+        self.deadline: float | None = None
+        # секунды внутри handler'а, без middleware; фаза для Profiler
+        self.handler_time = 0.0
+        self._query = query
+        self._headers = headers
+        self._body = body
+        self._stream = _UNSET if body is None else None
+        self._json = _UNSET
+
+    def time_left(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def _load_query(self) -> dict[str, list[str]]:
+        return parse_qs(self.environ.get("QUERY_STRING") or "", keep_blank_values=True)
+
+    def _load_headers(self) -> Mapping[str, str]:
+        return EnvironHeaders(self.environ)
 
     @property
-    def text(self) -> str:
-        return self.body.decode("utf-8", errors="replace")
+    def client(self) -> str | None:
+        return self.environ.get("REMOTE_ADDR")
 
-    def json(self) -> Any:
-        if not self.body:
-            return None
-        return json.loads(self.body.decode("utf-8"))
+    @property
+    def is_local(self) -> bool:
+        """Клиент на этой машине; без адреса (unix-сокет, вызов в процессе) — тоже."""
+        client = self.client
+        if not client:
+            return True
+        try:
+            return ipaddress.ip_address(client).is_loopback
+        except ValueError:
+            return False
 
+    @property
+    def query(self) -> dict[str, list[str]]:
+        if self._query is None:
+            self._query = self._load_query()
+        return self._query
 
-def _get_headers(environ: dict) -> dict[str, str]:
-    headers: dict[str, str] = {}
+    @property
+    def headers(self) -> Mapping[str, str]:
+        if self._headers is None:
+            self._headers = self._load_headers()
+        return self._headers
 
-    for k, v in environ.items():
-        if k.startswith("HTTP_"):
-            name = k[5:].replace("_", "-").title()
-            headers[name] = v
+    @property
+    def stream(self) -> BodyStream | None:
+        # для потоковых типов (NDJSON) тело не читается целиком: body == b""
+        if self._stream is _UNSET:
+            content_type = self.environ.get("CONTENT_TYPE") or ""
+            self._stream = (
+                BodyStream.from_environ(self.environ)
+                if content_type.startswith(NDJSON)
+                else None
+            )
+        return self._stream
 
-    if "CONTENT_TYPE" in environ:
-        headers["Content-Type"] = environ["CONTENT_TYPE"]
-    if "CONTENT_LENGTH" in environ:
-        headers["Content-Length"] = environ["CONTENT_LENGTH"]
+    @property
+    def body(self) -> bytes | bytearray:
+        if self._body is None:
+            self._body = (
+                b""
+                if self.stream is not None
+                else _read_body(self.environ, self.max_body, self.body_timeout)
+            )
+        return self._body
 
-    return headers
+    def iter_lines(self) -> Iterator[bytes]:
+        if self.stream is not None:
+            return self.stream.iter_lines()
+        return iter(self.body.splitlines())
 
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
 
-def _read_body(environ: dict) -> bytes:
+    def json(self) -> Any:
+        if self._json is _UNSET:
+            body = self.body
+            self._json = active_codec().loads(body) if body else None
+        return self._json
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+class BodyError(Exception):
+    """
+    Тело запроса не принято: больше лимита, не пришло вовремя или целиком.
+    Не ValueError — чтобы handler не принял его за "Invalid JSON".
+    """
+
+    def __init__(self, status: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class BodyStream:
+    """
+    Читает тело запроса кусками: по Content-Length, по chunked-кодированию
+    (если сервер сам его не снял, как wsgiref) или до EOF.
+    Неверный размер chunk'а — BodyError 400.
+    """
+
+    READ_SIZE = 64 * 1024
+    MAX_LINE = 1024 * 1024
+
+    def __init__(self, raw, length: int | None, chunked: bool = False) -> None:
+        self.raw = raw
+        self.remaining = length
+        self.chunked = chunked
+        self._chunk_left = 0
+        self._done = False
+
+    @classmethod
+    def from_environ(cls, environ: dict) -> BodyStream:
+        raw = environ["wsgi.input"]
+        if environ.get("wsgi.input_terminated"):
+            return cls(raw, None)
+        if environ.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked":
+            return cls(raw, None, chunked=True)
+        return cls(raw, _content_length(environ))
+
+    def read(self, size: int = READ_SIZE) -> bytes:
+        if self._done:
+            return b""
+        if self.chunked:
+            return self._read_chunked(size)
+
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+            if size <= 0:
+                self._done = True
+                return b""
+        # read1 отдаёт то, что уже пришло, не дожидаясь полного size
+        data = getattr(self.raw, "read1", self.raw.read)(size)
+        if not data:
+            self._done = True
+        elif self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def _read_chunked(self, size: int) -> bytes:
+        if self._chunk_left == 0:
+            line = self.raw.readline(1024)
+            try:
+                self._chunk_left = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                self._done = True
+                raise BodyError("400 Bad Request", "Invalid chunked encoding") from None
+            if self._chunk_left == 0:
+                # trailer-заголовки до пустой строки
+                while line not in (b"\r\n", b"\n", b""):
+                    line = self.raw.readline(1024)
+                self._done = True
+                return b""
+
+        data = self.raw.read(min(size, self._chunk_left))
+        if not data:
+            self._done = True
+            return b""
+        self._chunk_left -= len(data)
+        if self._chunk_left == 0:
+            self.raw.readline(1024)  # CRLF после данных chunk'а
+        return data
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Строки тела без "\n"; в памяти не больше одной строки и одного куска."""
+        buffer = bytearray()
+        while data := self.read():
+            buffer += data
+            yield from take_lines(buffer, self.MAX_LINE)
+        if buffer:
+            yield bytes(buffer)
+
+
+def take_lines(buffer: bytearray, max_line: int) -> list[bytes]:
+    """
+    Забирает из buffer все законченные строки (без "\n"), в нём остаётся
+    хвост; LineTooLong, если хвост длиннее max_line.
+    """
+    lines = []
+    start = 0
+    while (end := buffer.find(b"\n", start)) >= 0:
+        lines.append(bytes(buffer[start:end]))
+        start = end + 1
+    del buffer[:start]
+    if len(buffer) > max_line:
+        raise LineTooLong(f"Line is longer than {max_line} bytes")
+    return lines
+
+
+def _content_length(environ: Mapping[str, str]) -> int:
     try:
-        length_str = environ.get("CONTENT_LENGTH") or "0"
-        length = int(length_str) if length_str else 0
+        return max(int(environ.get("CONTENT_LENGTH") or 0), 0)
     except ValueError:
-        length = 0
+        return 0
+
+
+def _too_large(limit: int) -> BodyError:
+    return BodyError(PAYLOAD_TOO_LARGE, f"Request body exceeds {limit} bytes")
+
 
-    if length <= 0:
+def _check_deadline(deadline: float) -> None:
+    # проверяется между кусками; один recv ограничен таймаутом сокета сервера
+    if time.monotonic() > deadline:
+        raise BodyError("408 Request Timeout", "Request body was not received in time")
+
+
+def _read_body(
+    environ: dict, limit: int = MAX_BODY_SIZE, timeout: float = BODY_TIMEOUT
+) -> bytes | bytearray:
+    """
+    Тело целиком, не больше limit байт. Лишний Content-Length отвергается
+    до чтения; тело читается кусками по BODY_READ_SIZE прямо в bytearray
+    нужного размера, и всё оно должно прийти за timeout секунд.
+    """
+    deadline = time.monotonic() + timeout
+    if environ.get("wsgi.input_terminated") or (
+        environ.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked"
+    ):
+        return _read_unsized_body(BodyStream.from_environ(environ), limit, deadline)
+
+    length = _content_length(environ)
+    if length > limit:
+        raise _too_large(limit)
+    if length == 0:
         return b""
 
-    return environ["wsgi.input"].read(length)
+    raw = environ["wsgi.input"]
+    # readinto1 не ждёт, пока заполнится весь кусок: срок проверяется чаще
+    readinto = getattr(raw, "readinto1", None) or getattr(raw, "readinto", None)
+    body = bytearray(length)
+    view = memoryview(body)
+    received = 0
+    while received < length:
+        _check_deadline(deadline)
+        chunk = view[received : received + BODY_READ_SIZE]
+        if readinto is not None:
+            size = readinto(chunk)
+        else:
+            data = raw.read(len(chunk))
+            size = len(data)
+            chunk[:size] = data
+        if not size:
+            raise BodyError("400 Bad Request", "Incomplete request body")
+        received += size
+    return body
+
+
+def _read_unsized_body(stream: BodyStream, limit: int, deadline: float) -> bytes:
+    # длина заранее неизвестна: лимит проверяется по мере чтения
+    chunks: list[bytes] = []
+    size = 0
+    while True:
+        _check_deadline(deadline)
+        data = stream.read(BODY_READ_SIZE)
+        if not data:
+            return b"".join(chunks)
+        size += len(data)
+        if size > limit:
+            raise _too_large(limit)
+        chunks.append(data)
 
 
 def build_request(environ: dict) -> Request:
-    method = (environ.get("REQUEST_METHOD") or "GET").upper()
-    path = environ.get("PATH_INFO") or "/"
-    query_string = environ.get("QUERY_STRING") or ""
-    query = parse_qs(query_string, keep_blank_values=True)
-    headers = _get_headers(environ)
-    body = _read_body(environ)
-
+    # только то, что нужно роутеру; остальное Request разберёт по требованию
     return Request(
-        method=method,
-        path=path,
-        query=query,
-        headers=headers,
-        body=body,
+        method=(environ.get("REQUEST_METHOD") or "GET").upper(),
+        path=environ.get("PATH_INFO") or "/",
+        environ=environ,
     )
 
 
 # ====== Routing ======
 
-Handler = Callable[[Request], Response]
-Middleware = Callable[[Request, Handler], Response]
+Handler = Callable[[Request], AnyResponse]
+Middleware = Callable[[Request, Handler], AnyResponse]
+# дешёвая функция "версии" ответа, вызывается до handler'а
+Validator = Callable[[Request], Validators | None]
+
+
+def _convert_int(value: str) -> int:
+    if not value.isdigit():
+        raise ValueError(value)
+    return int(value)
+
+
+def _convert_str(value: str) -> str:
+    if not value:
+        raise ValueError(value)
+    return value
+
+
+# <name:type> -> функция преобразования; ValueError означает "не совпало"
+CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "str": _convert_str,
+    "int": _convert_int,
+    "float": float,
+}
+# <name:path> — "хвост" пути вместе со слешами, допустим только последним
+CATCH_ALL = "path"
+
+
+def _split_path(path: str) -> list[str]:
+    return path.split("/")[1:]
+
+
+def _parse_param(segment: str) -> tuple[str, str] | None:
+    if not (len(segment) > 2 and segment[0] == "<" and segment[-1] == ">"):
+        return None
+    name, _, kind = segment[1:-1].partition(":")
+    kind = kind or "str"
+    if not name or (kind not in CONVERTERS and kind != CATCH_ALL):
+        raise ValueError(f"Invalid path parameter: {segment}")
+    return name, kind
+
+
+class RouteNode:
+    __slots__ = (
+        "static",
+        "params",
+        "catch_all",
+        "handlers",
+        "validators",
+        "body_limits",
+        "timeouts",
+        "template",
+    )
+
+    def __init__(self) -> None:
+        self.static: dict[str, RouteNode] = {}
+        # (имя, тип, узел); типизированные проверяются раньше str
+        self.params: list[tuple[str, str, RouteNode]] = []
+        self.catch_all: tuple[str, RouteNode] | None = None
+        self.handlers: dict[str, Handler] = {}
+        self.validators: dict[str, Validator] = {}
+        # method -> лимит тела, если маршрут задал свой
+        self.body_limits: dict[str, int] = {}
+        # method -> таймаут обработки, если маршрут задал свой
+        self.timeouts: dict[str, float] = {}
+        # шаблон пути; метка маршрута в метриках
+        self.template: str | None = None
+
+    def param_child(self, name: str, kind: str) -> RouteNode:
+        for p_name, p_kind, child in self.params:
+            if p_kind == kind:
+                if p_name != name:
+                    raise ValueError(
+                        f"Conflicting path parameters: <{p_name}:{kind}>, <{name}:{kind}>"
+                    )
+                return child
+        child = RouteNode()
+        self.params.append((name, kind, child))
+        self.params.sort(key=lambda item: item[1] == "str")
+        return child
 
 
 class Router:
+    """
+    Маршруты хранятся в дереве сегментов. Шаблоны разбираются один раз
+    в add(), поиск идёт по глубине пути, а не по числу маршрутов.
+    """
+
     def __init__(self) -> None:
         self.routes: dict[tuple[str, str], Handler] = {}
+        # растёт при каждом add(), по нему App сбрасывает кэш цепочек
+        self.version = 0
+        self._root = RouteNode()
+        # пути без параметров: path -> узел, без обхода дерева
+        self._static: dict[str, RouteNode] = {}
+        # после freeze() маршруты не добавляются
+        self.frozen = False
+
+    def freeze(self) -> None:
+        self.frozen = True
+
+    def add(
+        self,
+        method: str,
+        path: str,
+        handler: Handler,
+        validator: Validator | None = None,
+        max_body: int | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        if self.frozen:
+            raise RuntimeError("Router is frozen: routes cannot be added")
+        method = method.upper()
+        segments = _split_path(path)
+        node = self._root
+        is_static = True
+
+        for i, segment in enumerate(segments):
+            param = _parse_param(segment)
+            if param is None:
+                node = node.static.setdefault(segment, RouteNode())
+                continue
+
+            is_static = False
+            name, kind = param
+            if kind == CATCH_ALL:
+                if i != len(segments) - 1:
+                    raise ValueError(f"<{name}:path> must be the last segment: {path}")
+                if node.catch_all is None:
+                    node.catch_all = (name, RouteNode())
+                elif node.catch_all[0] != name:
+                    raise ValueError(f"Conflicting catch-all parameter in {path}")
+                node = node.catch_all[1]
+            else:
+                node = node.param_child(name, kind)
 
-    def add(self, method: str, path: str, handler: Handler) -> None:
-        self.routes[(method.upper(), path)] = handler
+        node.handlers[method] = handler
+        if validator is not None:
+            node.validators[method] = validator
+        else:
+            node.validators.pop(method, None)
+        if max_body is not None:
+            node.body_limits[method] = max_body
+        else:
+            node.body_limits.pop(method, None)
+        if timeout is not None:
+            node.timeouts[method] = timeout
+        else:
+            node.timeouts.pop(method, None)
+        node.template = path
+        if is_static:
+            self._static[path] = node
+        self.routes[(method, path)] = handler
+        self.version += 1
+
+    def match(
+        self, path: str, method: str | None = None
+    ) -> tuple[RouteNode | None, dict[str, Any]]:
+        """
+        Находит узел маршрута для path, а если задан method — первый узел,
+        у которого есть этот метод: GET /items/<id:int> не заслоняет
+        POST /items/<name>. Приоритет: статический сегмент, затем
+        типизированный параметр, затем str, затем <name:path>.
+        """
+        node = self._static.get(path)
+        if node is not None and (method is None or method in node.handlers):
+            return node, {}
+
+        for node, params in self._candidates(path):
+            if method is None or method in node.handlers:
+                return node, params
+        return None, {}
+
+    def _candidates(self, path: str) -> Iterator[tuple[RouteNode, dict[str, Any]]]:
+        """Все узлы с handler'ами, подходящие к path, в порядке приоритета."""
+        parts = _split_path(path)
+        depth = len(parts)
+        # (узел, номер сегмента, параметры); стек — поиск с возвратом
+        stack: list[tuple[RouteNode, int, dict[str, Any]]] = [(self._root, 0, {})]
+
+        while stack:
+            node, i, params = stack.pop()
+            if i == depth:
+                if node.handlers:
+                    yield node, params
+                continue
+
+            part = parts[i]
+            # в стек в обратном порядке приоритета
+            if node.catch_all is not None:
+                name, child = node.catch_all
+                rest = "/".join(parts[i:])
+                if rest and child.handlers:
+                    stack.append((child, depth, {**params, name: rest}))
+            for name, kind, child in reversed(node.params):
+                try:
+                    value = CONVERTERS[kind](part)
+                except ValueError:
+                    continue
+                stack.append((child, i + 1, {**params, name: value}))
+            static_child = node.static.get(part)
+            if static_child is not None:
+                stack.append((static_child, i + 1, params))
 
     def allowed_methods(self, path: str) -> list[str]:
-        methods = [m for (m, p) in self.routes.keys() if p == path]
-        methods.sort()
-        return methods
+        """Методы всех маршрутов, подходящих к path (для 405 и Allow)."""
+        allowed: set[str] = set()
+        for node, _ in self._candidates(path):
+            allowed.update(node.handlers)
+        return sorted(allowed)
 
     def resolve(self, method: str, path: str) -> Handler | None:
-        return self.routes.get((method.upper(), path))
+        method = method.upper()
+        node, _ = self.match(path, method)
+        if node is None:
+            return None
+        return node.handlers[method]
+
+
+# ====== Operations ======
+
+OPERATIONS: dict[str, Callable[[float, float], float]] = {
+    "sum": operator.add,
+    "multiply": operator.mul,
+}
+# op -> функция NumPy с той же семантикой float64
+VECTOR_OPS = {"sum": "add", "multiply": "multiply"}
+VECTOR_MIN_BATCH = 32
+MAX_BATCH_SIZE = 100_000
+# MAX_BATCH_SIZE операций в JSON не помещаются в MAX_BODY_SIZE
+BATCH_MAX_BODY = 16 * 1024 * 1024
+# большой batch дольше считается, но и держать воркер бесконечно он не должен
+BATCH_TIMEOUT = 10.0
+
+
+class OperationError(ValueError):
+    pass
+
+
+def parse_operation(data: Any) -> tuple[str, float, float]:
+    if not isinstance(data, dict):
+        raise OperationError("Operation must be an object")
+
+    a = data.get("a")
+    b = data.get("b")
+    op = data.get("op")
+
+    if a is None or b is None or op is None:
+        raise OperationError("Expected fields: a, b, op")
+
+    try:
+        a_num = float(a)
+        b_num = float(b)
+    except (TypeError, ValueError):
+        raise OperationError("a and b must be numbers") from None
+
+    if op not in OPERATIONS:
+        raise OperationError(f"Unknown op: {op}")
+
+    return op, a_num, b_num
+
+
+def evaluate_batch(items: list[Any]) -> list[dict[str, Any]]:
+    """
+    Считает список операций, сохраняя порядок.
+    Ошибка в элементе даёт {"error": ...} только для него.
+    Одинаковые op считаются одним вызовом NumPy, если он установлен.
+    """
+    results: list[dict[str, Any]] = [{} for _ in items]
+    groups: dict[str, list[tuple[int, float, float]]] = {}
+
+    for i, item in enumerate(items):
+        try:
+            op, a, b = parse_operation(item)
+        except OperationError as e:
+            results[i] = {"error": str(e)}
+            continue
+        groups.setdefault(op, []).append((i, a, b))
+
+    for op, group in groups.items():
+        check_deadline()
+        if len(group) >= VECTOR_MIN_BATCH and (np := load_numpy()) is not None:
+            a_arr = np.fromiter((a for _, a, _ in group), np.float64, len(group))
+            b_arr = np.fromiter((b for _, _, b in group), np.float64, len(group))
+            values = getattr(np, VECTOR_OPS[op])(a_arr, b_arr).tolist()
+        else:
+            func = OPERATIONS[op]
+            values = [func(a, b) for _, a, b in group]
+
+        for (i, _, _), value in zip(group, values):
+            results[i] = {"result": value}
+
+    return results
 
 
 # ====== Application ======
 
+# метка для запросов, не совпавших ни с одним маршрутом (без роста кардинальности)
+UNMATCHED_ROUTE = "<unmatched>"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
 
 class App:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        json_codec: str | None = None,
+        result_cache: ResultCache | None = None,
+        access_log: AccessLog | None = None,
+        compressor: Compressor | None = None,
+        admission: Admission | None = None,
+        max_body_size: int = MAX_BODY_SIZE,
+        body_timeout: float = BODY_TIMEOUT,
+        request_timeout: float | None = None,
+        max_request_timeout: float = MAX_REQUEST_TIMEOUT,
+        profiler: Profiler | None = None,
+        static_dir: str | None = None,
+    ) -> None:
+        if json_codec is not None:
+            set_codec(json_codec)
+        # каталог для GET /static/<path>; None — маршрут отвечает 404
+        self.static_dir = static_dir
+        self.max_body_size = max_body_size
+        self.body_timeout = body_timeout
+        # таймаут обработки по умолчанию; None — без дедлайна, пока его не
+        # задали маршрут (Router.add(timeout=)) или клиент (X-Request-Timeout)
+        self.request_timeout = request_timeout
+        self.max_request_timeout = max_request_timeout
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.compressor = compressor if compressor is not None else Compressor()
+        self.admission = admission
+        self.metrics = Metrics()
+        self.access_log = access_log
+        self.single_flight = SingleFlight()
+        # фазы пишутся всегда, выборка cProfile/стеков — по configure()
+        self.profiler = profiler if profiler is not None else Profiler()
+
         self.router = Router()
         self.middlewares: list[Middleware] = []
+        # handler -> собранная цепочка middleware
+        self._chains: dict[Handler, Handler] = {}
+        self._chains_version = self.router.version
+        # (router.version, готовый ответ, его validators) для handle_index
+        self._index_cache: tuple[int, Response, Validators] | None = None
+        self.frozen = False
 
         self._register_routes()
 
-        # logging снаружи, чтобы видеть и 500 тоже
-        self.add_middleware(self.logging_middleware)
+        # задержки и статусы (включая 404/405/500) пишет __call__ в self.metrics
+        if admission is not None:
+            # первым: отказ не должен стоить ни сжатия, ни handler'а
+            self.add_middleware(self.admission_middleware)
+        self.add_middleware(self.compression_middleware)
+        # внутри сжатия: ETag — по несжатому телу, а на 304 сжатие не тратится
+        self.add_middleware(self.conditional_middleware)
         self.add_middleware(self.error_middleware)
+        # последним: 504 по DeadlineExceeded, до того как его увидит error_middleware
+        self.add_middleware(self.deadline_middleware)
 
     def _register_routes(self) -> None:
-        self.router.add("GET", "/", self.handle_index)
+        self.router.add("GET", "/", self.handle_index, validator=self.index_validator)
         self.router.add("GET", "/time", self.handle_time)
+        self.router.add("GET", "/static/<path:path>", self.handle_static)
         self.router.add("GET", "/hello", self.handle_hello)
-        self.router.add("POST", "/operation", self.handle_operation)
+        self.router.add(
+            "GET",
+            "/users/<user_id:int>",
+            self.coalesced(self.handle_user),
+            validator=self.user_validator,
+        )
+        self.router.add("POST", "/operation", self.coalesced(self.handle_operation))
+        self.router.add(
+            "POST",
+            "/operation/batch",
+            self.handle_operation_batch,
+            max_body=BATCH_MAX_BODY,
+            timeout=BATCH_TIMEOUT,
+        )
+        self.router.add("GET", "/cache/stats", self.handle_cache_stats)
+        self.router.add("GET", "/metrics", self.handle_metrics)
+        self.router.add("GET", "/metrics/summary", self.handle_metrics_summary)
+        self.router.add("GET", "/debug/profile", self.handle_profile)
+        self.router.add("POST", "/debug/profile", self.handle_profile_config)
 
     # ---- handlers ----
 
     def handle_index(self, req: Request) -> Response:
+        return self._index()[1]
+
+    def index_validator(self, req: Request) -> Validators:
+        return self._index()[2]
+
+    def _index(self) -> tuple[int, Response, Validators]:
+        # список меняется только вместе с роутером — кодируем один раз
+        cached = self._index_cache
+        if cached is not None and cached[0] == self.router.version:
+            return cached
+
         items = [f"{m} {p}" for (m, p) in sorted(self.router.routes.keys())]
-        return json_response(items)
+        resp = replace(json_response(items), static=True)
+        # по содержимому, а не по version: номер версии повторяется
+        # у разных наборов маршрутов (после перезапуска, в другом воркере)
+        etag = make_etag(hashlib.blake2b(resp.body, digest_size=8).hexdigest())
+        self._index_cache = (self.router.version, resp, Validators(etag=etag))
+        return self._index_cache
+
+    def handle_static(self, req: Request) -> AnyResponse:
+        path = self._static_path(req.path_params["path"])
+        try:
+            if path is None:
+                raise FileNotFoundError(req.path)
+            return file_response(path)
+        except OSError:
+            return json_response({"error": "File not found"}, status="404 Not Found")
+
+    def _static_path(self, relative: str) -> str | None:
+        """Обычный файл внутри static_dir; скрытые и ведущие наружу — None."""
+        if self.static_dir is None or any(
+            part.startswith(".") for part in relative.split("/")
+        ):
+            return None
+        root = os.path.realpath(self.static_dir)
+        path = os.path.realpath(os.path.join(root, relative))
+        if os.path.commonpath((root, path)) != root or not os.path.isfile(path):
+            return None
+        return path
 
     def handle_time(self, req: Request) -> Response:
         return json_response({"now": dt.datetime.now().isoformat(timespec="seconds")})
@@ -176,49 +987,223 @@ class App:
         name = (req.query.get("name") or ["world"])[0]
         return json_response({"message": f"Hello, {name}!"})
 
+    def user_validator(self, req: Request) -> Validators:
+        return Validators(etag=make_etag(f"user-{req.path_params['user_id']}"))
+
+    def handle_user(self, req: Request) -> Response:
+        return json_response({"user_id": req.path_params["user_id"]})
+
     def handle_operation(self, req: Request) -> Response:
+        if req.headers.get("Content-Type", "").startswith(NDJSON):
+            return ndjson_response(self._stream_operations(req))
+
         try:
             data = req.json() or {}
-        except json.JSONDecodeError:
+        except ValueError:
             return json_response({"error": "Invalid JSON"}, status="400 Bad Request")
 
-        a = data.get("a")
-        b = data.get("b")
-        op = data.get("op")
+        try:
+            op, a_num, b_num = parse_operation(data)
+        except OperationError as e:
+            return json_response({"error": str(e)}, status="400 Bad Request")
 
-        if a is None or b is None or op is None:
+        # тело могло читаться почти весь бюджет
+        check_deadline()
+        result = self.evaluate_operation(op, a_num, b_num)
+        return json_response({"result": result})
+
+    def evaluate_operation(self, op: str, a: float, b: float) -> float:
+        key = (op, number_key(a), number_key(b))
+        hit, result = self.result_cache.get(key)
+        if not hit:
+            result = OPERATIONS[op](a, b)
+            self.result_cache.put(key, result)
+        return result
+
+    def handle_cache_stats(self, req: Request) -> Response:
+        return json_response(self.result_cache.stats())
+
+    def handle_metrics(self, req: Request) -> Response:
+        flights = self._flight_stats()
+        payload = (
+            self.metrics.render_prometheus() + coalesced_metric(flights["shared"])
+        ).encode("utf-8")
+        return Response(
+            status="200 OK",
+            headers=[
+                ("Content-Type", PROMETHEUS_CONTENT_TYPE),
+                ("Content-Length", str(len(payload))),
+            ],
+            body=payload,
+        )
+
+    def handle_metrics_summary(self, req: Request) -> Response:
+        return json_response(self.metrics.summary())
+
+    def handle_profile(self, req: Request) -> Response:
+        return json_response(self.profiler.report())
+
+    def handle_profile_config(self, req: Request) -> Response:
+        """{"sample_every": N, "slow_threshold_ms": ms}; 0 и null выключают."""
+        # выборка замедляет все запросы: включать её можно только с этой машины
+        if not req.is_local:
             return json_response(
-                {"error": "Expected fields: a, b, op"},
-                status="400 Bad Request",
+                {"error": "Profiling can only be configured from localhost"},
+                status="403 Forbidden",
             )
-
         try:
-            a_num = float(a)
-            b_num = float(b)
-        except (TypeError, ValueError):
-            return json_response(
-                {"error": "a and b must be numbers"},
-                status="400 Bad Request",
+            data = req.json() or {}
+        except ValueError:
+            return json_response({"error": "Invalid JSON"}, status="400 Bad Request")
+        sample_every = data.get("sample_every", 0) if isinstance(data, dict) else None
+        slow_ms = data.get("slow_threshold_ms") if isinstance(data, dict) else None
+        try:
+            if type(sample_every) is not int or not (
+                slow_ms is None or isinstance(slow_ms, (int, float))
+            ):
+                raise ValueError(
+                    "sample_every must be an integer, slow_threshold_ms a number"
+                )
+            self.profiler.configure(
+                sample_every, None if slow_ms is None else slow_ms / 1000
             )
+        except ValueError as e:
+            return json_response({"error": str(e)}, status="400 Bad Request")
+        return json_response(self.profiler.report())
 
-        if op == "sum":
-            result = a_num + b_num
-        elif op == "multiply":
-            result = a_num * b_num
+    def _stream_operations(self, req: Request) -> Iterator[dict[str, Any]]:
+        # по одной операции на строку; ответ на каждую уходит сразу
+        codec = active_codec()
+        try:
+            for line in req.iter_lines():
+                if line.strip():
+                    check_deadline(req)
+                    yield self._stream_item(codec, line)
+        except (LineTooLong, BodyError, DeadlineExceeded) as e:
+            yield {"error": str(e)}
+
+    def _stream_item(self, codec, line: bytes) -> dict[str, Any]:
+        try:
+            op, a, b = parse_operation(codec.loads(line))
+        except OperationError as e:
+            return {"error": str(e)}
+        except ValueError:
+            return {"error": "Invalid JSON"}
+        return {"result": self.evaluate_operation(op, a, b)}
+
+    def handle_operation_batch(self, req: Request) -> Response:
+        try:
+            data = req.json()
+        except ValueError:
+            return json_response({"error": "Invalid JSON"}, status="400 Bad Request")
+
+        # [{...}, ...], {"operations": [...]} или столбцы {"a": [], "b": [], "op": []}
+        if isinstance(data, dict) and "operations" in data:
+            items = data["operations"]
+        elif isinstance(data, dict) and isinstance(data.get("a"), list):
+            columns = [data.get("a"), data.get("b"), data.get("op")]
+            if (
+                not all(isinstance(c, list) for c in columns)
+                or len({len(c) for c in columns}) != 1
+            ):
+                return json_response(
+                    {"error": "a, b and op must be arrays of equal length"},
+                    status="400 Bad Request",
+                )
+            items = [{"a": a, "b": b, "op": op} for a, b, op in zip(*columns)]
         else:
+            items = data
+
+        if not isinstance(items, list):
             return json_response(
-                {"error": f"Unknown op: {op}"},
+                {"error": "Expected a list of operations"},
                 status="400 Bad Request",
             )
+        if len(items) > MAX_BATCH_SIZE:
+            return json_response(
+                {"error": f"At most {MAX_BATCH_SIZE} operations per batch"},
+                status="413 Payload Too Large",
+            )
 
-        return json_response({"result": result})
+        return json_response({"results": evaluate_batch(items)})
+
+    # ---- single-flight ----
+
+    def coalesced(self, handler: Handler) -> Handler:
+        """
+        Опция маршрута: одновременные одинаковые запросы (метод, путь, query,
+        тело) делят один вызов handler'а. Оборачивается только handler:
+        admission, сжатие и ошибки остаются своими у каждого запроса.
+        """
+
+        @functools.wraps(handler)
+        def wrapper(req: Request) -> AnyResponse:
+            key = self._flight_key(req)
+            if key is None:
+                return handler(req)
+            resp, shared = self.single_flight.do(key, lambda: handler(req))
+            # поток и файл читаются один раз — ждущему их не отдать
+            if shared and type(resp) is not Response:
+                return handler(req)
+            return resp
+
+        return wrapper
+
+    def _flight_key(self, req: Request) -> tuple | None:
+        # из заголовков handler'ы смотрят только на Content-Type: NDJSON
+        # отсекается здесь, потоковое тело не прочитать дважды
+        if req.stream is not None:
+            return None
+        body = req.body
+        return (
+            req.method,
+            req.path,
+            tuple(sorted((name, tuple(values)) for name, values in req.query.items())),
+            hashlib.blake2b(body, digest_size=16).digest() if body else b"",
+        )
+
+    def _flight_stats(self) -> dict[str, int]:
+        return self.single_flight.stats()
 
     # ---- middlewares ----
 
+    def freeze(self) -> App:
+        """
+        Конец настройки, до первого запроса: заранее собираются цепочки
+        middleware всех handler'ов, листинг маршрутов с его ETag и таблицы
+        mimetypes. При pre-fork это делается один раз в мастере, а воркеры
+        получают готовое. После freeze() маршруты и middleware не меняются.
+        """
+        if self.frozen:
+            return self
+        self.router.freeze()
+        self.frozen = True
+        for handler in self.router.routes.values():
+            self._get_chain(handler)
+        self._index()
+        if not mimetypes.inited:
+            mimetypes.init()
+        return self
+
     def add_middleware(self, middleware: Middleware) -> None:
+        if self.frozen:
+            raise RuntimeError("App is frozen: middleware cannot be added")
         self.middlewares.append(middleware)
+        self._chains.clear()
+
+    def _get_chain(self, handler: Handler) -> Handler:
+        # цепочка собирается один раз на handler, а не на каждый запрос
+        if not self.frozen and self._chains_version != self.router.version:
+            self._chains.clear()
+            self._chains_version = self.router.version
+
+        chain = self._chains.get(handler)
+        if chain is None:
+            chain = self._chains[handler] = self._build_chain(handler)
+        return chain
 
     def _build_chain(self, handler: Handler) -> Handler:
+        handler = self._timed(handler)
         for middleware in reversed(self.middlewares):
             next_handler = handler
 
@@ -229,17 +1214,94 @@ class App:
 
         return handler
 
-    def logging_middleware(self, req: Request, handler: Handler) -> Response:
-        start = time.perf_counter()
-        response = handler(req)
-        duration_ms = (time.perf_counter() - start) * 1000
+    def _timed(self, handler: Handler) -> Handler:
+        # время самого handler'а; остаток цепочки Profiler считает middleware
+        def timed(req: Request) -> AnyResponse:
+            start = time.perf_counter()
+            try:
+                return handler(req)
+            finally:
+                req.handler_time += time.perf_counter() - start
+
+        return timed
+
+    def admission_middleware(self, req: Request, handler: Handler) -> AnyResponse:
+        rejected = self._check_rate(req)
+        if rejected is not None:
+            return rejected
+        limiter = self.admission.limiter
+        if limiter is None:
+            return handler(req)
+        # в очереди не ждём дольше, чем осталось у запроса
+        if not limiter.acquire(req.time_left()):
+            return self._shed_response(req)
+        try:
+            return handler(req)
+        finally:
+            limiter.release()
 
-        print(f"{req.method} {req.path} -> {response.status} {duration_ms:.2f} ms")
-        return response
+    def _check_rate(self, req: Request) -> Response | None:
+        retry_after = self.admission.check_rate(req.client, req.route)
+        if not retry_after:
+            return None
+        return json_response(
+            {"error": "Rate limit exceeded"},
+            status=TOO_MANY_REQUESTS,
+            headers=[retry_after_header(retry_after)],
+        )
+
+    def _shed_response(self, req: Request) -> Response:
+        left = req.time_left()
+        if left is not None and left <= 0:
+            # слот не дождались за весь бюджет запроса
+            return self._deadline_response()
+        return json_response(
+            {"error": "Server is overloaded"},
+            status=SERVICE_UNAVAILABLE,
+            headers=[retry_after_header(self.admission.shed_retry_after)],
+        )
+
+    def compression_middleware(self, req: Request, handler: Handler) -> AnyResponse:
+        return self._compress(req, handler(req))
+
+    def conditional_middleware(self, req: Request, handler: Handler) -> AnyResponse:
+        return self._conditional(req, handler(req))
+
+    def deadline_middleware(self, req: Request, handler: Handler) -> AnyResponse:
+        # бюджет мог кончиться в очереди admission или пока читалось тело
+        try:
+            check_deadline()
+            resp = handler(req)
+            # handler не прервать: опоздавший ответ клиент уже не ждёт
+            check_deadline()
+        except DeadlineExceeded:
+            return self._deadline_response()
+        return resp
+
+    def _deadline_response(self) -> Response:
+        return json_response(
+            {"error": "Request deadline exceeded"}, status=GATEWAY_TIMEOUT
+        )
+
+    def _compress(self, req: Request, resp: AnyResponse) -> AnyResponse:
+        # потоковые и файловые ответы не сжимаем: размер заранее неизвестен
+        if type(resp) is not Response or len(resp.body) < self.compressor.min_size:
+            return resp
+        headers, body = self.compressor.compress_response(
+            req.headers.get("Accept-Encoding", ""),
+            resp.headers,
+            resp.body,
+            static=resp.static,
+        )
+        if headers is resp.headers:
+            return resp
+        return Response(resp.status, headers, body, static=resp.static)
 
     def error_middleware(self, req: Request, handler: Handler) -> Response:
         try:
             return handler(req)
+        except BodyError as e:
+            return json_response({"error": str(e)}, status=e.status)
         except Exception as e:
             return json_response(
                 {"error": "Internal Server Error", "detail": str(e)},
@@ -250,33 +1312,191 @@ class App:
 
     # ---- WSGI entrypoint ----
 
+    def _no_route_response(self, req: Request) -> Response:
+        allowed = self.router.allowed_methods(req.path)
+
+        if allowed:
+            return json_response(
+                {"error": f"{req.path} supports only: {', '.join(allowed)}"},
+                status="405 Method is Not Allowed",
+                headers=[("Allow", ", ".join(allowed))],
+            )
+        return json_response(
+            {"error": f'Неизвестный путь "{req.path}"'},
+            status="404 Not Found",
+        )
+
+    def _limit_body(self, req: Request, node: RouteNode) -> Response | None:
+        """
+        Ставит лимит тела маршрута; 413 сразу, если Content-Length больше.
+        NDJSON не буферизуется, и лимит у него на строку (BodyStream.MAX_LINE).
+        """
+        req.max_body = limit = node.body_limits.get(req.method, self.max_body_size)
+        req.body_timeout = self.body_timeout
+        if req.headers.get("Content-Type", "").startswith(NDJSON):
+            return None
+        length = req.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > limit:
+            return json_response(
+                {"error": str(_too_large(limit))}, status=PAYLOAD_TOO_LARGE
+            )
+        return None
+
+    def _set_deadline(self, req: Request, node: RouteNode) -> Response | None:
+        """
+        Дедлайн запроса: таймаут маршрута (или App.request_timeout),
+        сокращённый заголовком X-Request-Timeout; 400 на кривой заголовок.
+        """
+        timeout = node.timeouts.get(req.method, self.request_timeout)
+        header = req.headers.get(REQUEST_TIMEOUT_HEADER)
+        if header is not None:
+            try:
+                requested = float(header)
+            except ValueError:
+                requested = math.nan
+            if not requested > 0:
+                return json_response(
+                    {"error": f"{REQUEST_TIMEOUT_HEADER} must be a positive number"},
+                    status="400 Bad Request",
+                )
+            timeout = requested if timeout is None else min(timeout, requested)
+        if timeout is None:
+            return None
+        timeout = min(timeout, self.max_request_timeout)
+        req.deadline = time.monotonic() + timeout
+        # тело, пришедшее после дедлайна, читать уже незачем
+        req.body_timeout = min(req.body_timeout, timeout)
+        return None
+
+    def _precondition(self, req: Request, node: RouteNode) -> Response | None:
+        """Validators маршрута (в req.validators); 304, если handler не нужен."""
+        validator = node.validators.get(req.method)
+        if validator is None or req.method != "GET":
+            return None
+        validators = req.validators = validator(req)
+        if validators is not None and self._not_modified(req, validators):
+            return not_modified_response(validators)
+        return None
+
+    def _not_modified(self, req: Request, validators: Validators) -> bool:
+        headers = req.headers
+        return is_not_modified(
+            headers.get("If-None-Match"), headers.get("If-Modified-Since"), validators
+        )
+
+    def _conditional(self, req: Request, resp: AnyResponse) -> AnyResponse:
+        """Добавляет ETag к 200 на GET; без validator'а — слабый, по хэшу тела."""
+        if (
+            req.method != "GET"
+            or type(resp) is not Response
+            or not resp.status.startswith("200")
+        ):
+            return resp
+        validators = req.validators
+        if validators is None:
+            validators = Validators(etag=body_etag(resp.body))
+            if self._not_modified(req, validators):
+                return not_modified_response(validators)
+        return Response(
+            resp.status, resp.headers + validators.headers(), resp.body, resp.static
+        )
+
+    def _record(
+        self, req: Request, node: RouteNode | None, status: str, start: float
+    ) -> None:
+        elapsed = time.perf_counter() - start
+        code = status.split(" ", 1)[0]
+        route = node.template if node is not None else UNMATCHED_ROUTE
+        self.metrics.observe(route, req.method, code, elapsed)
+        if self.access_log is not None:
+            self.access_log.log(req.method, req.path, code, elapsed)
+
+    def _profile(
+        self,
+        sample: Sample | None,
+        req: Request,
+        node: RouteNode | None,
+        status: str,
+        marks: tuple[float, float, float, float, float],
+        body_time: float = 0.0,
+        write_time: float = 0.0,
+    ) -> None:
+        """
+        marks — perf_counter() на старте, после разбора запроса, после
+        маршрутизации, после цепочки middleware и перед отправкой ответа.
+        body_time — чтение тела вне цепочки (ASGI), идёт в parse.
+        write_time — отправка ответа; в WSGI его пишет сервер, уже после App.
+        """
+        start, parsed, routed, handled, end = marks
+        chain = handled - routed - body_time
+        self.profiler.record(
+            sample,
+            node.template if node is not None else UNMATCHED_ROUTE,
+            req.method,
+            status,
+            (
+                parsed - start + body_time,
+                routed - parsed,
+                chain - req.handler_time,
+                req.handler_time,
+                end - handled,
+                write_time,
+            ),
+        )
+
     def __call__(self, environ: dict, start_response) -> Iterable[bytes]:
+        start = time.perf_counter()
         req = build_request(environ)
         token = _request_var.set(req)
+        sample = None
 
         try:
-            handler = self.router.resolve(req.method, req.path)
+            if self.profiler.sampling:
+                sample = self.profiler.begin()
+            parsed = time.perf_counter()
+            node, params = self.router.match(req.path, req.method)
+            handler = node.handlers[req.method] if node is not None else None
 
             if handler is None:
-                allowed = self.router.allowed_methods(req.path)
-
-                if allowed:
-                    resp = json_response(
-                        {"error": f"{req.path} supports only: {', '.join(allowed)}"},
-                        status="405 Method is Not Allowed",
-                        headers=[("Allow", ", ".join(allowed))],
-                    )
-                else:
-                    resp = json_response(
-                        {"error": f'Неизвестный путь "{req.path}"'},
-                        status="404 Not Found",
-                    )
+                resp = self._no_route_response(req)
             else:
-                app_handler = self._build_chain(handler)
-                resp = app_handler(req)
-
+                req.path_params.update(params)
+                req.route = node.template
+                resp = self._precondition(req, node)
+                if resp is None:
+                    resp = self._limit_body(req, node)
+                if resp is None:
+                    resp = self._set_deadline(req, node)
+            routed = handled = time.perf_counter()
+            if resp is None:
+                resp = self._get_chain(handler)(req)
+                handled = time.perf_counter()
+
+            # для StreamResponse это время до первого байта, а не до конца потока
+            self._record(req, node, resp.status, start)
             start_response(resp.status, resp.headers)
-            return [resp.body]
+            if isinstance(resp, StreamResponse):
+                body = resp.chunks
+            elif isinstance(resp, FileResponse):
+                file_wrapper = environ.get("wsgi.file_wrapper")
+                if file_wrapper is not None:
+                    body = file_wrapper(resp.file, resp.block_size)
+                else:
+                    body = iter_file(resp.file, resp.block_size)
+            else:
+                body = [_body_bytes(resp.body)]
+            self._profile(
+                sample,
+                req,
+                node,
+                resp.status,
+                (start, parsed, routed, handled, time.perf_counter()),
+            )
+            return body
+        except BaseException:
+            if sample is not None:
+                self.profiler.discard(sample)
+            raise
         finally:
             _request_var.reset(token)
 
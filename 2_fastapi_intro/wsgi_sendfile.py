@@ -0,0 +1,65 @@
+"""
+wsgiref с отдачей файлов через socket.sendfile (os.sendfile внутри).
+
+Если приложение вернуло wsgi.file_wrapper (FileResponse), файл уходит
+в сокет ядром, без чтения в память процесса. У сокета есть таймаут,
+то есть он неблокирующий: socket.sendfile ждёт готовности через selectors,
+а не падает на EAGAIN. Где os.sendfile нет, он сам читает файл блоками;
+если файл не настоящий (BytesIO), блоками его читает wsgiref, как обычно.
+
+Строку на каждый запрос в stderr обработчик не пишет: access-лог ведёт
+App (см. metrics.AccessLog), ошибки протокола по-прежнему в stderr.
+"""
+
+from __future__ import annotations
+
+import io
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler
+
+
+class SendfileServerHandler(ServerHandler):
+    def sendfile(self) -> bool:
+        filelike = self.result.filelike
+        try:
+            filelike.fileno()
+            offset = filelike.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+
+        if not self.headers_sent:
+            self.send_headers()
+        self.bytes_sent += self.request_handler.connection.sendfile(filelike, offset)
+        return True
+
+
+class SendfileRequestHandler(WSGIRequestHandler):
+    # таймаут одного recv: молчащий клиент не держит поток вечно,
+    # а срок на всё тело проверяет само приложение (BODY_TIMEOUT)
+    timeout = 30
+
+    def handle(self) -> None:
+        # как WSGIRequestHandler.handle, но с SendfileServerHandler
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ""
+            self.request_version = ""
+            self.command = ""
+            self.send_error(414)
+            return
+
+        if not self.parse_request():
+            return
+
+        handler = SendfileServerHandler(
+            self.rfile,
+            self.wfile,
+            self.get_stderr(),
+            self.get_environ(),
+            multithread=False,
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def log_request(self, code="-", size="-") -> None:
+        # вместо синхронной строки в stderr на запрос — App.access_log (AccessLog)
+        pass
@@ -0,0 +1,15 @@
+"""
+Бенчмарки обоих серверов, только стандартная библиотека.
+
+Запуск из корня репозитория:
+
+    python -m bench.micro                  # микро-бенчмарки без сокетов
+    python -m bench.load --spawn server    # нагрузка на 1_http_basics/server.py
+    python -m bench.load --spawn wsgi      # нагрузка на 2_fastapi_intro/run_wsgi.py
+    python -m bench.startup                # холодный старт до первого ответа
+    python -m bench.shared                 # общая память воркеров под конкуренцией
+    python -m bench.compare old.json new.json
+
+Результаты пишутся в JSON (--output) вместе с коммитом и версией Python,
+чтобы сравнивать прогоны разных коммитов через bench.compare.
+"""
@@ -0,0 +1,77 @@
+"""
+Сравнение: сборка цепочки middleware на каждый запрос (_build_chain)
+и готовая цепочка из кэша (_get_chain).
+
+Запуск из корня репозитория:
+    python bench/bench_middleware_chain.py
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "2_fastapi_intro"))
+
+from wsgi_app import App, Request, Response, text_response  # noqa: E402
+
+NUMBER = 20_000
+DEPTHS = (0, 1, 5, 10, 20)
+
+
+def passthrough(req: Request, handler) -> Response:
+    return handler(req)
+
+
+def make_app(depth: int) -> App:
+    app = App()
+    # без встроенных middleware, чтобы мерить только цепочку
+    app.middlewares.clear()
+    for _ in range(depth):
+        app.add_middleware(passthrough)
+    return app
+
+
+def handler(req: Request) -> Response:
+    return text_response("ok")
+
+
+def allocated_per_call(func, number: int = 1_000) -> float:
+    # результаты держим в списке, иначе замыкания сразу освобождаются
+    keep = []
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(number):
+        keep.append(func())
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / number
+
+
+def main() -> None:
+    req = Request(method="GET", path="/", query={}, headers={}, body=b"")
+
+    print(f"{'depth':>5} {'rebuild us':>11} {'cached us':>10} {'rebuild B':>10}")
+    for depth in DEPTHS:
+        app = make_app(depth)
+
+        def rebuild() -> Response:
+            return app._build_chain(handler)(req)
+
+        def cached() -> Response:
+            return app._get_chain(handler)(req)
+
+        rebuild_us = min(timeit.repeat(rebuild, number=NUMBER, repeat=3)) / NUMBER
+        cached_us = min(timeit.repeat(cached, number=NUMBER, repeat=3)) / NUMBER
+        rebuild_bytes = allocated_per_call(lambda: app._build_chain(handler))
+
+        print(
+            f"{depth:>5} {rebuild_us * 1e6:>11.2f} {cached_us * 1e6:>10.2f}"
+            f" {rebuild_bytes:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Общее для бенчмарков: пути к урокам, окружение прогона и вывод в JSON."""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER_DIR = ROOT / "1_http_basics"
+WSGI_DIR = ROOT / "2_fastapi_intro"
+
+
+def add_lesson_paths() -> None:
+    # уроки — не пакеты, их модули импортируются по имени файла
+    for path in (SERVER_DIR, WSGI_DIR):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def _git(*args: str) -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def environment() -> dict[str, Any]:
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def percentiles(
+    values: list[float], qs: tuple[float, ...] = (50, 90, 99)
+) -> dict[str, float]:
+    """Точные перцентили (nearest-rank) по отсортированной выборке."""
+    if not values:
+        return {f"p{q:g}": 0.0 for q in qs}
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        f"p{q:g}": ordered[min(n - 1, max(0, math.ceil(q * n / 100) - 1))] for q in qs
+    }
+
+
+def write_results(
+    kind: str, config: dict[str, Any], results: Any, output: str | None
+) -> dict[str, Any]:
+    document = {
+        "kind": kind,
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    if output in (None, "-"):
+        print(text)
+    else:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+    return document
@@ -0,0 +1,77 @@
+"""
+Сравнение двух JSON-отчётов bench.micro, bench.load, bench.startup
+или bench.shared (например, двух коммитов).
+
+    python -m bench.compare before.json after.json --threshold 5
+
+Положительная разница — стало хуже (медленнее или меньше req/s).
+Код возврата 1, если хоть одна метрика ухудшилась больше порога.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _metrics(document: dict) -> dict[str, tuple[float, bool]]:
+    """имя -> (значение, больше ли — лучше)."""
+    results = document["results"]
+    if document["kind"] in ("micro", "shared"):
+        return {name: (r["ns_per_op"], False) for name, r in results.items()}
+    if document["kind"] == "startup":
+        return {
+            f"{target}.{metric}.p50": (r[metric]["p50"], False)
+            for target, r in results.items()
+            for metric in ("import_ms", "first_response_ms")
+        }
+
+    metrics = {"throughput_rps": (results["throughput_rps"], True)}
+    for q in ("p50", "p90", "p99"):
+        metrics[f"latency_ms.{q}"] = (results["latency_ms"][q], False)
+    for label, summary in results["by_request"].items():
+        metrics[f"{label}.p99"] = (summary["p99"], False)
+    return metrics
+
+
+def compare(before: dict, after: dict) -> list[tuple[str, float, float, float]]:
+    if before["kind"] != after["kind"]:
+        raise ValueError(f"Cannot compare {before['kind']} with {after['kind']}")
+    old, new = _metrics(before), _metrics(after)
+    rows = []
+    for name in old.keys() & new.keys():
+        (a, higher_is_better), (b, _) = old[name], new[name]
+        if a == 0:
+            continue
+        change = (b - a) / a * 100
+        rows.append((name, a, b, -change if higher_is_better else change))
+    return sorted(rows)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Сравнение отчётов бенчмарков")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--threshold", type=float, default=5.0, help="допустимое ухудшение, %%"
+    )
+    args = parser.parse_args(argv)
+
+    before = json.loads(Path(args.before).read_text(encoding="utf-8"))
+    after = json.loads(Path(args.after).read_text(encoding="utf-8"))
+    rows = compare(before, after)
+
+    commits = [str(d["environment"].get("commit") or "?")[:10] for d in (before, after)]
+    print(f"{'metric':<40} {commits[0]:>14} {commits[1]:>14} {'worse %':>8}")
+    regressions = 0
+    for name, a, b, worse in rows:
+        mark = " !" if worse > args.threshold else ""
+        regressions += bool(mark)
+        print(f"{name:<40} {a:>14,.2f} {b:>14,.2f} {worse:>+8.1f}{mark}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Нагрузочный клиент на asyncio: N keep-alive соединений, смесь запросов
+с весами, пропускная способность и p50/p90/p99 задержки.
+
+    python -m bench.load --spawn server --duration 10 --concurrency 32
+    python -m bench.load --spawn wsgi --spawn-arg=--threads=8
+    python -m bench.load --url http://127.0.0.1:8000 \\
+        --request "3:GET /time" --request '1:POST /operation {"a":1,"b":2,"op":"sum"}'
+
+Запрос задаётся как "[вес:]МЕТОД ПУТЬ [ТЕЛО JSON]". Выбор запросов
+детерминирован (--seed), так что прогоны разных коммитов сравнимы.
+Если сервер закрывает соединение (HTTP/1.0 у wsgiref), клиент
+переподключается и считает это в reconnects.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from bench.common import SERVER_DIR, WSGI_DIR, percentiles, write_results
+
+# смесь по умолчанию для каждого сервера: у них разные поля операции
+DEFAULT_MIX = {
+    "server": [
+        "4:GET /time",
+        "2:GET /hello?name=Ivan",
+        "2:GET /users/42",
+        '2:POST /operation {"operation": "sum", "a": 1, "b": 2}',
+    ],
+    "wsgi": [
+        "4:GET /time",
+        "2:GET /hello?name=Ivan",
+        "2:GET /users/42",
+        '2:POST /operation {"op": "sum", "a": 1, "b": 2}',
+    ],
+}
+SPAWN = {"server": SERVER_DIR / "server.py", "wsgi": WSGI_DIR / "run_wsgi.py"}
+
+
+@dataclass
+class RequestSpec:
+    label: str
+    weight: int
+    raw: bytes
+
+    @classmethod
+    def parse(cls, spec: str, host: str) -> RequestSpec:
+        weight = 1
+        head, sep, rest = spec.partition(":")
+        if sep and head.strip().isdigit():
+            weight, spec = int(head), rest
+        method, _, rest = spec.strip().partition(" ")
+        path, _, body_text = rest.strip().partition(" ")
+        method, body = method.upper(), body_text.strip().encode("utf-8")
+
+        lines = [f"{method} {path or '/'} HTTP/1.1", f"Host: {host}"]
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        raw = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+        return cls(label=f"{method} {path}", weight=weight, raw=raw)
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    by_label: dict[str, list[float]] = field(default_factory=dict)
+    statuses: dict[int, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    reconnects: int = 0
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, bool]:
+    """Читает один ответ целиком; (status, нужно ли закрыть соединение)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    version, status_text = status_line.split(b" ", 2)[:2]
+    status = int(status_text)
+
+    headers: dict[bytes, bytes] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get(b"connection", b"").lower()
+    close = connection == b"close" or (
+        version == b"HTTP/1.0" and connection != b"keep-alive"
+    )
+
+    if status in (204, 304) or 100 <= status < 200:
+        return status, close
+    if headers.get(b"transfer-encoding", b"").lower() == b"chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)  # данные и CRLF
+            if size == 0:
+                break
+    elif b"content-length" in headers:
+        await reader.readexactly(int(headers[b"content-length"]))
+    else:
+        await reader.read()  # до закрытия соединения
+        close = True
+    return status, close
+
+
+async def worker(
+    worker_id: int,
+    host: str,
+    port: int,
+    specs: list[RequestSpec],
+    seed: int,
+    measure_from: float,
+    deadline: float,
+    timeout: float,
+    stats: Stats,
+) -> None:
+    rng = random.Random(seed + worker_id)
+    weights = [spec.weight for spec in specs]
+    reader = writer = None
+
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        spec = rng.choices(specs, weights)[0]
+        start = now
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), timeout
+                )
+            start = time.perf_counter()
+            writer.write(spec.raw)
+            status, close = await asyncio.wait_for(read_response(reader), timeout)
+            elapsed = time.perf_counter() - start
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            if start >= measure_from:
+                name = type(e).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+
+        if start >= measure_from:
+            stats.latencies.append(elapsed)
+            stats.by_label.setdefault(spec.label, []).append(elapsed)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if close:
+            writer.close()
+            reader = writer = None
+            stats.reconnects += 1
+
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(
+    host: str,
+    port: int,
+    specs: list[RequestSpec],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    timeout: float,
+) -> dict:
+    stats = Stats()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+    await asyncio.gather(
+        *(
+            worker(i, host, port, specs, seed, measure_from, deadline, timeout, stats)
+            for i in range(concurrency)
+        )
+    )
+    measured = max(time.perf_counter() - measure_from, 1e-9)
+
+    def summary(values: list[float]) -> dict:
+        ms = [v * 1000 for v in values]
+        result = {"count": len(ms)}
+        result.update({k: round(v, 3) for k, v in percentiles(ms).items()})
+        if ms:
+            result["mean"] = round(sum(ms) / len(ms), 3)
+            result["max"] = round(max(ms), 3)
+        return result
+
+    return {
+        "requests": len(stats.latencies),
+        "duration_s": round(measured, 3),
+        "throughput_rps": round(len(stats.latencies) / measured, 1),
+        "latency_ms": summary(stats.latencies),
+        "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+        "errors": stats.errors,
+        "reconnects": stats.reconnects,
+        "by_request": {
+            label: summary(values) for label, values in sorted(stats.by_label.items())
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(
+    target: str, port: int, extra: list[str], wait: float = 10.0
+) -> subprocess.Popen:
+    script = SPAWN[target]
+    process = subprocess.Popen(
+        [sys.executable, script.name, "--host", "127.0.0.1", "--port", str(port)]
+        + extra,
+        cwd=script.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{script.name} exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{script.name} did not start listening on port {port}")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест на localhost")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="уже запущенный сервер, http://host:port")
+    target.add_argument(
+        "--spawn", choices=sorted(SPAWN), help="запустить сервер на свободном порту"
+    )
+    parser.add_argument(
+        "--spawn-arg",
+        action="append",
+        default=[],
+        help="аргумент для запускаемого сервера, можно несколько раз",
+    )
+    parser.add_argument(
+        "--request",
+        action="append",
+        default=[],
+        help='"[вес:]МЕТОД ПУТЬ [ТЕЛО]", можно несколько раз',
+    )
+    parser.add_argument("--concurrency", "-c", type=int, default=16)
+    parser.add_argument("--duration", "-d", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="файл JSON; по умолчанию stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    process = None
+    if args.spawn:
+        host, port = "127.0.0.1", free_port()
+        process = spawn_server(args.spawn, port, args.spawn_arg)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname or "127.0.0.1", url.port or 80
+
+    mix = args.request or DEFAULT_MIX.get(args.spawn or "", DEFAULT_MIX["wsgi"])
+    specs = [RequestSpec.parse(spec, f"{host}:{port}") for spec in mix]
+    try:
+        results = asyncio.run(
+            run_load(
+                host,
+                port,
+                specs,
+                args.concurrency,
+                args.duration,
+                args.warmup,
+                args.seed,
+                args.timeout,
+            )
+        )
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    latency = results["latency_ms"]
+    print(
+        f"{results['throughput_rps']:.0f} req/s, p50 {latency['p50']} ms, "
+        f"p90 {latency['p90']} ms, p99 {latency['p99']} ms, "
+        f"errors {sum(results['errors'].values())}",
+        file=sys.stderr,
+    )
+    config = {
+        "target": args.spawn or args.url,
+        "spawn_args": args.spawn_arg,
+        "requests": mix,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "seed": args.seed,
+    }
+    write_results("load", config, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
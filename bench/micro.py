@@ -0,0 +1,216 @@
+"""
+Микро-бенчмарки горячего пути обоих серверов, без сокетов.
+
+    python -m bench.micro
+    python -m bench.micro --filter router --output micro.json
+
+Число повторов подбирается автоматически (timeit.autorange), в отчёт идут
+лучший и медианный прогоны в наносекундах на вызов.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import statistics
+import sys
+import timeit
+from typing import Any, Callable
+
+from bench.common import add_lesson_paths, write_results
+
+add_lesson_paths()
+
+import server  # noqa: E402
+import wsgi_app  # noqa: E402
+
+# имя -> функция подготовки, возвращающая измеряемый вызов без аргументов
+BENCHMARKS: dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str):
+    def decorator(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def make_environ(
+    method: str = "GET",
+    path: str = "/",
+    query: str = "",
+    headers: dict[str, str] | None = None,
+    body: bytes = b"",
+) -> dict[str, Any]:
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "8000",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "localhost:8000",
+        "HTTP_USER_AGENT": "bench/1.0",
+        "HTTP_ACCEPT": "*/*",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.url_scheme": "http",
+    }
+    if body:
+        environ["CONTENT_TYPE"] = "application/json"
+        environ["CONTENT_LENGTH"] = str(len(body))
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    return environ
+
+
+# ---- 1_http_basics/server.py ----
+
+
+def _parse_path(method: str, path: str) -> Callable[[], Any]:
+    # parse_path использует только атрибуты класса — экземпляр без сокета
+    handler = server.SimpleHandler.__new__(server.SimpleHandler)
+    return lambda: handler.parse_path(method, path)
+
+
+benchmark("server.parse_path.static")(lambda: _parse_path("GET", "/time"))
+benchmark("server.parse_path.param")(lambda: _parse_path("GET", "/users/42"))
+benchmark("server.parse_path.miss")(lambda: _parse_path("GET", "/no/such/path"))
+benchmark("server.parse_path.405")(lambda: _parse_path("POST", "/time"))
+
+
+# ---- 2_fastapi_intro/wsgi_app.py ----
+
+
+def _resolve(method: str, path: str) -> Callable[[], Any]:
+    router = wsgi_app.App().router
+    return lambda: router.resolve(method, path)
+
+
+benchmark("wsgi.router.resolve.static")(lambda: _resolve("GET", "/time"))
+benchmark("wsgi.router.resolve.param")(lambda: _resolve("GET", "/users/42"))
+benchmark("wsgi.router.resolve.miss")(lambda: _resolve("GET", "/no/such/path"))
+
+
+@benchmark("wsgi.app.build_chain")
+def _build_chain() -> Callable[[], Any]:
+    app = wsgi_app.App()
+    return lambda: app._build_chain(app.handle_time)
+
+
+@benchmark("wsgi.build_request.get")
+def _build_request_get() -> Callable[[], Any]:
+    environ = make_environ("GET", "/hello", query="name=Ivan&lang=ru")
+    return lambda: wsgi_app.build_request(environ)
+
+
+@benchmark("wsgi.build_request.get_parsed")
+def _build_request_get_parsed() -> Callable[[], Any]:
+    environ = make_environ("GET", "/hello", query="name=Ivan&lang=ru")
+
+    def run() -> Any:
+        req = wsgi_app.build_request(environ)
+        return req.query, req.headers
+
+    return run
+
+
+@benchmark("wsgi.build_request.post_json")
+def _build_request_post() -> Callable[[], Any]:
+    body = b'{"a": 1, "b": 2, "op": "sum"}'
+    environ = make_environ("POST", "/operation", body=body)
+    stream = environ["wsgi.input"]
+
+    def run() -> Any:
+        stream.seek(0)
+        return wsgi_app.build_request(environ).json()
+
+    return run
+
+
+@benchmark("wsgi.json_response.small")
+def _json_small() -> Callable[[], Any]:
+    data = {"result": 3.0}
+    return lambda: wsgi_app.json_response(data)
+
+
+@benchmark("wsgi.json_response.large")
+def _json_large() -> Callable[[], Any]:
+    data = {"results": [{"result": i * 0.5} for i in range(1_000)]}
+    return lambda: wsgi_app.json_response(data)
+
+
+def _app_call(method: str, path: str, body: bytes = b"") -> Callable[[], Any]:
+    app = wsgi_app.App()
+    environ = make_environ(method, path, body=body)
+    stream = environ["wsgi.input"]
+
+    def start_response(status, headers) -> None:
+        pass
+
+    def run() -> Any:
+        stream.seek(0)
+        return app(dict(environ), start_response)
+
+    return run
+
+
+benchmark("wsgi.app.call.time")(lambda: _app_call("GET", "/time"))
+benchmark("wsgi.app.call.404")(lambda: _app_call("GET", "/no/such/path"))
+benchmark("wsgi.app.call.operation")(
+    lambda: _app_call("POST", "/operation", b'{"a": 1, "b": 2, "op": "sum"}')
+)
+
+
+def run_benchmark(func: Callable[[], Any], repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # autorange доводит до ~0.2 с; растягиваем до min_time
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    times = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ns_per_op": round(min(times), 1),
+        "median_ns": round(statistics.median(times), 1),
+        "ops_per_sec": round(1e9 / min(times)),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки без сокетов")
+    parser.add_argument("--filter", default="", help="подстрока в имени бенчмарка")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="секунд на один повтор"
+    )
+    parser.add_argument("--output", "-o", help="файл JSON; по умолчанию stdout")
+    parser.add_argument("--list", action="store_true", help="только список имён")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(BENCHMARKS[name](), args.repeat, args.min_time)
+        # прогресс — в stderr, чтобы не мешать JSON в stdout
+        print(f"{name:<36} {results[name]['ns_per_op']:>12,.1f} ns", file=sys.stderr)
+
+    write_results(
+        "micro",
+        {"repeat": args.repeat, "min_time": args.min_time, "filter": args.filter},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
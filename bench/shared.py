@@ -0,0 +1,141 @@
+"""
+Цена общей памяти (2_fastapi_intro/shared_state.py) при росте числа воркеров.
+
+    python -m bench.shared
+    python -m bench.shared --workers 1 2 4 8 --ops 50000 -o shared.json
+
+Каждый сценарий запускается в N процессах (fork) одновременно; в отчёте
+общая пропускная способность и ns на операцию в пересчёте на один воркер.
+local_dict — базовая линия без общей памяти: так выглядит "бесплатный"
+счётчик, от которого мы отказываемся ради согласованности.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+from bench.common import add_lesson_paths, write_results
+
+add_lesson_paths()
+
+from shared_state import SharedCounters, SharedHashTable  # noqa: E402
+
+KEYS = 1024
+
+
+def _scenarios() -> dict[str, Callable[[int], Callable[[int], None]]]:
+    """имя -> (номер воркера -> операция(i)); общие объекты создаются до fork."""
+    counters = SharedCounters()
+    table = SharedHashTable(capacity=4 * KEYS)
+    keys = [f"key-{i}".encode() for i in range(KEYS)]
+    for key in keys:
+        table.put(key, b"x" * 16)
+
+    def local_dict(worker: int) -> Callable[[int], None]:
+        counts: dict[str, int] = {}
+
+        def op(i: int) -> None:
+            counts["requests"] = counts.get("requests", 0) + 1
+
+        return op
+
+    def counter_same_slot(worker: int) -> Callable[[int], None]:
+        return lambda i: counters.add("requests")
+
+    def counter_own_slot(worker: int) -> Callable[[int], None]:
+        name = f"worker-{worker}"
+        return lambda i: counters.add(name)
+
+    def table_get(worker: int) -> Callable[[int], None]:
+        return lambda i: table.get(keys[(i * 7 + worker) % KEYS])
+
+    def table_put(worker: int) -> Callable[[int], None]:
+        value = b"y" * 16
+        return lambda i: table.put(keys[(i * 7 + worker) % KEYS], value)
+
+    return {
+        "local_dict": local_dict,
+        "counters.same_slot": counter_same_slot,
+        "counters.own_slot": counter_own_slot,
+        "table.get": table_get,
+        "table.put": table_put,
+    }
+
+
+def run_scenario(
+    make_op: Callable[[int], Callable[[int], None]], workers: int, ops: int
+) -> float:
+    """Время (с), за которое workers процессов делают по ops операций."""
+    start_r, start_w = os.pipe()
+    pids = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(start_w)
+            op = make_op(worker)
+            os.read(start_r, 1)  # все стартуют одновременно
+            for i in range(ops):
+                op(i)
+            os._exit(0)
+        pids.append(pid)
+
+    os.close(start_r)
+    time.sleep(0.05)  # дать всем дойти до read
+    start = time.perf_counter()
+    os.write(start_w, b"x" * workers)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    elapsed = time.perf_counter() - start
+    os.close(start_w)
+    return elapsed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Общая память: цена конкуренции")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=50_000, help="операций на воркер")
+    parser.add_argument("--filter", default="", help="подстрока в имени сценария")
+    parser.add_argument("--output", "-o", help="файл JSON; по умолчанию stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if not hasattr(os, "fork"):
+        raise SystemExit("bench.shared requires os.fork (Linux/macOS)")
+
+    scenarios = {
+        name: make_op for name, make_op in _scenarios().items() if args.filter in name
+    }
+    results = {}
+    for name, make_op in scenarios.items():
+        for workers in args.workers:
+            elapsed = run_scenario(make_op, workers, args.ops)
+            total = workers * args.ops
+            results[f"{name}.w{workers}"] = {
+                # время одной операции глазами воркера: растёт с конкуренцией
+                "ns_per_op": round(elapsed / args.ops * 1e9, 1),
+                "ops_per_sec": round(total / elapsed),
+                "workers": workers,
+            }
+            print(
+                f"{name + '.w' + str(workers):<28} "
+                f"{results[f'{name}.w{workers}']['ns_per_op']:>10,.1f} ns "
+                f"{results[f'{name}.w{workers}']['ops_per_sec']:>12,} ops/s",
+                file=sys.stderr,
+            )
+
+    write_results(
+        "shared",
+        {"workers": args.workers, "ops": args.ops, "filter": args.filter},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Холодный старт: от запуска процесса до первого ответа.
+
+    python -m bench.startup --runs 10
+    python -m bench.startup --target wsgi -o startup.json
+
+Для каждого сервера --runs раз запускается свежий интерпретатор и
+меряются две вещи:
+- import_ms — импорт модуля приложения (python -c "import ...");
+- first_response_ms — от Popen до первого 200 на GET / по HTTP, то есть
+  импорт, freeze(), bind и первый запрос — то, что ждёт автоскейлинг.
+"""
+
+from __future__ import annotations
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+
+from bench.common import percentiles, write_results
+from bench.load import SPAWN, free_port, stop_server
+
+# модуль, импорт которого меряется отдельно
+MODULES = {"server": "server", "wsgi": "wsgi_app"}
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import(target: str) -> float:
+    script = SPAWN[target]
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=MODULES[target])],
+        cwd=script.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1]) * 1000
+
+
+def first_response(port: int, deadline: float) -> bool:
+    """Один GET /; False — сервер ещё не слушает."""
+    request = b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=1.0) as sock:
+            sock.sendall(request)
+            status_line = sock.recv(64)
+    except OSError:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"no response on port {port}") from None
+        return False
+    if not status_line.startswith((b"HTTP/1.1 200", b"HTTP/1.0 200")):
+        raise RuntimeError(f"unexpected response: {status_line!r}")
+    return True
+
+
+def measure_first_response(target: str, wait: float = 10.0) -> float:
+    script = SPAWN[target]
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script.name, "--host", "127.0.0.1", "--port", str(port)],
+        cwd=script.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + wait
+        while not first_response(port, deadline):
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"{script.name} exited with code {process.returncode}"
+                )
+            time.sleep(0.002)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        stop_server(process)
+
+
+def summary(values: list[float]) -> dict:
+    result = {k: round(v, 2) for k, v in percentiles(values).items()}
+    result["min"] = round(min(values), 2)
+    result["mean"] = round(sum(values) / len(values), 2)
+    return result
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Время холодного старта")
+    parser.add_argument(
+        "--target",
+        action="append",
+        choices=sorted(SPAWN),
+        help="сервер; по умолчанию все, можно несколько раз",
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", "-o", help="файл JSON; по умолчанию stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    targets = args.target or sorted(SPAWN)
+
+    results = {}
+    for target in targets:
+        imports = [measure_import(target) for _ in range(args.runs)]
+        starts = [measure_first_response(target) for _ in range(args.runs)]
+        results[target] = {
+            "import_ms": summary(imports),
+            "first_response_ms": summary(starts),
+        }
+        print(
+            f"{target:<8} import p50 {results[target]['import_ms']['p50']} ms, "
+            f"first response p50 {results[target]['first_response_ms']['p50']} ms",
+            file=sys.stderr,
+        )
+
+    write_results(
+        "startup", {"targets": targets, "runs": args.runs}, results, args.output
+    )
+
+
+if __name__ == "__main__":
+    main()
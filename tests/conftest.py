@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# уроки — не пакеты, их модули импортируются по имени файла
+for path in (ROOT / "1_http_basics", ROOT / "2_fastapi_intro"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+
+from asgi_app import AsyncApp, asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def app():
+    return AsyncApp()
+
+
+def request(app, method, path, **kwargs):
+    status, headers, body = run(asgi_request(app, method, path, **kwargs))
+    # в ASGI имена заголовков в нижнем регистре
+    return status, {name.lower(): value for name, value in headers}, body
+
+
+def assert_json_error(headers, body):
+    assert headers["content-type"].startswith("application/json")
+    data = json.loads(body)
+    assert isinstance(data, dict) and isinstance(data["error"], str)
+    return data
+
+
+def test_static_route(app):
+    status, headers, body = request(app, "GET", "/hello", query_string="name=Ann")
+
+    assert status == 200
+    assert headers["content-type"].startswith("application/json")
+    assert json.loads(body) == {"message": "Hello, Ann!"}
+
+
+def test_typed_path_parameter(app):
+    status, _, body = request(app, "GET", "/users/42")
+
+    assert status == 200
+    assert json.loads(body) == {"user_id": 42}
+
+
+def test_path_parameter_type_mismatch_is_404(app):
+    status, headers, body = request(app, "GET", "/users/abc")
+
+    assert status == 404
+    assert_json_error(headers, body)
+
+
+def test_unknown_path_is_404(app):
+    status, headers, body = request(app, "GET", "/no/such/path")
+
+    assert status == 404
+    assert "/no/such/path" in assert_json_error(headers, body)["error"]
+
+
+def test_wrong_method_is_405_with_allow(app):
+    status, headers, body = request(app, "GET", "/operation")
+
+    assert status == 405
+    assert headers["allow"] == "POST"
+    assert_json_error(headers, body)
+
+
+def test_operation(app):
+    status, _, body = request(
+        app, "POST", "/operation", json_body={"a": 2, "b": 3, "op": "multiply"}
+    )
+
+    assert status == 200
+    assert json.loads(body) == {"result": 6}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"{not json",
+        b'{"a": 1, "b": 2}',
+        b'{"a": "x", "b": 2, "op": "sum"}',
+        b'{"a": 1, "b": 2, "op": "pow"}',
+    ],
+)
+def test_bad_operation_is_400_with_json_error(app, body):
+    status, headers, data = request(
+        app,
+        "POST",
+        "/operation",
+        headers={"Content-Type": "application/json"},
+        body=body,
+    )
+
+    assert status == 400
+    assert_json_error(headers, data)
+
+
+def test_handler_exception_is_500_with_json_error(app):
+    def broken(req):
+        raise RuntimeError("boom")
+
+    app.router.add("GET", "/broken", broken)
+    status, headers, body = request(app, "GET", "/broken")
+
+    assert status == 500
+    assert assert_json_error(headers, body)["error"] == "Internal Server Error"
+
+
+def test_ndjson_lines_are_answered_as_they_arrive():
+    app = AsyncApp()
+    messages = [
+        b'{"a": 1, "b": 2, "op": "sum"}\n{"a": 2, ',
+        b'"b": 3, "op": "multiply"}\n',
+    ]
+    events = []
+
+    async def receive():
+        if not messages:
+            await asyncio.Event().wait()
+        events.append("receive")
+        body = messages.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(messages)}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            events.append(json.loads(message["body"]))
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/operation",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/x-ndjson")],
+    }
+    run(app(scope, receive, send))
+
+    # ответ на первую строку ушёл раньше, чем пришло второе сообщение
+    assert events == ["receive", {"result": 3}, "receive", {"result": 6}]
+
+
+def test_ndjson_body_is_not_limited_by_max_body_size():
+    line = b'{"a": 1, "b": 2, "op": "sum"}\n'
+    body = line * (1_500_000 // len(line))
+
+    status, _, data = request(
+        AsyncApp(),
+        "POST",
+        "/operation",
+        headers={"Content-Type": "application/x-ndjson"},
+        body=body,
+    )
+
+    assert status == 200
+    assert data.count(b"\n") == body.count(b"\n")
+    assert b"error" not in data
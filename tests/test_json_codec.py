@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+import json_codec
+
+BIG = 123456789012345678901234567890
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "ujson"])
+def test_big_int_round_trip(name):
+    try:
+        codec = json_codec.get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    raw = codec.dumps({"a": BIG, "b": -BIG, "c": 2})
+    data = codec.loads(raw)
+
+    assert data == {"a": BIG, "b": -BIG, "c": 2}
+    assert type(data["a"]) is int
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "ujson"])
+def test_errors_and_memoryview_match_stdlib(name):
+    try:
+        codec = json_codec.get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    assert codec.loads(memoryview(b'{"a": 1}')) == {"a": 1}
+    with pytest.raises(UnicodeDecodeError):
+        codec.loads(b'{"a": "\xff"}')
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b'{"a": ')
@@ -0,0 +1,50 @@
+import cProfile
+import threading
+
+from profiling import Profiler
+from test_wsgi_app import call
+from wsgi_app import App
+
+
+def test_only_one_request_is_profiled_at_a_time():
+    profiler = Profiler(sample_every=1)
+    first = profiler.begin()
+    second = []
+    thread = threading.Thread(target=lambda: second.append(profiler.begin()))
+    thread.start()
+    thread.join()
+
+    assert first.profile is not None
+    assert second == [None]
+
+    profiler.record(first, "/", "GET", "200 OK", ())
+    third = profiler.begin()
+    assert third.profile is not None
+    profiler.discard(third)
+
+
+def test_foreign_profiler_is_not_an_error(monkeypatch):
+    class BusyProfile:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+    profiler = Profiler(sample_every=1)
+
+    assert profiler.begin() is None
+    assert profiler.begin() is None  # флаг не остался занятым
+
+
+def test_profile_config_only_from_localhost():
+    app = App()
+    body = b'{"sample_every": 0}'
+
+    remote, _, _ = call(
+        app, "POST", "/debug/profile", body, {"REMOTE_ADDR": "192.0.2.1"}
+    )
+    local, _, _ = call(
+        app, "POST", "/debug/profile", body, {"REMOTE_ADDR": "127.0.0.1"}
+    )
+
+    assert remote == "403 Forbidden"
+    assert local == "200 OK"
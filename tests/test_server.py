@@ -0,0 +1,280 @@
+import socket
+import threading
+import time
+import zlib
+from http.server import HTTPServer
+
+import pytest
+
+from server import Admission, KeepAliveHandler, PowGuard, Profiler, Result
+
+
+@pytest.fixture
+def server_address():
+    httpd = HTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def exchange(address, payload: bytes) -> bytes:
+    """Отправить байты одним куском и читать ответы, пока сервер не закроет."""
+    with socket.create_connection(address, timeout=5) as sock:
+        sock.sendall(payload)
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def post(
+    path: str,
+    body: bytes,
+    content_type: str = "application/json",
+    length: int | None = None,
+) -> bytes:
+    length = len(body) if length is None else length
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: test\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {length}\r\n\r\n"
+    ).encode() + body
+
+
+# последний запрос закрывает соединение, если сервер не закрыл его раньше
+CLOSING_GET = b"GET /time HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+
+
+def test_rejected_body_does_not_desync_keep_alive(server_address):
+    # тело, похожее на запрос: если его не пропустить, сервер ответит на него
+    smuggled = b"GET /time HTTP/1.1\r\nHost: test\r\n\r\n"
+    payload = post("/operation", smuggled, "text/plain") + CLOSING_GET
+
+    data = exchange(server_address, payload)
+
+    assert data.startswith(b"HTTP/1.1 415 ")
+    assert data.count(b"HTTP/1.1 ") == 1
+    assert b"Connection: close" in data
+
+
+def test_oversized_body_closes_connection(server_address):
+    # 413 уходит до чтения тела: хватает заявленной длины
+    smuggled = b"GET /time HTTP/1.1\r\nHost: test\r\n\r\n"
+    payload = post("/operation", smuggled, length=KeepAliveHandler.max_body_size + 1)
+
+    data = exchange(server_address, payload)
+
+    assert data.startswith(b"HTTP/1.1 413 ")
+    assert data.count(b"HTTP/1.1 ") == 1
+
+
+def test_keep_alive_serves_requests_after_valid_post(server_address):
+    body = b'{"a": 2, "b": 3, "operation": "mul"}'
+    payload = post("/operation", body) + CLOSING_GET
+
+    data = exchange(server_address, payload)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert data.count(b"HTTP/1.1 200 ") == 2
+
+
+def test_big_int_operands_stay_exact(server_address):
+    body = b'{"a": 123456789012345678901234567890, "b": 2, "operation": "mul"}'
+
+    data = exchange(server_address, post("/operation", body) + CLOSING_GET)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert b'{"result":246913578024691357802469135780}' in data.replace(b" ", b"")
+
+
+def test_latency_excludes_keep_alive_idle_time(server_address):
+    series_key = ("/time", "GET")
+    before = KeepAliveHandler.metrics.series.get(series_key)
+    before_sum = before.sum if before is not None else 0.0
+
+    with socket.create_connection(server_address, timeout=5) as sock:
+        # сервер уже ждёт строку запроса: это простой, а не время запроса
+        time.sleep(0.3)
+        sock.sendall(CLOSING_GET)
+        while sock.recv(65536):
+            pass
+
+    assert KeepAliveHandler.metrics.series[series_key].sum - before_sum < 0.1
+
+
+def test_pow_guard_offloads_large_results(monkeypatch):
+    guard = PowGuard()
+    assert guard.offload_bits < guard.max_bits
+    offloaded = []
+    monkeypatch.setattr(
+        guard,
+        "_power_offloaded",
+        lambda a, b: offloaded.append((a, b)) or Result(ok=True),
+    )
+
+    guard.power(10, 3000)  # ~9966 бит: больше offload_bits, меньше max_bits
+    guard.power(10, 100)
+
+    assert offloaded == [(10, 3000)]
+
+
+def test_pow_guard_offloaded_result_is_exact():
+    guard = PowGuard(max_bits=2_000, offload_bits=100)
+    try:
+        result = guard.power(3, 1000)
+    finally:
+        if guard._pool is not None:
+            guard._pool.shutdown()
+
+    assert result.ok
+    assert result.value == 3**1000
+
+
+def test_static_file_is_sent_with_sendfile(server_address, tmp_path, monkeypatch):
+    (tmp_path / "hello.txt").write_bytes(b"hello, file")
+    monkeypatch.setattr(KeepAliveHandler, "static_dir", str(tmp_path))
+
+    ok = exchange(
+        server_address,
+        b"GET /static/hello.txt HTTP/1.1\r\nHost: test\r\n\r\n"
+        b"GET /static/..%2Fetc HTTP/1.1\r\nHost: test\r\n\r\n" + CLOSING_GET,
+    )
+
+    head, _, rest = ok.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"Content-type: text/plain" in head
+    assert rest.startswith(b"hello, file")
+    assert b"HTTP/1.1 404 " in rest
+    assert rest.count(b"HTTP/1.1 ") == 2
+
+
+def test_admission_rejects_before_reading_body(server_address, monkeypatch):
+    monkeypatch.setattr(
+        KeepAliveHandler, "admission", Admission(client_rate=0.001, client_burst=1)
+    )
+    body = b'{"a": 2, "b": 3, "operation": "mul"}'
+    assert exchange(server_address, post("/operation", body) + CLOSING_GET).startswith(
+        b"HTTP/1.1 200 "
+    )
+
+    # тело заявлено, но не отправлено: ответ не должен его ждать
+    started = time.monotonic()
+    data = exchange(server_address, post("/operation", b"", length=len(body)))
+
+    assert data.startswith(b"HTTP/1.1 429 ")
+    assert b"Retry-After" in data
+    assert time.monotonic() - started < 1
+
+
+def test_large_json_response_is_gzipped(server_address):
+    body = b'{"a": 2, "b": 5000, "operation": "pow"}'
+    request = post("/operation", body).replace(
+        b"\r\n\r\n", b"\r\nAccept-Encoding: gzip\r\n\r\n", 1
+    )
+
+    data = exchange(server_address, request + CLOSING_GET)
+
+    head, _, rest = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"Content-Encoding: gzip" in head
+    assert b"Vary: Accept-Encoding" in head
+    length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+    assert str(2**5000).encode() in zlib.decompress(rest[:length], wbits=31)
+
+
+def test_admission_slot_is_released_after_each_request(server_address, monkeypatch):
+    admission = Admission(max_in_flight=1)
+    monkeypatch.setattr(KeepAliveHandler, "admission", admission)
+    body = b'{"a": 2, "b": 3, "operation": "mul"}'
+    payload = (
+        post("/operation", body)
+        + post("/operation", b"{", length=1)
+        + post("/operation", body, "text/plain")
+        + CLOSING_GET
+    )
+
+    data = exchange(server_address, payload)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert b"HTTP/1.1 400 " in data
+    assert b"HTTP/1.1 415 " in data
+    assert admission.limiter.in_flight == 0
+
+
+def test_echo_returns_request_body(server_address):
+    body = b'{"name": "x", "items": [1, 2]}'
+
+    data = exchange(server_address, post("/echo", body) + CLOSING_GET)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert b'{"result":{"received":{"name":"x","items":[1,2]}}}' in data.replace(
+        b" ", b""
+    )
+
+
+def test_blank_request_line_does_not_leak_profile_sample(server_address, monkeypatch):
+    # slow_threshold: запрос ещё и попадает в _in_flight потока выборки
+    profiler = Profiler(sample_every=1, slow_threshold=60)
+    monkeypatch.setattr(KeepAliveHandler, "profiler", profiler)
+
+    assert exchange(server_address, b"\r\n") == b""
+    data = exchange(server_address, CLOSING_GET)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert [c["route"] for c in profiler.captures] == ["/time"]
+    assert not profiler._in_flight
+
+
+def test_non_utf8_body_is_reported_as_such(server_address):
+    data = exchange(server_address, post("/operation", b'{"a": "\xff"}') + CLOSING_GET)
+
+    assert data.startswith(b"HTTP/1.1 400 ")
+    assert "Тело запроса должно быть UTF-8".encode() in data
+
+
+def chunked_ndjson(body: bytes) -> bytes:
+    return (
+        b"POST /operation HTTP/1.1\r\nHost: test\r\n"
+        b"Content-Type: application/x-ndjson\r\n"
+        b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n" + body
+    )
+
+
+def chunk(data: bytes) -> bytes:
+    return b"%x\r\n%s\r\n" % (len(data), data)
+
+
+def test_chunked_ndjson_lines_span_chunks(server_address):
+    body = (
+        chunk(b'{"a": 1, "b": 2, "oper')
+        + chunk(b'ation": "sum"}\n{"a": 2, "b": 3, ')
+        + chunk(b'"operation": "mul"}\n')
+        + b"0\r\n\r\n"
+    )
+
+    data = exchange(server_address, chunked_ndjson(body))
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    compact = data.replace(b" ", b"")
+    assert compact.index(b'{"result":3}') < compact.index(b'{"result":6}')
+
+
+def test_malformed_chunk_size_ends_ndjson_stream(server_address):
+    body = chunk(b'{"a": 1, "b": 2, "operation": "sum"}\n') + b"zz\r\n"
+
+    data = exchange(server_address, chunked_ndjson(body))
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert b'{"result":3}' in data.replace(b" ", b"")
+    assert "Неверное chunked-кодирование".encode() in data
+
+
+def test_metrics_include_coalesced_counter(server_address):
+    data = exchange(
+        server_address,
+        b"GET /metrics HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n",
+    )
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert b"# TYPE http_requests_coalesced_total counter" in data
@@ -0,0 +1,200 @@
+import io
+import json
+import time
+
+from conditional import body_etag
+from wsgi_app import App, json_response
+
+
+def call(app, method, path, body=b"", headers=None):
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "wsgi.input": io.BytesIO(body),
+        "CONTENT_LENGTH": str(len(body)),
+        "CONTENT_TYPE": "application/json",
+    }
+    environ.update(headers or {})
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response["status"] = status
+        response["headers"] = response_headers
+
+    chunks = app(environ, start_response)
+    try:
+        data = b"".join(chunks)
+    finally:
+        getattr(chunks, "close", lambda: None)()
+    return response["status"], dict(response["headers"]), data
+
+
+def test_ndjson_body_is_not_limited_by_max_body_size():
+    line = b'{"a": 1, "b": 2, "op": "sum"}\n'
+    body = line * (1_500_000 // len(line))
+
+    status, _, data = call(
+        App(), "POST", "/operation", body, {"CONTENT_TYPE": "application/x-ndjson"}
+    )
+
+    assert status == "200 OK"
+    assert data.count(b"\n") == body.count(b"\n")
+    assert b"error" not in data
+
+
+def test_json_body_over_limit_is_rejected():
+    status, _, _ = call(App(), "POST", "/operation", b" " * (1024 * 1024 + 1))
+
+    assert status == "413 Payload Too Large"
+
+
+def items_app():
+    def ok(req):
+        return json_response(req.path_params)
+
+    app = App()
+    app.router.add("GET", "/items/<item_id:int>", ok)
+    app.router.add("POST", "/items/<name>", ok)
+    app.router.add("GET", "/items/new", ok)
+    return app
+
+
+def test_method_mismatch_falls_through_to_next_route():
+    app = items_app()
+
+    status, _, data = call(app, "POST", "/items/5")
+    assert status == "200 OK"
+    assert json.loads(data) == {"name": "5"}
+
+    status, _, data = call(app, "POST", "/items/new")
+    assert status == "200 OK"
+    assert json.loads(data) == {"name": "new"}
+
+    status, _, data = call(app, "GET", "/items/5")
+    assert json.loads(data) == {"item_id": 5}
+
+
+def test_405_allow_lists_methods_of_all_candidates():
+    status, headers, _ = call(items_app(), "DELETE", "/items/5")
+
+    assert status == "405 Method is Not Allowed"
+    assert headers["Allow"] == "GET, POST"
+
+
+def test_index_etag_follows_route_listing():
+    first, second = App(), App()
+    second.router.add("GET", "/extra", lambda req: json_response({}))
+    first.router.add("GET", "/other", lambda req: json_response({}))
+
+    # одна и та же версия роутера, разные списки маршрутов
+    assert first.router.version == second.router.version
+    _, first_headers, _ = call(first, "GET", "/")
+    _, second_headers, _ = call(second, "GET", "/")
+    assert first_headers["ETag"] != second_headers["ETag"]
+
+    status, _, body = call(
+        first, "GET", "/", headers={"HTTP_IF_NONE_MATCH": first_headers["ETag"]}
+    )
+    assert status == "304 Not Modified"
+    assert body == b""
+
+
+def test_conditional_get_is_checked_before_compression(monkeypatch):
+    payload = {"items": list(range(2000))}
+    app = App()
+    app.router.add("GET", "/big", lambda req: json_response(payload))
+    compressed = []
+    compress = app.compressor.compress_response
+    monkeypatch.setattr(
+        app.compressor,
+        "compress_response",
+        lambda *args, **kwargs: compressed.append(1) or compress(*args, **kwargs),
+    )
+    gzip = {"HTTP_ACCEPT_ENCODING": "gzip"}
+
+    status, headers, _ = call(app, "GET", "/big", headers=gzip)
+    assert status == "200 OK"
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["ETag"] == body_etag(json_response(payload).body)
+    assert compressed == [1]
+
+    status, _, body = call(
+        app, "GET", "/big", headers={**gzip, "HTTP_IF_NONE_MATCH": headers["ETag"]}
+    )
+    assert status == "304 Not Modified"
+    assert body == b""
+    assert compressed == [1]
+
+
+def test_static_file_is_served_from_static_dir(tmp_path):
+    static = tmp_path / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "site.css").write_bytes(b"body { margin: 0 }")
+    (static / ".secret").write_bytes(b"token")
+    (tmp_path / "outside.txt").write_bytes(b"outside")
+    app = App(static_dir=str(static))
+
+    status, headers, body = call(app, "GET", "/static/css/site.css")
+    assert status == "200 OK"
+    assert headers["Content-Type"] == "text/css"
+    assert body == b"body { margin: 0 }"
+
+    for path in ("/static/.secret", "/static/../outside.txt", "/static/css"):
+        assert call(app, "GET", path)[0] == "404 Not Found"
+
+
+def test_static_route_is_404_without_static_dir():
+    assert call(App(), "GET", "/static/site.css")[0] == "404 Not Found"
+
+
+def test_handler_finishing_after_deadline_gets_504():
+    def slow(req):
+        time.sleep(0.3)
+        return json_response({"ok": True})
+
+    app = App()
+    app.router.add("GET", "/slow", slow)
+
+    status, _, data = call(
+        app, "GET", "/slow", headers={"HTTP_X_REQUEST_TIMEOUT": "0.1"}
+    )
+
+    assert status == "504 Gateway Timeout"
+    assert json.loads(data) == {"error": "Request deadline exceeded"}
+
+
+def test_ndjson_stream_stops_at_deadline(monkeypatch):
+    app = App()
+    evaluate = app.evaluate_operation
+    monkeypatch.setattr(
+        app, "evaluate_operation", lambda *args: time.sleep(0.05) or evaluate(*args)
+    )
+    body = b'{"a": 1, "b": 2, "op": "sum"}\n' * 10
+
+    status, _, data = call(
+        app,
+        "POST",
+        "/operation",
+        body,
+        {"CONTENT_TYPE": "application/x-ndjson", "HTTP_X_REQUEST_TIMEOUT": "0.12"},
+    )
+
+    items = [json.loads(line) for line in data.splitlines()]
+    assert status == "200 OK"
+    assert 1 <= len(items) < 10
+    assert items[0] == {"result": 3}
+    assert items[-1] == {"error": "Request deadline exceeded"}
+
+
+def test_malformed_chunked_body_is_rejected():
+    status, _, data = call(
+        App(),
+        "POST",
+        "/operation",
+        b"zz\r\n{}\r\n0\r\n\r\n",
+        {"HTTP_TRANSFER_ENCODING": "chunked"},
+    )
+
+    assert status == "400 Bad Request"
+    assert json.loads(data) == {"error": "Invalid chunked encoding"}
@@ -0,0 +1,69 @@
+import socket
+import threading
+import time
+from wsgiref.simple_server import WSGIServer, make_server
+
+from wsgi_sendfile import SendfileRequestHandler
+
+SIZE = 8 * 1024 * 1024
+
+
+def test_sendfile_survives_full_socket_buffer(tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * SIZE)
+
+    def app(environ, start_response):
+        start_response(
+            "200 OK",
+            [
+                ("Content-Type", "application/octet-stream"),
+                ("Content-Length", str(SIZE)),
+            ],
+        )
+        return environ["wsgi.file_wrapper"](open(path, "rb"))
+
+    httpd = make_server(
+        "127.0.0.1", 0, app, WSGIServer, handler_class=SendfileRequestHandler
+    )
+    thread = threading.Thread(target=httpd.handle_request, daemon=True)
+    thread.start()
+    try:
+        with socket.create_connection(httpd.server_address, timeout=10) as sock:
+            sock.sendall(b"GET / HTTP/1.0\r\nHost: test\r\n\r\n")
+            # пока клиент не читает, буфер сокета сервера заполняется (EAGAIN)
+            time.sleep(0.3)
+            chunks = []
+            while chunk := sock.recv(1024 * 1024):
+                chunks.append(chunk)
+        thread.join(5)
+    finally:
+        httpd.server_close()
+
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.0 200 ")
+    assert len(body) == SIZE
+
+
+def test_requests_are_not_logged_to_stderr(capsys):
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Length", "2")])
+        return [b"ok"]
+
+    httpd = make_server(
+        "127.0.0.1", 0, app, WSGIServer, handler_class=SendfileRequestHandler
+    )
+    thread = threading.Thread(target=httpd.handle_request, daemon=True)
+    thread.start()
+    try:
+        with socket.create_connection(httpd.server_address, timeout=5) as sock:
+            sock.sendall(b"GET / HTTP/1.0\r\nHost: test\r\n\r\n")
+            # до закрытия соединения: строка лога пишется раньше
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        thread.join(5)
+    finally:
+        httpd.server_close()
+
+    assert data.startswith(b"HTTP/1.0 200 ")
+    assert capsys.readouterr().err == ""